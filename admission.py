@@ -0,0 +1,88 @@
+"""
+Admission control for /submit.
+
+At most max_in_flight submissions are parsed, rendered and enqueued at once.
+Up to max_waiting more wait (for at most max_wait seconds) for a slot; past
+that a submission is turned away straight away with 429 and Retry-After, so a
+burst costs a short queue instead of a document build per request in memory.
+
+Field sizes are checked against FIELD_LIMITS before anything is hashed,
+parsed or decoded; the whole body is capped by the caller (MAX_CONTENT_LENGTH).
+"""
+import threading
+import time
+
+import metrics
+from agreement_model import FIELDS
+from signature import MAX_SIGNATURE_BYTES
+
+# Longest accepted value per form field, in characters
+MAX_TEXT_FIELD = 500
+FIELD_LIMITS = dict.fromkeys(FIELDS, MAX_TEXT_FIELD)
+FIELD_LIMITS['property_id'] = 100
+# A data URL: header plus the base64 (or stroke JSON) payload signature.py accepts
+FIELD_LIMITS['signature'] = 100 + (MAX_SIGNATURE_BYTES + 2) // 3 * 4
+
+
+class Overloaded(Exception):
+    """ No slot became free in time; answer 429 with Retry-After """
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Submission shed ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def oversized_field(fields, limits=FIELD_LIMITS):
+    """ The first known field longer than its limit, or None; unknown fields are ignored by the parser """
+    for field, limit in limits.items():
+        value = fields.get(field)
+        if value is not None and len(value) > limit:
+            return field
+    return None
+
+
+class Admission:
+    """
+    A counting semaphore with a bounded wait queue; use as a context manager
+    around the work. max_in_flight=0 admits everything.
+    """
+
+    def __init__(self, max_in_flight, max_waiting=0, max_wait=1.0, retry_after=1):
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            if not self.max_in_flight or self.in_flight < self.max_in_flight:
+                self.in_flight += 1
+                return
+            if self.waiting >= self.max_waiting:
+                raise Overloaded('queue_full', self.retry_after)
+            self.waiting += 1
+            started = time.perf_counter()
+            try:
+                admitted = self._cond.wait_for(lambda: self.in_flight < self.max_in_flight, self.max_wait)
+            finally:
+                self.waiting -= 1
+                metrics.ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - started)
+            if not admitted:
+                raise Overloaded('wait_timeout', self.retry_after)
+            self.in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
@@ -0,0 +1,125 @@
+"""
+One submission, parsed and validated in a single pass.
+
+Agreement.parse() reads every form field once, applies the formats the HTML
+form's pattern attributes imply (6-digit pincodes, 12-digit Aadhar, 10-digit
+phone numbers, ISO dates) and reports every problem at once. The form, /batch,
+the batch CLI and the re-render job all build one, and document generation
+takes it as-is: numbers and the start date are converted here, not on every
+use.
+"""
+import re
+from datetime import date
+
+SALUTATIONS = ('Mr', 'Ms')
+
+# Free text fields, in form order
+TEXT_FIELDS = (
+    'first_name', 'last_name', 'address', 'permanent_district', 'permanent_state',
+    'office_address', 'office_district', 'office_state', 'ref1_name', 'ref2_name', 'rented_address',
+)
+
+# field -> (regex, message); spaces and hyphens are dropped before matching
+DIGIT_FIELDS = {
+    'permanent_pincode': (re.compile(r'[0-9]{6}'), "must be a 6-digit pincode"),
+    'office_pincode': (re.compile(r'[0-9]{6}'), "must be a 6-digit pincode (000000 if N/A)"),
+    'aadhar_no': (re.compile(r'[0-9]{12}'), "must be a 12-digit Aadhar number"),
+    'ref1_number': (re.compile(r'[0-9]{10}'), "must be a 10-digit mobile number"),
+    'ref2_number': (re.compile(r'[0-9]{10}'), "must be a 10-digit mobile number"),
+}
+
+_SEPARATORS = re.compile(r'[\s-]')
+
+# The form's fields in the order their errors are reported
+FIELDS = (
+    'salutation', 'first_name', 'last_name', 'age',
+    'address', 'permanent_district', 'permanent_state', 'permanent_pincode',
+    'aadhar_no',
+    'office_address', 'office_district', 'office_state', 'office_pincode',
+    'email_id',
+    'ref1_name', 'ref1_number', 'ref2_name', 'ref2_number',
+    'rented_address', 'rent_price', 'security_deposit', 'start_date',
+    'signature',
+)
+
+
+def field_label(field):
+    return field.replace('_', ' ').title()
+
+
+class InvalidAgreement(ValueError):
+    """ errors: {field: message} for every field that failed, in form order """
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors.values()))
+        self.errors = errors
+
+
+class Agreement:
+    """
+    A validated submission. Text fields are stripped strings; age, rent_price
+    and security_deposit are ints and start_date is a date. property_id and
+    stay_months are filled in from the property definition by the caller, and
+    signature holds the decoded signature once it has been rendered.
+    """
+    __slots__ = FIELDS[:-1] + ('signature_data_url', 'property_id', 'stay_months', 'signature')
+
+    @classmethod
+    def parse(cls, fields, require_signature=True):
+        """ Raises InvalidAgreement listing every missing or malformed field """
+        self = cls()
+        errors = {}
+        values = {field: str(fields.get(field) or '').strip() for field in FIELDS}
+        for field in FIELDS:
+            if not values[field] and (field != 'signature' or require_signature):
+                errors[field] = f"{field_label(field)} cannot be empty."
+
+        for field in TEXT_FIELDS:
+            setattr(self, field, values[field])
+        for field, (pattern, message) in DIGIT_FIELDS.items():
+            value = _SEPARATORS.sub('', values[field])
+            setattr(self, field, value)
+            if value and not pattern.fullmatch(value) and field not in errors:
+                errors[field] = f"{field_label(field)} {message}."
+
+        self.salutation = values['salutation'].rstrip('.')
+        if values['salutation'] and self.salutation not in SALUTATIONS:
+            errors['salutation'] = f"Salutation must be one of {', '.join(SALUTATIONS)}."
+        self.email_id = values['email_id']
+
+        # The form's number inputs; whole numbers, as they were always passed through int()
+        for field in ('age', 'rent_price', 'security_deposit'):
+            value = values[field].replace(',', '')
+            setattr(self, field, None)
+            if not value:
+                continue
+            try:
+                setattr(self, field, int(value))
+            except ValueError:
+                errors[field] = f"{field_label(field)} must be a whole number."
+
+        self.start_date = None
+        if values['start_date']:
+            try:
+                self.start_date = date.fromisoformat(values['start_date'])
+            except ValueError:
+                errors['start_date'] = "Start Date must be a date (YYYY-MM-DD)."
+
+        if errors:
+            raise InvalidAgreement({field: errors[field] for field in FIELDS if field in errors})
+        self.signature_data_url = values['signature'] or None
+        self.property_id = fields.get('property_id') or None
+        self.stay_months = None
+        self.signature = None
+        return self
+
+    @property
+    def full_name(self):
+        return f"{self.first_name} {self.last_name}"
+
+    def client_data(self):
+        """ The normalized fields as strings, as they are archived """
+        data = {field: str(getattr(self, field)) for field in FIELDS[:-1]}
+        data.update(property_id=self.property_id, stay_months=str(self.stay_months),
+                    signature_data_url=self.signature_data_url)
+        return data
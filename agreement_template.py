@@ -0,0 +1,291 @@
+import copy
+import io
+import string
+import threading
+
+from docx import Document
+from docx.shared import Inches, Pt, Cm
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import parse_xml
+from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph
+
+from metrics import span
+
+
+# --- Slots ---
+class Slot:
+    """ A run whose text is filled per request, e.g. Slot('{full_name}') """
+    __slots__ = ('fmt',)
+
+    def __init__(self, fmt):
+        self.fmt = fmt
+
+    def render(self, values):
+        return self.fmt.format_map(values)
+
+
+_FORMATTER = string.Formatter()
+
+
+def _part(text, definition):
+    """ Fills in the property's {placeholders}; text still holding client fields comes back as a Slot """
+    fmt = text.fmt if isinstance(text, Slot) else text
+    parsed = list(_FORMATTER.parse(fmt))
+    if all(field is None or field in definition for _, field, _, _ in parsed):
+        return fmt.format_map(definition)
+
+    pieces = []
+    for literal, field, spec, conversion in parsed:
+        pieces.append(literal.replace('{', '{{').replace('}', '}}'))
+        if field is None:
+            continue
+        if field in definition:
+            value = _FORMATTER.format_field(_FORMATTER.convert_field(definition[field], conversion), spec)
+            pieces.append(value.replace('{', '{{').replace('}', '}}'))
+        else:
+            pieces.append('{%s%s%s}' % (field, '!' + conversion if conversion else '', ':' + spec if spec else ''))
+    return Slot(''.join(pieces))
+
+
+# --- Standard Clauses ---
+# {placeholders} are the property's terms (see properties.py) or the client's fields
+DEFAULT_CLAUSES = [
+    [("The Host has permitted the Paying Guest the Use of part bathrooms in the “Said room Premises” situated at ", False), (Slot("{rented_address}"), True), (" together with fixtures, fittings, furniture and amenities for the purpose of providing temporary residential accommodation on paying guest basis.", False)],
+    [("This Agreement shall be on monthly basis commencing from ", False), (Slot("{start_date_str}"), True), (" to ", False), (Slot("{end_date_str}"), True)],
+    [('The Paying Guest shall pay the monthly rent between the 1st and 5th day of every month. Any delay beyond the 5th day shall attract a late payment charge of ₹{late_fee} ({late_fee_words}) per day until the rent is cleared. Upon vacating the “Said Room Premises,” a sum of ₹{cleaning_charge} ({cleaning_charge_words}) shall be deducted from the Security Deposit towards room cleaning charges, and the remaining balance of the deposit, if any, shall be refunded after adjustment of all dues or damages, if applicable.', True)],
+    [("That the Paying Guest shall pay ", False), (Slot("Rs. {security_deposit}/- ({deposit_in_words})"), True), (" as a refundable security deposit amount to the Caretaker. which will be returned to the Paying Guest on vacating the “ Said Room Premises” for which ", False), ("{notice_period}", True), (" notice is required.", False)],
+    [("That the Paying Guest shall pay to the caretaker of ", False), (Slot("Rs. {rent_price}/- ({rent_in_words})"), True), (" towards the compensation charges for the use of the “Said Room Premises” together with the use of the fixtures, fittings, furniture and amenities and which is not including Electricity Charges (actual) to be shared by all PG’s as also maid charges.", False)],
+    [("The Paying Guest shall keep the “Said Room Premises” in good condition and comply with all the rules and regulations required in this regard.", False)],
+    [("The paying Guest shall not carry out any addition or alterations in the “Said Room Premises”.", False)],
+    [("The “Said Room Premises” shall be used by the Paying Guest Only for lawful purpose of residential stay. The said premises shall not be used for any other purpose/s by the Paying Guest. The Caretaker shall restrain the access to the “Said Room Premises” if the paying guest misuses the premises or commits any illegal act or criminal act or disturbs the neighbors or the society.", False)],
+    [("The Paying Guest hereby covenants and agrees that they shall not use the address of the “Said Room Premises” for obtaining, applying for, or registering any government-issued identification, documentation, or services, including but not limited to: Ration Card, Gas Connection, Aadhaar Card, PAN Card, Voter ID Card, Driving License, Bank Loan or Online Loan documentation, Any other government-recognized proof of residence.", False)],
+    [("The paying guest shall not bring any visitors to the premises except with the permission of the Caretaker.", False)],
+    [("The Caretaker of his representatives shall have the lock and key of the “Said Room Premises” and have the right to enter the said room for the purpose of inspection or any other purpose/s at all reasonable hours.", False)],
+    [("The Notice period for termination of this paying guest by either party is {notice_period}. (The paying Guest have no right to vacate the said premises before {lock_in_months} months from the commencing of this agreement) .(i.e. {lock_in_months} months locking period)", False)],
+    [("This agreement does not bestow any right, title, possession or interest of whatsoever nature in the Room / Flat to the Paying Guest.", False)]
+]
+
+
+# --- Compiled Template ---
+class CompiledAgreement:
+    """
+    Builds the static agreement layout once and clones it per request.
+
+    Every paragraph, section and run format is laid down a single time in
+    build(), with the property's caretaker, city and terms (a definition from
+    properties.py; the standard one by default) written in as static text.
+    render() deep-copies the finished document and only rewrites the text of
+    the runs recorded as slots, plus the signature picture.
+    """
+
+    def __init__(self, definition=None):
+        self.definition = definition
+        self._doc = None
+        self._slots = []  # (Slot, paragraph_index, run_index)
+        self._signature_at = None  # (paragraph_index, run_index)
+        self._lock = threading.Lock()
+
+    def _ensure_built(self):
+        if self._doc is None:
+            with self._lock:
+                if self._doc is None:
+                    self._doc = self._build()
+        return self._doc
+
+    def warm(self):
+        """ Builds the skeleton now instead of on the first render """
+        self._ensure_built()
+
+    def render(self, values, signature=None):
+        skeleton = self._ensure_built()
+        doc = copy.deepcopy(skeleton)
+        paragraphs = doc.element.body.findall(qn('w:p'))
+
+        for slot, p_index, r_index in self._slots:
+            paragraphs[p_index].r_lst[r_index].text = slot.render(values)
+
+        if isinstance(signature, bytes):
+            p_index, r_index = self._signature_at
+            sig_paragraph = Paragraph(paragraphs[p_index], doc._body)
+            sig_paragraph.runs[r_index].add_picture(io.BytesIO(signature), width=Inches(2.0))
+        elif signature is not None:
+            # Vector signature: an inline DrawingML shape, no image part needed
+            p_index, r_index = self._signature_at
+            paragraphs[p_index].r_lst[r_index].append(parse_xml(signature.drawing_xml()))
+
+        document_stream = io.BytesIO()
+        with span('save'):
+            doc.save(document_stream)
+        return document_stream
+
+    def render_chunks(self, values, signature=None):
+        """ Same interface as OOXMLAgreementWriter.render_chunks; python-docx can only save whole """
+        return [self.render(values, signature).getbuffer()]
+
+    def marked_copy(self, marker):
+        """ Returns (doc, slots): a skeleton copy whose slot runs hold marker(i) and marker('signature') """
+        skeleton = self._ensure_built()
+        doc = copy.deepcopy(skeleton)
+        paragraphs = doc.element.body.findall(qn('w:p'))
+
+        for i, (slot, p_index, r_index) in enumerate(self._slots):
+            paragraphs[p_index].r_lst[r_index].text = marker(i)
+        p_index, r_index = self._signature_at
+        paragraphs[p_index].r_lst[r_index].text = marker('signature')
+        return doc, [slot for slot, _, _ in self._slots]
+
+    # --- Layout (runs once per process) ---
+    def _build(self):
+        from properties import DEFAULT_PROPERTY, normalize_definition, template_terms
+
+        definition = template_terms(self.definition or normalize_definition('default', DEFAULT_PROPERTY))
+        doc = Document()
+        slots = []
+
+        def add_run(p, text, font_size, bold):
+            text = _part(text, definition)
+            run = p.add_run('' if isinstance(text, Slot) else text)
+            run.font.name = 'Times New Roman'
+            run.font.size = font_size
+            run.bold = bold
+            if isinstance(text, Slot):
+                slots.append((text, len(doc.paragraphs) - 1, len(p.runs) - 1))
+            return run
+
+        # --- PAGE 1 SETUP ---
+        section_page1 = doc.sections[0]
+        section_page1.page_height = Inches(14.0)
+        section_page1.page_width = Inches(8.5)
+        section_page1.left_margin = Cm(3.0)
+        section_page1.right_margin = Cm(1.5)
+
+        def add_paragraph_with_runs(texts_and_formats, alignment=WD_ALIGN_PARAGRAPH.JUSTIFY, font_size=16):
+            p = doc.add_paragraph()
+            p.paragraph_format.space_before = Pt(6)
+            p.paragraph_format.space_after = Pt(0)
+            p.paragraph_format.alignment = alignment
+            for text, is_bold in texts_and_formats:
+                add_run(p, text, Pt(font_size), is_bold)
+            return p
+
+        def add_formatted_paragraph(text, size=16, bold=False, align=WD_ALIGN_PARAGRAPH.JUSTIFY):
+            p = doc.add_paragraph()
+            p.paragraph_format.space_after = Pt(0)
+            p.paragraph_format.alignment = align
+            add_run(p, text, Pt(size), bold)
+            return p
+
+        # --- PAGE 1 CONTENT ---
+        for _ in range(17): doc.add_paragraph()
+
+        add_formatted_paragraph('PAYING GUEST AGREEMENT', size=20, bold=True, align=WD_ALIGN_PARAGRAPH.CENTER)
+        doc.add_paragraph()
+
+        add_paragraph_with_runs([
+            ("THIS AGREEMENT is made and entered in to at {city} this ", False),
+            (Slot("{start_date_str} BETWEEN: {caretaker_name}"), True),
+            (", residing at ", False),
+            ("{caretaker_address}", True),
+            (", Hereinafter referred to as ", False),
+            ("“CARETAKER”", True),
+            (" (which expression shall mean and include his heirs, executors, administrators and assigns) of the ", False),
+            ("ONE PART", True)
+        ], font_size=16, alignment=WD_ALIGN_PARAGRAPH.JUSTIFY)
+
+        doc.add_page_break()
+
+        # --- PAGE 2 & 3 ---
+        legal_section = doc.sections[-1]
+        legal_section.page_height = Inches(14.0)
+        legal_section.page_width = Inches(8.5)
+        legal_section.left_margin = Cm(3.0)
+        legal_section.right_margin = Cm(1.5)
+
+        add_formatted_paragraph('AND', size=14, bold=True, align=WD_ALIGN_PARAGRAPH.CENTER)
+
+        font_size_main = Pt(14)
+        p_details = doc.add_paragraph()
+        p_details.alignment = WD_ALIGN_PARAGRAPH.LEFT
+        p_details.paragraph_format.space_before = Pt(12)
+        p_details.paragraph_format.space_after = Pt(0)
+
+        def add_run_to_details(text, bold=False):
+            add_run(p_details, text, font_size_main, bold)
+
+        add_run_to_details(Slot("{salutation}. "), bold=True)
+        add_run_to_details(Slot("{full_name}"), bold=True)
+        add_run_to_details(Slot(", aged {age} years, an adult, "))
+        add_run_to_details("Indian Inhabitant permanently residing at: ")
+        add_run_to_details(Slot("{full_address}"), bold=True)
+        add_run_to_details(" Having Aadhar card No. ")
+        add_run_to_details(Slot("{aadhar_no}"), bold=True)
+        add_run_to_details("\n")
+
+        add_run_to_details("Emergency Contact:\n")
+        add_run_to_details("(1) ")
+        add_run_to_details(Slot("{ref1_name}"), bold=True)
+        add_run_to_details(" Ph- ")
+        add_run_to_details(Slot("{ref1_number}"), bold=True)
+        add_run_to_details("\n")
+        add_run_to_details("(2) ")
+        add_run_to_details(Slot("{ref2_name}"), bold=True)
+        add_run_to_details(" Ph- ")
+        add_run_to_details(Slot("{ref2_number}"), bold=True)
+        add_run_to_details("\n")
+
+        add_run_to_details("Office Address: ")
+        add_run_to_details(Slot("{full_office_address}"), bold=True)
+        add_run_to_details("\n")
+
+        add_run_to_details("Email ID: ")
+        add_run_to_details(Slot("{email_id}"), bold=True)
+        add_run_to_details("\n")
+
+        p_last = doc.add_paragraph()
+        p_last.paragraph_format.space_before = Pt(0)
+        p_last.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+        p_last.add_run("Hereinafter referred to as the ").font.size = font_size_main
+        run = p_last.add_run("“PAYING GUEST” "); run.bold = True; run.font.size = font_size_main
+        p_last.add_run("(which expression shall mean and include his heirs, executors, administrators and assigns) of the ").font.size = font_size_main
+        run = p_last.add_run("SECOND PART."); run.bold = True; run.font.size = font_size_main
+        for run in p_last.runs: run.font.name = 'Times New Roman'
+
+        add_paragraph_with_runs([("WHEREAS", True), (" the party of the one Part is the Host in respect of premises situate at ", False), (Slot("{rented_address}"), True), (", hereinafter for the sake of brevity referred to as the “Said Room Premises”.", False)], font_size=14)
+        add_paragraph_with_runs([("AND WHEREAS", True), (" the Paying Guests are in need of temporary furnished accommodation and has approached and requested to the owner to permit the said Paying Guest the use of the “Said Room Premises” together with the fixtures, fittings, furniture’s and amenities for residential purposes for a temporary period. AND WHEREAS, the Host has agreed on certain terms and conditions which the parties have mutually agreed themselves as under.", False)], font_size=14)
+        doc.add_paragraph()
+
+        clauses = definition.get('clauses') or DEFAULT_CLAUSES
+        page_break_at = definition['page_break_before_clause'] - 1
+
+        for i, clause_parts in enumerate(clauses):
+            p = doc.add_paragraph(style='List Number')
+            p.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+            p.paragraph_format.space_after = Pt(0)
+            if i == page_break_at: p.paragraph_format.page_break_before = True
+            for text, is_bold in clause_parts:
+                add_run(p, text, Pt(14), is_bold)
+            if i != len(clauses) - 1: doc.add_paragraph()
+
+        signature_page_section = doc.sections[-1]
+        signature_page_section.left_margin = Cm(3.0)
+        signature_page_section.right_margin = Cm(1.5)
+
+        add_formatted_paragraph("IN WITNESS WHEREOF the parties have hereto hereinto set their respective hands on the day and year first hereinabove mentioned.", size=14)
+        for _ in range(3): doc.add_paragraph()
+
+        add_paragraph_with_runs([('SIGNED AND DELIVERED for\nThe Caretaker by withinnamed\n', False), ('{caretaker_signature_name}', True)], alignment=WD_ALIGN_PARAGRAPH.LEFT, font_size=14)
+        doc.add_paragraph()
+        add_formatted_paragraph('In the presence of ………………….', size=14, align=WD_ALIGN_PARAGRAPH.LEFT)
+        for _ in range(5): doc.add_paragraph()
+
+        add_paragraph_with_runs([('SIGNED AND DELIVERED for\nThe paying Guest by withinnamed\n', False), (Slot('{salutation}. '), True), (Slot('{full_name}'), True)], alignment=WD_ALIGN_PARAGRAPH.LEFT, font_size=14)
+
+        sig_paragraph = doc.add_paragraph()
+        sig_paragraph.add_run()
+        sig_paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
+        self._signature_at = (len(doc.paragraphs) - 1, 0)
+        add_formatted_paragraph('In the presence of ………………….', size=14, align=WD_ALIGN_PARAGRAPH.LEFT)
+
+        self._slots = slots
+        return doc
@@ -0,0 +1,294 @@
+"""
+Local archive of every generated agreement.
+
+Documents are stored once per content hash under blobs/<2 hex>/<sha256>.docx
+and indexed in SQLite with their normalized client data, so an agreement can be
+found by Aadhar number, name, rented address or date and downloaded again
+without regenerating it:
+
+    python archive.py --aadhar 123412341234
+    python archive.py --name "priya sha" --date 2025-10-01
+    python archive.py --extract 42 -o Agreement.docx
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+
+from delivery import document_chunks
+
+# Kept out of the searchable client data (the signature has its own column)
+EXCLUDED_FIELDS = ('signature', 'signature_data_url')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS agreements (
+    id INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    submission_id TEXT,
+    aadhar_no TEXT NOT NULL,
+    full_name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    rented_address TEXT NOT NULL,
+    address_key TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    client_data TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS agreements_aadhar ON agreements (aadhar_no);
+CREATE INDEX IF NOT EXISTS agreements_name ON agreements (name_key);
+CREATE INDEX IF NOT EXISTS agreements_address ON agreements (address_key);
+CREATE INDEX IF NOT EXISTS agreements_start ON agreements (start_date);
+CREATE INDEX IF NOT EXISTS agreements_end ON agreements (end_date);
+"""
+
+# Added since the first schema; applied to existing databases on open
+MIGRATIONS = (
+    ('signature_data_url', 'ALTER TABLE agreements ADD COLUMN signature_data_url TEXT'),
+    ('template_version', 'ALTER TABLE agreements ADD COLUMN template_version TEXT'),
+    ('inputs_sha256', 'ALTER TABLE agreements ADD COLUMN inputs_sha256 TEXT'),
+    # Set on a record once a re-render replaces it (rerender.py); the id of the replacement
+    ('superseded_by', 'ALTER TABLE agreements ADD COLUMN superseded_by INTEGER'),
+)
+INDEXES = "CREATE INDEX IF NOT EXISTS agreements_rendering ON agreements (inputs_sha256, template_version);"
+
+COLUMNS = ('id', 'sha256', 'size', 'filename', 'submission_id', 'aadhar_no', 'full_name',
+           'rented_address', 'start_date', 'end_date', 'created_at', 'superseded_by')
+
+
+# --- Normalization ---
+def search_key(text):
+    """ Case- and whitespace-insensitive form used for name and address lookups """
+    return ' '.join(str(text).lower().split())
+
+
+def normalize_aadhar(value):
+    return re.sub(r'[\s-]', '', str(value))
+
+
+def normalize_client_data(client_data):
+    return {key: str(value).strip() for key, value in client_data.items() if key not in EXCLUDED_FIELDS}
+
+
+def inputs_digest(client_data, signature_data_url=None):
+    """ sha256 of everything a rendering depends on besides the template: the client's fields and signature """
+    payload = [normalize_client_data(client_data), signature_data_url or '']
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def _prefix_range(column, prefix):
+    """ Index-friendly prefix match: column >= prefix AND column < prefix with its last char bumped """
+    return f"{column} >= ? AND {column} < ?", [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+
+
+# --- Archive ---
+class Archive:
+    """
+    Content-addressed blob store plus a SQLite index. Safe to share between
+    threads: each thread gets its own connection, and the database runs in WAL
+    mode so lookups never wait on a writer.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.blob_dir = os.path.join(directory, 'blobs')
+        self.db_path = os.path.join(directory, 'index.sqlite3')
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            import sqlite3  # only paid for once something is archived or looked up
+
+            with self._init_lock:
+                if not self._initialized:
+                    os.makedirs(self.blob_dir, exist_ok=True)
+                conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+                conn.row_factory = sqlite3.Row
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('PRAGMA synchronous=NORMAL')
+                if not self._initialized:
+                    conn.executescript(SCHEMA)
+                    existing = {row['name'] for row in conn.execute('PRAGMA table_info(agreements)')}
+                    for column, statement in MIGRATIONS:
+                        if column not in existing:
+                            conn.execute(statement)
+                    conn.execute(INDEXES)
+                    self._initialized = True
+            self._local.conn = conn
+        return conn
+
+    def blob_path(self, sha256):
+        return os.path.join(self.blob_dir, sha256[:2], f"{sha256}.docx")
+
+    def _write_blob(self, sha256, chunks):
+        path = self.blob_path(sha256)
+        if os.path.exists(path):
+            return  # identical document already stored
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.writelines(chunks)
+        os.replace(tmp_path, path)
+
+    # --- Public API ---
+    def store(self, document_stream, filename, client_data, start_date, end_date, submission_id=None,
+              template_version=None, supersedes=None):
+        """
+        Archives one generated agreement (a BytesIO or a list of chunks) and
+        returns its record id. A document whose bytes were archived before is not
+        stored again; the existing id is returned instead.
+        client_data's signature_data_url is kept (outside the searchable client
+        data) so the agreement can be re-rendered later; see rerender.py.
+        supersedes is the id of the record this one replaces.
+        """
+        record_id = self._store(document_stream, filename, client_data, start_date, end_date, submission_id,
+                                template_version)
+        if supersedes is not None and supersedes != record_id:
+            self._connection().execute('UPDATE agreements SET superseded_by = ? WHERE id = ?', (record_id, supersedes))
+        return record_id
+
+    def _store(self, document_stream, filename, client_data, start_date, end_date, submission_id, template_version):
+        chunks = document_chunks(document_stream)
+        digest = hashlib.sha256()
+        size = 0
+        for chunk in chunks:
+            digest.update(chunk)
+            size += memoryview(chunk).nbytes
+        sha256 = digest.hexdigest()
+        conn = self._connection()
+        signature_data_url = client_data.get('signature_data_url')
+        digest = inputs_digest(client_data, signature_data_url)
+        row = conn.execute('SELECT id FROM agreements WHERE sha256 = ?', (sha256,)).fetchone()
+        if row is not None:
+            # Records archived before versions were tracked learn theirs from an identical re-render
+            conn.execute('UPDATE agreements SET template_version = COALESCE(template_version, ?),'
+                         ' inputs_sha256 = COALESCE(inputs_sha256, ?) WHERE id = ?',
+                         (template_version, digest, row['id']))
+            return row['id']
+
+        self._write_blob(sha256, chunks)
+        full_name = f"{client_data['first_name']} {client_data['last_name']}"
+        cursor = conn.execute(
+            'INSERT OR IGNORE INTO agreements (sha256, size, filename, submission_id, aadhar_no, full_name, name_key,'
+            ' rented_address, address_key, start_date, end_date, client_data, created_at,'
+            ' signature_data_url, template_version, inputs_sha256)'
+            ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (sha256, size, filename, submission_id, normalize_aadhar(client_data['aadhar_no']),
+             full_name, search_key(full_name), client_data['rented_address'],
+             search_key(client_data['rented_address']), start_date.isoformat(), end_date.isoformat(),
+             json.dumps(normalize_client_data(client_data), sort_keys=True), time.time(),
+             signature_data_url, template_version, digest))
+        if cursor.rowcount:
+            return cursor.lastrowid
+        # Lost a race with another thread archiving the same bytes
+        return conn.execute('SELECT id FROM agreements WHERE sha256 = ?', (sha256,)).fetchone()['id']
+
+    def search(self, aadhar_no=None, name=None, rented_address=None, date=None, limit=50):
+        """
+        Newest first. name and rented_address match as case-insensitive prefixes;
+        date (YYYY-MM-DD) finds agreements whose term covers that day.
+        """
+        clauses, params = [], []
+        if aadhar_no:
+            clauses.append('aadhar_no = ?')
+            params.append(normalize_aadhar(aadhar_no))
+        for column, value in (('name_key', name), ('address_key', rented_address)):
+            if value and search_key(value):
+                clause, values = _prefix_range(column, search_key(value))
+                clauses.append(clause)
+                params.extend(values)
+        if date:
+            clauses.append('start_date <= ? AND end_date >= ?')
+            params.extend([date, date])
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self._connection().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM agreements {where} ORDER BY id DESC LIMIT ?",
+            params + [int(limit)]).fetchall()
+        return [dict(row) for row in rows]
+
+    def iter_records(self, active_on=None, batch_size=500, include_superseded=False):
+        """
+        Every current record in id order with its client data and signature,
+        for re-rendering; active_on (YYYY-MM-DD) keeps those whose term covers
+        it. Records archived while iterating are not included, nor are records a
+        re-render replaced unless include_superseded is set.
+        """
+        where, params = ('AND start_date <= ? AND end_date >= ?', [active_on, active_on]) if active_on else ('', [])
+        if not include_superseded:
+            where += ' AND superseded_by IS NULL'
+        conn = self._connection()
+        last_id, max_id = 0, conn.execute('SELECT COALESCE(MAX(id), 0) FROM agreements').fetchone()[0]
+        while True:
+            rows = conn.execute(
+                f"SELECT id, sha256, filename, client_data, signature_data_url, template_version, superseded_by"
+                f" FROM agreements WHERE id > ? AND id <= ? {where} ORDER BY id LIMIT ?",
+                [last_id, max_id] + params + [batch_size]).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                record = dict(row)
+                record['client_data'] = json.loads(record['client_data'])
+                yield record
+            last_id = rows[-1]['id']
+
+    def has_rendering(self, inputs_sha256, template_version):
+        """ True if these inputs were already rendered with this template version """
+        row = self._connection().execute(
+            'SELECT 1 FROM agreements WHERE inputs_sha256 = ? AND template_version = ? LIMIT 1',
+            (inputs_sha256, template_version)).fetchone()
+        return row is not None
+
+    def get(self, record_id):
+        row = self._connection().execute(
+            f"SELECT {', '.join(COLUMNS)}, client_data FROM agreements WHERE id = ?", (record_id,)).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        record['client_data'] = json.loads(record['client_data'])
+        return record
+
+
+# --- CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search the agreement archive or extract a stored document.")
+    parser.add_argument('--dir', default=os.getenv('ARCHIVE_DIR', '/tmp/agreement_archive'))
+    parser.add_argument('--aadhar')
+    parser.add_argument('--name', help="Name prefix, case-insensitive")
+    parser.add_argument('--address', help="Rented address prefix, case-insensitive")
+    parser.add_argument('--date', help="YYYY-MM-DD that falls within the agreement term")
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--extract', type=int, metavar='ID', help="Copy the stored .docx for this record")
+    parser.add_argument('-o', '--output', help="Where --extract writes (default: the original filename)")
+    args = parser.parse_args(argv)
+
+    archive = Archive(args.dir)
+    if args.extract is not None:
+        record = archive.get(args.extract)
+        if record is None:
+            print(f"No archived agreement with id {args.extract}", file=sys.stderr)
+            return 1
+        output = args.output or record['filename']
+        shutil.copyfile(archive.blob_path(record['sha256']), output)
+        print(output)
+        return 0
+
+    for record in archive.search(args.aadhar, args.name, args.address, args.date, args.limit):
+        superseded = f"  (superseded by {record['superseded_by']})" if record['superseded_by'] else ''
+        print(f"{record['id']:>6}  {record['start_date']} - {record['end_date']}  {record['aadhar_no']}  "
+              f"{record['full_name']}  |  {record['rented_address']}{superseded}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
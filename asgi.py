@@ -0,0 +1,237 @@
+"""
+ASGI entry point. POST /submit is handled natively; every other route is
+served by the Flask app through a small WSGI bridge.
+
+    pip install -r requirements-asgi.txt
+    uvicorn asgi:app
+
+A submission is parsed, validated, rendered, enqueued and archived on a
+bounded thread pool (RENDER_WORKERS), then answered with 202 straight away.
+The first Telegram upload runs on the event loop over a shared async
+connection pool (httpx when installed), and the outbox workers take over
+retries if it fails. When the Telegram rate limits have no slot free, the
+submission goes straight to the outbox workers, which batch it with others.
+
+At most SUBMIT_CONCURRENCY submissions are processed at once; past that the
+server answers 429 with Retry-After immediately instead of queueing, and
+bodies over main.SUBMIT_MAX_BYTES get 413 before they are read in full.
+"""
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import main
+import metrics
+from delivery import AsyncTelegramClient
+from metrics import span
+
+# --- Configuration ---
+SUBMIT_CONCURRENCY = int(os.getenv("SUBMIT_CONCURRENCY", "32"))
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(os.cpu_count() or 2)))
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "8"))
+BUSY_RETRY_AFTER = int(os.getenv("BUSY_RETRY_AFTER", str(main.SUBMIT_RETRY_AFTER)))
+
+render_pool = ThreadPoolExecutor(RENDER_WORKERS, thread_name_prefix='render')
+wsgi_pool = ThreadPoolExecutor(int(os.getenv("WSGI_THREADS", "8")), thread_name_prefix='wsgi')
+telegram = AsyncTelegramClient(main.telegram_client, pool_size=UPLOAD_CONCURRENCY)
+
+_in_flight = 0  # only touched on the event loop thread
+_uploads = set()  # keeps references to running upload tasks
+
+metrics.Gauge('asgi_submissions_in_flight', 'Submissions being processed by the ASGI app', lambda: _in_flight)
+metrics.Gauge('asgi_uploads_in_flight', 'First-attempt Telegram uploads running on the event loop', lambda: len(_uploads))
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+# --- Plumbing ---
+async def read_body(receive, limit=None):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ConnectionResetError("client disconnected")
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if limit is not None and size > limit:
+            raise BodyTooLarge()
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def respond(send, status, body, headers=None):
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    raw_headers = [(b'content-type', b'text/html; charset=utf-8'), (b'content-length', str(len(body)).encode())]
+    raw_headers += [(name.lower().encode('latin-1'), str(value).encode('latin-1')) for name, value in (headers or {}).items()]
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def wsgi_environ(scope, body):
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'content-length':
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def wsgi(scope, receive, send):
+    """ Runs the Flask app on wsgi_pool, streaming the response body chunk by chunk """
+    try:
+        body = await read_body(receive, main.app.config.get('MAX_CONTENT_LENGTH'))
+    except BodyTooLarge:
+        await respond(send, 413, "Request body too large")
+        return
+    loop = asyncio.get_running_loop()
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = headers
+
+    iterable = await loop.run_in_executor(wsgi_pool, main.app, wsgi_environ(scope, body), start_response)
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': started['status'],
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in started['headers']],
+        })
+        iterator = iter(iterable)
+        while True:
+            chunk = await loop.run_in_executor(wsgi_pool, next, iterator, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(iterable, 'close'):
+            await loop.run_in_executor(wsgi_pool, iterable.close)
+
+
+# --- Submit ---
+def accept_submission(scope, body):
+    """ Runs on render_pool: form parsing and everything up to the durable enqueue """
+    from werkzeug.wrappers import Request
+
+    request = Request(wsgi_environ(scope, body))
+    run = main.profiler.start(main.requested_profile(request.headers))
+    if run is not None:
+        return main.profiled_submission(request.form, run, accept_fields)
+    return accept_fields(request.form)
+
+
+def accept_fields(fields):
+    """ The first attempt is left to deliver() on the event loop """
+    return main.process_submission(fields, schedule=False)
+
+
+async def deliver(submission_id):
+    """ First delivery attempt on the event loop; the outbox workers handle any retry """
+    handed_over = False
+    try:
+        if main.telegram_client.send_delay() > 0:
+            return  # queued behind other sends: the workers can put it in a media group
+        record = await asyncio.to_thread(main.outbox.claim, submission_id)
+        if record is None:
+            handed_over = True
+            return
+        # Streamed from the outbox file, so an in-flight upload holds one block rather than the document
+        with await asyncio.to_thread(main.outbox.open_document, submission_id) as document:
+            result = await telegram.send_document(document, record['filename'], record['caption'])
+        await asyncio.to_thread(main.outbox.complete, record, result)
+        handed_over = True
+    except Exception as e:
+        print(f"Error delivering {submission_id}: {e}")
+    finally:
+        if not handed_over:
+            main.outbox.hand_over(submission_id)
+
+
+async def submit(scope, receive, send):
+    global _in_flight
+    if _in_flight >= SUBMIT_CONCURRENCY:
+        response_body, status, headers = main.submission_busy('queue_full', BUSY_RETRY_AFTER)
+        await respond(send, status, response_body, headers)
+        return
+    content_length = dict(scope['headers']).get(b'content-length')
+    if content_length and content_length.isdigit() and int(content_length) > main.SUBMIT_MAX_BYTES:
+        response_body, status, headers = main.submission_too_large('body_too_large', "The submission is too large.")
+        await respond(send, status, response_body, headers)
+        return
+
+    _in_flight += 1
+    try:
+        with span('submit'):
+            try:
+                body = await read_body(receive, main.SUBMIT_MAX_BYTES)
+            except BodyTooLarge:
+                response_body, status, headers = main.submission_too_large('body_too_large', "The submission is too large.")
+                await respond(send, status, response_body, headers)
+                return
+            loop = asyncio.get_running_loop()
+            response_body, status, headers = await loop.run_in_executor(render_pool, accept_submission, scope, body)
+    finally:
+        _in_flight -= 1
+
+    if status == 202 and 'Idempotent-Replayed' not in headers:
+        task = asyncio.create_task(deliver(headers['Location'].rsplit('/', 1)[-1]))
+        _uploads.add(task)
+        task.add_done_callback(_uploads.discard)
+    await respond(send, status, response_body, headers)
+
+
+# --- Application ---
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Each server worker delivers, whether or not the import started the outbox
+            await asyncio.to_thread(main.outbox.start)
+            await asyncio.get_running_loop().run_in_executor(render_pool, main.warm_templates)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if _uploads:
+                await asyncio.wait(set(_uploads), timeout=10)
+            await telegram.aclose()
+            await asyncio.to_thread(main.outbox.stop, 5)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    elif scope['type'] == 'http':
+        if scope['path'] == '/submit' and scope['method'] == 'POST':
+            await submit(scope, receive, send)
+        else:
+            await wsgi(scope, receive, send)
@@ -0,0 +1,145 @@
+import argparse
+import gzip
+import hashlib
+import os
+import sys
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# Third-party builds kept in static/ unmodified, at a pinned release, with their license header;
+# `python assets.py --vendor` fetches them. Until one is in static/, its page links the release itself
+SIGNATURE_PAD_VERSION = '4.0.0'
+VENDORED = {
+    'signature_pad.umd.min.js': (f"https://cdn.jsdelivr.net/npm/signature_pad@{SIGNATURE_PAD_VERSION}"
+                                 f"/dist/signature_pad.umd.min.js", f"Signature Pad v{SIGNATURE_PAD_VERSION}"),
+}
+
+
+# --- Precompressed Bodies ---
+class PrecompressedBody:
+    """
+    A response body encoded once up front: identity, gzip and (when the brotli
+    package is installed) br. Each encoding carries its own strong ETag, and
+    conditional requests are answered with 304 without touching the body.
+    """
+    __slots__ = ('variants', 'etag', 'mimetype', 'cache_control')
+
+    def __init__(self, body, mimetype, cache_control):
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.variants = {'identity': body}
+        # mtime=0 keeps the gzip bytes (and so the ETag) identical across processes
+        gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+        if len(gzipped) < len(body):
+            self.variants['gzip'] = gzipped
+        if brotli is not None:
+            compressed = brotli.compress(body, quality=11)
+            if len(compressed) < len(body):
+                self.variants['br'] = compressed
+
+    def _etag_for(self, encoding):
+        return self.etag if encoding == 'identity' else f"{self.etag}-{encoding}"
+
+    def respond(self, request):
+        accepted = request.accept_encodings
+        encoding = 'identity'
+        for candidate in ('br', 'gzip'):
+            if candidate in self.variants and accepted[candidate] > 0:
+                encoding = candidate
+                break
+
+        headers = {
+            'ETag': f'"{self._etag_for(encoding)}"',
+            'Cache-Control': self.cache_control,
+            'Vary': 'Accept-Encoding',
+        }
+        # Any of our encodings' tags means the client already has this content
+        known_tags = {self._etag_for(name) for name in self.variants}
+        if any(tag in known_tags for tag in request.if_none_match):
+            return Response(status=304, headers=headers)
+
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return Response(self.variants[encoding], mimetype=self.mimetype, headers=headers)
+
+
+# --- Versioned Static Assets ---
+_assets = None  # url path -> PrecompressedBody
+
+STATIC_FILES = {
+    'form.css': 'text/css',
+    'signature_pad.umd.min.js': 'text/javascript',
+}
+
+
+def _load_assets():
+    global _assets
+    if _assets is None:
+        assets = {}
+        for name, mimetype in STATIC_FILES.items():
+            try:
+                with open(os.path.join(STATIC_DIR, name), 'rb') as f:
+                    body = f.read()
+            except FileNotFoundError:
+                if name in VENDORED:
+                    continue  # not fetched yet
+                raise
+            stem, ext = os.path.splitext(name)
+            versioned = f"{stem}.{hashlib.sha256(body).hexdigest()[:12]}{ext}"
+            assets[name] = (versioned, PrecompressedBody(body, mimetype, IMMUTABLE))
+        _assets = assets
+    return _assets
+
+
+def asset_url(name):
+    """ Content-hashed URL for a file in static/, safe to cache forever (the pinned upstream URL for a vendored file not fetched yet) """
+    assets = _load_assets()
+    if name not in assets and name in VENDORED:
+        return VENDORED[name][0]
+    return f"/assets/{assets[name][0]}"
+
+
+def find_asset(versioned_name):
+    for versioned, body in _load_assets().values():
+        if versioned == versioned_name:
+            return body
+    return None
+
+
+# --- Vendoring ---
+def vendor(names=None):
+    """ Downloads the pinned third-party builds into static/, byte for byte """
+    import urllib.request
+
+    for name in names or VENDORED:
+        url, banner = VENDORED[name]
+        with urllib.request.urlopen(url, timeout=30) as response:
+            body = response.read()
+        header = body[:512].decode('utf-8', 'replace')
+        if banner not in header or 'license' not in header.lower():
+            raise ValueError(f"{url} does not start with the expected {banner!r} license header")
+        with open(os.path.join(STATIC_DIR, name), 'wb') as f:
+            f.write(body)
+        print(f"{name}: {len(body)} bytes from {url}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the files served from static/.")
+    parser.add_argument('--vendor', action='store_true', help="Fetch the pinned third-party builds into static/")
+    args = parser.parse_args(argv)
+    if args.vendor:
+        vendor()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
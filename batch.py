@@ -0,0 +1,214 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+
+# --- Input Parsing ---
+def detect_format(filename, mimetype=None):
+    """ 'jsonl' for .jsonl/.ndjson uploads or JSON mimetypes, 'csv' otherwise """
+    if filename.lower().endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if mimetype and 'json' in mimetype:
+        return 'jsonl'
+    return 'csv'
+
+
+def read_rows(data, fmt):
+    """ Yields (row_number, fields, error) for each record; fields is None when the row could not be parsed """
+    text = data.decode('utf-8-sig') if isinstance(data, bytes) else data
+    if fmt == 'jsonl':
+        for row_number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                fields = json.loads(line)
+            except ValueError as e:
+                yield row_number, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(fields, dict):
+                yield row_number, None, "Each line must be a JSON object"
+                continue
+            yield row_number, {key: str(value) for key, value in fields.items() if value is not None}, None
+    else:
+        # Row 1 is the header, so data rows are numbered as they appear in a spreadsheet
+        for row_number, fields in enumerate(csv.DictReader(io.StringIO(text)), start=2):
+            yield row_number, {key: value for key, value in fields.items() if key is not None and value is not None}, None
+
+
+# --- Streaming ZIP Output ---
+class _ChunkSink:
+    """ Write-only file object; zipfile treats it as unseekable and streams entries with data descriptors """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+
+# --- Process Pool ---
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def pool_context():
+    """
+    Workers start from a forkserver (spawn where there is none): forking the
+    multithreaded server directly could copy a lock some other thread holds
+    into the child, which would then wait on it forever.
+    """
+    import multiprocessing
+
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+
+def render_only():
+    """
+    Keeps the app from starting its outbox when this process imports it: the
+    CLIs and pool workers only render, delivery belongs to the running app.
+    Call it before the first import of main.
+    """
+    os.environ['OUTBOX_AUTOSTART'] = '0'
+
+
+def pool_worker():
+    """ Initializer for every render pool: render_only(), then warm the templates """
+    render_only()
+    from main import warm_templates
+
+    warm_templates()
+
+
+def shared_pool(max_workers=None):
+    """ The process-wide pool for /batch, started on first use; every upload shares its max_workers """
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                                               mp_context=pool_context(), initializer=pool_worker)
+        return _shared_pool
+
+
+def _discard_pool(pool):
+    """ A worker died and the pool refuses new work: the next batch starts a new one """
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is pool:
+            _shared_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _render_row(render, row_number, agreement):
+    filename, data = render(agreement)
+    return row_number, filename, data
+
+
+def iter_batch_zip(rows, parse, render, pool, max_pending=None):
+    """
+    Renders every valid row across a process pool and yields the ZIP as it is written.
+
+    Rows are parsed here, so workers only receive valid agreements, and at most
+    max_pending of them (default: twice the CPU count) are queued or in
+    flight at once. They are added in completion order; rows that fail
+    validation (with every field error) or generation are listed in report.csv
+    at the end instead of aborting the batch.
+    """
+    sink = _ChunkSink()
+    report = []
+    max_pending = max_pending or 2 * os.cpu_count()
+
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as archive:
+        pending = {}
+
+        def collect(futures):
+            for future in futures:
+                row_number = pending.pop(future)
+                try:
+                    row_number, filename, data = future.result()
+                except Exception as e:
+                    if isinstance(e, BrokenProcessPool):
+                        _discard_pool(pool)
+                    report.append((row_number, 'error', '', str(e)))
+                    continue
+                # .docx files are already deflated, so store them as-is
+                filename = f"{row_number:04d}_{filename}"
+                archive.writestr(filename, data)
+                report.append((row_number, 'ok', filename, ''))
+
+        for row_number, fields, error in rows:
+            if error is None:
+                try:
+                    agreement = parse(fields)
+                except ValueError as e:
+                    error = str(e)
+            if error:
+                report.append((row_number, 'error', '', error))
+                continue
+            try:
+                pending[pool.submit(_render_row, render, row_number, agreement)] = row_number
+            except BrokenProcessPool as e:
+                _discard_pool(pool)
+                report.append((row_number, 'error', '', str(e)))
+                continue
+            if len(pending) >= max_pending:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+                yield from sink.drain()
+        while pending:
+            collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            yield from sink.drain()
+
+        report_stream = io.StringIO()
+        writer = csv.writer(report_stream)
+        writer.writerow(['row', 'status', 'filename', 'error'])
+        writer.writerows(sorted(report))
+        archive.writestr('report.csv', report_stream.getvalue())
+
+    yield from sink.drain()
+
+
+# --- CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate agreements in bulk from a CSV or JSONL file.")
+    parser.add_argument('input', help="CSV (with a header row) or JSONL file of form fields")
+    parser.add_argument('-o', '--output', default='agreements.zip', help="ZIP file to write (default: agreements.zip)")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+    render_only()
+    from main import parse_agreement, render_agreement_bytes
+
+    with open(args.input, 'rb') as f:
+        data = f.read()
+    with open(args.output, 'wb') as out, \
+            ProcessPoolExecutor(max_workers=args.workers or os.cpu_count(), mp_context=pool_context(),
+                                initializer=pool_worker) as pool:
+        for chunk in iter_batch_zip(read_rows(data, detect_format(args.input)), parse_agreement,
+                                    render_agreement_bytes, pool):
+            out.write(chunk)
+
+    with zipfile.ZipFile(args.output) as archive:
+        report = list(csv.DictReader(io.StringIO(archive.read('report.csv').decode('utf-8'))))
+    failed = [row for row in report if row['status'] != 'ok']
+    print(f"Wrote {len(report) - len(failed)} agreements to {args.output}")
+    for row in failed:
+        print(f"Row {row['row']}: {row['error']}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""
+Benchmarks for document generation and the /submit hot path.
+
+Each case runs in a fresh interpreter (so peak RSS is per case) against a
+local stub Telegram server, and reports throughput, p50/p95/p99 latency and
+peak RSS. Results can be saved and compared against a baseline:
+
+    python benchmarks/bench.py --save baseline.json
+    python benchmarks/bench.py --compare baseline.json
+    python benchmarks/bench.py --cases create_word_agreement_ooxml,submit_e2e
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from fixtures import sample_form  # noqa: E402
+from telegram_stub import StubTelegramServer  # noqa: E402
+
+
+# --- Cases ---
+# Each case takes the imported main module and returns (operation, default iterations);
+# operation(i) runs one iteration.
+def case_format_date_with_suffix(main):
+    from datetime import date, timedelta
+    from rendering import format_date_with_suffix
+    days = [date(2025, 1, 1) + timedelta(days=n) for n in range(365)]
+    return lambda i: format_date_with_suffix(days[i % 365]), 20000
+
+
+def case_num2words(main):
+    from num2words import num2words
+    amounts = [9000, 10000, 11500, 12000, 12500, 14000, 15000, 18000, 24000, 36000]
+    return lambda i: f"Rupees {num2words(amounts[i % len(amounts)], lang='en_IN').title()} Only", 5000
+
+
+def case_agreement_text(main):
+    """ Amount words and term dates through the memoized rendering layer """
+    import rendering
+    rendering.warm()
+    amounts = [9000, 10000, 11500, 12000, 12500, 14000, 15000, 18000, 24000, 36000]
+    starts = [date(2025, month, day) for month in range(1, 13) for day in (1, 1, 1, 5, 10, 15)]
+
+    def render_text(i):
+        rendering.amount_in_words(amounts[i % len(amounts)])
+        rendering.agreement_term(starts[i % len(starts)], 11)
+    return render_text, 20000
+
+
+def case_signature_png(main):
+    urls = [sample_form(n, 'png')['signature'] for n in range(20)]
+    return lambda i: main.signature_from_data_url(urls[i % len(urls)]), 200
+
+
+def case_signature_vector(main):
+    urls = [sample_form(n, 'vector')['signature'] for n in range(20)]
+    return lambda i: main.signature_from_data_url(urls[i % len(urls)]), 2000
+
+
+def _agreements(main, signature_format):
+    records = []
+    for n in range(20):
+        agreement = main.parse_agreement(sample_form(n, signature_format))
+        agreement.signature = main.signature_from_data_url(agreement.signature_data_url)
+        records.append(agreement)
+    return records
+
+
+def case_create_word_agreement_ooxml(main):
+    records = _agreements(main, 'png')
+    return lambda i: main.create_word_agreement(records[i % len(records)], backend='ooxml'), 1000
+
+
+def case_create_word_agreement_docx(main):
+    records = _agreements(main, 'png')
+    return lambda i: main.create_word_agreement(records[i % len(records)], backend='docx'), 100
+
+
+def case_telegram_upload(main):
+    records = _agreements(main, 'png')
+    documents = [main.create_word_agreement(record).getvalue() for record in records[:5]]
+
+    def upload(i):
+        import io
+        ok, message = main.send_file_to_telegram(io.BytesIO(documents[i % 5]), 'Agreement.docx', 'bench')
+        if not ok:
+            raise RuntimeError(message)
+    return upload, 300
+
+
+def case_submit_e2e(main):
+    forms = [sample_form(n, 'png') for n in range(20)]
+    client = main.app.test_client()
+
+    def submit(i):
+        # A unique field per iteration so the idempotency cache never replays
+        form = dict(forms[i % len(forms)], email_id=f"bench{i}@example.com")
+        response = client.post('/submit', data=form)
+        if response.status_code >= 400:
+            raise RuntimeError(f"/submit returned {response.status_code}")
+    return submit, 200
+
+
+CASES = {name[len('case_'):]: fn for name, fn in globals().items() if name.startswith('case_')}
+
+
+# --- Measurement ---
+def percentile(sorted_values, pct):
+    """ Nearest-rank percentile """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def run_case(name, iterations=None, warmup=None):
+    """ Runs one case in this process and returns its stats """
+    with StubTelegramServer() as stub, tempfile.TemporaryDirectory() as outbox_dir:
+        os.environ.update(
+            TELEGRAM_BOT_TOKEN='bench-token',
+            TELEGRAM_CHAT_ID='1',
+            TELEGRAM_API_URL=stub.url,
+            OUTBOX_DIR=outbox_dir,
+            # Measure our own overhead, not Telegram's flood limits
+            TELEGRAM_GLOBAL_RATE='0',
+            TELEGRAM_CHAT_PER_MINUTE='0',
+        )
+        import main
+
+        operation, default_iterations = CASES[name](main)
+        iterations = iterations or default_iterations
+        # Warm-up indices follow the measured ones, so they never pre-populate a cache the run relies on missing
+        for i in range(warmup if warmup is not None else max(1, iterations // 10)):
+            operation(iterations + i)
+
+        latencies = []
+        started = time.perf_counter()
+        for i in range(iterations):
+            t0 = time.perf_counter()
+            operation(i)
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+        main.outbox.stop(timeout=5)
+
+    latencies.sort()
+    return {
+        'iterations': iterations,
+        'ops_per_sec': iterations / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def run_isolated(name, iterations=None):
+    command = [sys.executable, os.path.abspath(__file__), '--case', name]
+    if iterations:
+        command += ['--iterations', str(iterations)]
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{name} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+# --- Reporting ---
+def print_report(results, baseline=None):
+    width = max(len(name) for name in results)
+    header = f"{'case':<{width}}  {'ops/s':>10}  {'p50 ms':>9}  {'p95 ms':>9}  {'p99 ms':>9}  {'RSS MB':>7}"
+    if baseline:
+        header += f"  {'Δ p50':>8}  {'Δ ops/s':>8}"
+    print(header)
+    for name, stats in results.items():
+        line = (f"{name:<{width}}  {stats['ops_per_sec']:>10.1f}  {stats['p50_ms']:>9.3f}  "
+                f"{stats['p95_ms']:>9.3f}  {stats['p99_ms']:>9.3f}  {stats['peak_rss_mb']:>7.1f}")
+        base = (baseline or {}).get(name)
+        if base:
+            line += (f"  {change(stats['p50_ms'], base['p50_ms']):>8}"
+                     f"  {change(stats['ops_per_sec'], base['ops_per_sec']):>8}")
+        print(line)
+
+
+def change(current, previous):
+    if not previous:
+        return 'n/a'
+    return f"{(current - previous) / previous * 100:+.1f}%"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark agreement generation and /submit.")
+    parser.add_argument('--cases', help=f"Comma-separated subset of: {', '.join(CASES)}")
+    parser.add_argument('--iterations', type=int, help="Override each case's iteration count")
+    parser.add_argument('--save', help="Write results to this JSON file")
+    parser.add_argument('--compare', help="Baseline JSON file to compare against")
+    parser.add_argument('--max-regression', type=float, default=None,
+                        help="Fail if any case's p50 is this many percent slower than the baseline")
+    parser.add_argument('--case', help=argparse.SUPPRESS)  # internal: run one case and print JSON
+    args = parser.parse_args(argv)
+
+    if args.case:
+        print(json.dumps(run_case(args.case, args.iterations)))
+        return 0
+
+    names = args.cases.split(',') if args.cases else list(CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+
+    results = {name: run_isolated(name, args.iterations) for name in names}
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['cases']
+    print_report(results, baseline)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'cases': results}, f, indent=2)
+
+    if baseline and args.max_regression is not None:
+        regressed = [name for name, stats in results.items()
+                     if name in baseline and stats['p50_ms'] > baseline[name]['p50_ms'] * (1 + args.max_regression / 100)]
+        if regressed:
+            print(f"Regressed beyond {args.max_regression}%: {', '.join(regressed)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
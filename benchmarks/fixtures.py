@@ -0,0 +1,98 @@
+"""
+Representative submissions for the benchmarks and load tests.
+
+Signatures are drawn at the size the form's canvas produces (600x192 CSS
+pixels at devicePixelRatio 2), either as a PNG data URL or as the stroke data
+the form posts in vector mode.
+"""
+import base64
+import io
+import json
+import math
+import random
+
+FIRST_NAMES = ['Aarav', 'Priya', 'Rohan', 'Ananya', 'Vikram', 'Sneha', 'Arjun', 'Kavya', 'Ishaan', 'Meera',
+               'Siddharth', 'Aditi', 'Kabir', 'Nisha', 'Rahul', 'Pooja', 'Yash', 'Tanvi', 'Dev', 'Riya']
+LAST_NAMES = ['Sharma', 'Patel', 'Iyer', 'Reddy', 'Nair', 'Gupta', 'Desai', 'Kulkarni', 'Mehta', 'Singh',
+              'Chatterjee', 'Menon', 'Joshi', 'Bose', 'Pillai', 'Rao', 'Kapoor', 'Malhotra', 'Verma', 'Khan']
+STREETS = ['Hiranandani Gardens', 'MG Road', 'Linking Road', 'Park Street', 'Brigade Road', 'Anna Salai',
+           'FC Road', 'Banjara Hills Road No. 12', 'Sector 17 Market', 'Civil Lines']
+PLACES = [('Mumbai Suburban', 'Maharashtra'), ('Pune', 'Maharashtra'), ('Bengaluru Urban', 'Karnataka'),
+          ('Chennai', 'Tamil Nadu'), ('Hyderabad', 'Telangana'), ('Kolkata', 'West Bengal'),
+          ('Ahmedabad', 'Gujarat'), ('Jaipur', 'Rajasthan'), ('Lucknow', 'Uttar Pradesh'), ('Kochi', 'Kerala')]
+RENTED = ['Room 2, 303/B wing, Palatial Heights, Chandivali, Powai, Mumbai 400072',
+          'Room 1, 1102 A wing, Lake Homes, Powai, Mumbai 400076',
+          'Room 3, 7th floor, Raheja Vihar, Chandivali, Mumbai 400072']
+RENTS = [9000, 10000, 11500, 12000, 12500, 14000, 15000, 18000]
+
+CANVAS_WIDTH, CANVAS_HEIGHT, PIXEL_RATIO = 600, 192, 2
+
+
+def signature_strokes(rng):
+    """ A few pen strokes in CSS pixels, shaped roughly like a cursive signature """
+    strokes = []
+    x = rng.uniform(40, 90)
+    for _ in range(rng.randint(2, 4)):
+        points = []
+        length = rng.randint(60, 160)
+        amplitude = rng.uniform(15, 45)
+        frequency = rng.uniform(6, 14)
+        baseline = rng.uniform(80, 110)
+        for i in range(length):
+            points.append((x + i * rng.uniform(1.2, 2.2), baseline + amplitude * math.sin(i / frequency) + rng.uniform(-1, 1)))
+        x = min(points[-1][0] + rng.uniform(10, 30), CANVAS_WIDTH - 100)
+        strokes.append(points)
+    return strokes
+
+
+def strokes_data_url(strokes):
+    flat = [[round(v, 1) for point in stroke for v in point] for stroke in strokes]
+    return 'data:application/vnd.signature-strokes+json,' + json.dumps(flat, separators=(',', ':'))
+
+
+def png_data_url(strokes):
+    """ The strokes rasterized the way the canvas would export them """
+    from PIL import Image, ImageDraw
+
+    image = Image.new('RGBA', (CANVAS_WIDTH * PIXEL_RATIO, CANVAS_HEIGHT * PIXEL_RATIO), (249, 250, 251, 255))
+    draw = ImageDraw.Draw(image)
+    for stroke in strokes:
+        draw.line([(x * PIXEL_RATIO, y * PIXEL_RATIO) for x, y in stroke], fill=(0, 0, 0, 255), width=2 * PIXEL_RATIO, joint='curve')
+    out = io.BytesIO()
+    image.save(out, format='PNG')
+    return 'data:image/png;base64,' + base64.b64encode(out.getvalue()).decode()
+
+
+def sample_form(index=0, signature_format='png', seed=None):
+    """ POST fields for /submit, varied by index """
+    rng = random.Random(index if seed is None else seed)
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    district, state = rng.choice(PLACES)
+    office_district, office_state = rng.choice(PLACES)
+    rent = rng.choice(RENTS)
+    strokes = signature_strokes(rng)
+    return {
+        'salutation': rng.choice(['Mr', 'Ms']),
+        'first_name': first,
+        'last_name': last,
+        'age': str(rng.randint(19, 45)),
+        'address': f"{rng.randint(1, 999)}, {rng.choice(STREETS)}",
+        'permanent_district': district,
+        'permanent_state': state,
+        'permanent_pincode': f"{rng.randint(110001, 855999)}",
+        'aadhar_no': ''.join(str(rng.randint(0, 9)) for _ in range(12)),
+        'office_address': f"Tower {rng.randint(1, 9)}, {rng.choice(STREETS)}",
+        'office_district': office_district,
+        'office_state': office_state,
+        'office_pincode': f"{rng.randint(110001, 855999)}",
+        'email_id': f"{first.lower()}.{last.lower()}{index}@example.com",
+        'ref1_name': f"{rng.choice(FIRST_NAMES)} {last}",
+        'ref1_number': f"9{rng.randint(100000000, 999999999)}",
+        'ref2_name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        'ref2_number': f"8{rng.randint(100000000, 999999999)}",
+        'rented_address': rng.choice(RENTED),
+        'rent_price': str(rent),
+        'security_deposit': str(rent * rng.choice([1, 2])),
+        'start_date': f"2025-{rng.randint(1, 12):02d}-{rng.choice([1, 1, 1, 5, 10, 15]):02d}",
+        'signature': strokes_data_url(strokes) if signature_format == 'vector' else png_data_url(strokes),
+    }
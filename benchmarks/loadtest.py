@@ -0,0 +1,316 @@
+"""
+Offline load test: how many concurrent signers one instance handles.
+
+Starts main.py's Flask app on a threaded WSGI server in a child process,
+pointed at a local stub Telegram server (with injectable latency and errors),
+then replays generated submissions -- varied names, addresses and
+canvas-sized signatures -- at increasing concurrency. Each level runs for a
+fixed time and reports throughput, latency percentiles, error and shed (429)
+rates, and the server's RSS growth, followed by the highest concurrency that
+stayed within the latency/error objective:
+
+    python benchmarks/loadtest.py
+    python benchmarks/loadtest.py --concurrency 1,4,16,64 --duration 20 --latency 0.2 --error-rate 0.05
+    python benchmarks/loadtest.py --signature vector --slo-p95-ms 500 --save capacity.json
+
+The app's own configuration (SUBMIT_MAX_IN_FLIGHT, TELEGRAM_GLOBAL_RATE, ...)
+is taken from the environment, so limits can be tuned between runs.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from bench import percentile  # noqa: E402
+from fixtures import sample_form  # noqa: E402
+from telegram_stub import StubTelegramServer  # noqa: E402
+
+FORM_POOL = 40  # distinct generated submissions; the email is varied per request so none replays
+
+
+# --- Server ---
+def serve():
+    """ Child process: the app on a threaded WSGI server; prints its URL on the first line """
+    import logging
+    from werkzeug.serving import make_server
+
+    import main
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)  # no access log line per request
+    server = make_server('127.0.0.1', 0, main.app, threaded=True)
+    print(f"http://127.0.0.1:{server.server_port}", flush=True)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())  # nothing reads the pipe after the URL
+    try:
+        server.serve_forever()
+    finally:
+        main.outbox.stop(timeout=5)
+
+
+class AppServer:
+    def __init__(self, env):
+        self.env = env
+        self.process = None
+        self.url = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve'], cwd=ROOT,
+                                        env=self.env, stdout=subprocess.PIPE, text=True)
+        self.url = self.process.stdout.readline().strip()
+        if not self.url:
+            raise RuntimeError("The app server did not start")
+        return self
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait(timeout=10)
+
+    def rss_mb(self):
+        """ Resident set size of the server process (Linux /proc), or None """
+        try:
+            with open(f"/proc/{self.process.pid}/status") as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        return None
+
+
+class RssSampler:
+    """ Samples the server's RSS in the background while a level runs """
+
+    def __init__(self, server, interval=0.2):
+        self.server = server
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = self.server.rss_mb()
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+# --- Load ---
+def form_bodies(signature_format):
+    """ URL-encoded bodies without email_id, which each request appends so the idempotency cache never replays """
+    bodies = []
+    for n in range(FORM_POOL):
+        fmt = signature_format if signature_format != 'mixed' else ('png', 'vector')[n % 2]
+        form = sample_form(n, fmt)
+        del form['email_id']
+        bodies.append(urlencode(form))
+    return bodies
+
+
+class Load:
+    """ Numbers each request across the whole run so every submission is unique """
+
+    def __init__(self, url, bodies, timeout):
+        self.url = url
+        self.bodies = bodies
+        self.timeout = timeout
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def next_body(self):
+        with self._lock:
+            n = self._counter
+            self._counter += 1
+        return f"{self.bodies[n % len(self.bodies)]}&email_id=load{n}%40example.com"
+
+    def submit(self, session):
+        """ (status, seconds); status 0 is a connection error or timeout """
+        import requests
+
+        body = self.next_body()
+        started = time.perf_counter()
+        try:
+            response = session.post(f"{self.url}/submit", data=body, timeout=self.timeout,
+                                    headers={'Content-Type': 'application/x-www-form-urlencoded'})
+            status = response.status_code
+        except requests.RequestException:
+            status = 0
+        return status, time.perf_counter() - started
+
+    def run(self, concurrency, duration):
+        """ concurrency signers submitting back to back for duration seconds; returns [(status, seconds)] """
+        import requests
+
+        results = []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def signer():
+            own = []
+            with requests.Session() as session:
+                while time.perf_counter() < deadline:
+                    own.append(self.submit(session))
+            with lock:
+                results.extend(own)
+
+        threads = [threading.Thread(target=signer) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+
+def scrape_metric(url, name):
+    """ One unlabelled sample from the app's /metrics, or None """
+    import requests
+
+    for line in requests.get(f"{url}/metrics", timeout=10).text.splitlines():
+        if line.startswith(f"{name} "):
+            return float(line.split()[1])
+    return None
+
+
+def level_stats(concurrency, results, elapsed, rss_before, rss_after, rss_peak):
+    latencies = sorted(seconds for status, seconds in results if status == 202)
+    total = len(results)
+    shed = sum(1 for status, _ in results if status == 429)
+    errors = sum(1 for status, _ in results if status != 202 and status != 429)
+    return {
+        'concurrency': concurrency,
+        'requests': total,
+        'ok_per_sec': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'error_rate': errors / total if total else 0.0,
+        'shed_rate': shed / total if total else 0.0,
+        'statuses': {str(status): sum(1 for s, _ in results if s == status) for status in sorted({s for s, _ in results})},
+        'rss_mb': rss_after,
+        'rss_peak_mb': rss_peak,
+        'rss_growth_mb': rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+    }
+
+
+# --- Reporting ---
+def print_report(levels, capacity, deliveries, backlog):
+    print(f"{'conc':>5}  {'reqs':>6}  {'ok/s':>7}  {'p50 ms':>8}  {'p95 ms':>8}  {'p99 ms':>8}  "
+          f"{'err %':>6}  {'429 %':>6}  {'RSS MB':>7}  {'ΔRSS MB':>8}")
+    for stats in levels:
+        growth = stats['rss_growth_mb']
+        print(f"{stats['concurrency']:>5}  {stats['requests']:>6}  {stats['ok_per_sec']:>7.1f}  "
+              f"{stats['p50_ms']:>8.1f}  {stats['p95_ms']:>8.1f}  {stats['p99_ms']:>8.1f}  "
+              f"{stats['error_rate'] * 100:>6.2f}  {stats['shed_rate'] * 100:>6.2f}  "
+              f"{stats['rss_mb'] or 0:>7.1f}  {growth if growth is not None else float('nan'):>+8.1f}")
+    print(f"\nTelegram stub: {deliveries}")
+    if backlog is not None:
+        print(f"Outbox backlog at the end: {backlog:.0f} submissions still waiting for delivery")
+    if capacity:
+        print(f"Capacity: {capacity['concurrency']} concurrent signers at {capacity['ok_per_sec']:.1f} submissions/s "
+              f"within the objective (p95 <= {capacity['slo_p95_ms']:.0f} ms, errors <= {capacity['slo_error_rate'] * 100:.1f}%)")
+    else:
+        print("Capacity: no level met the objective")
+
+
+def capacity(levels, slo_p95_ms, slo_error_rate):
+    """ The highest-throughput level within the objective; shed requests count as errors here """
+    within = [stats for stats in levels
+              if stats['p95_ms'] <= slo_p95_ms and stats['error_rate'] + stats['shed_rate'] <= slo_error_rate]
+    if not within:
+        return None
+    best = max(within, key=lambda stats: stats['ok_per_sec'])
+    return {'concurrency': best['concurrency'], 'ok_per_sec': best['ok_per_sec'],
+            'slo_p95_ms': slo_p95_ms, 'slo_error_rate': slo_error_rate}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test /submit against a stub Telegram server.")
+    parser.add_argument('--concurrency', default='1,2,4,8,16,32', help="Comma-separated signer counts (default: 1,2,4,8,16,32)")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds per concurrency level (default: 10)")
+    parser.add_argument('--warmup', type=int, default=20, help="Submissions before the first level (default: 20)")
+    parser.add_argument('--signature', choices=['png', 'vector', 'mixed'], default='mixed')
+    parser.add_argument('--timeout', type=float, default=30.0, help="Client timeout per request in seconds")
+    parser.add_argument('--latency', type=float, default=0.1, help="Stub Telegram response time in seconds (default: 0.1)")
+    parser.add_argument('--jitter', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of Telegram calls answered 500")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Fraction of Telegram calls answered 429")
+    parser.add_argument('--flood-limit', type=int, default=0, help="Stub answers 429 past this many calls per second")
+    parser.add_argument('--slo-p95-ms', type=float, default=1000.0, help="Latency objective for the capacity line")
+    parser.add_argument('--slo-error-rate', type=float, default=0.01, help="Error objective for the capacity line")
+    parser.add_argument('--save', help="Write the report to this JSON file")
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)  # internal: run the app server
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve()
+        return 0
+
+    levels_to_run = [int(level) for level in args.concurrency.split(',')]
+    bodies = form_bodies(args.signature)
+
+    with StubTelegramServer(args.latency, args.jitter, args.error_rate, args.rate_limit_rate,
+                            flood_limit=args.flood_limit) as stub, \
+            tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ)
+        env.setdefault('TELEGRAM_BOT_TOKEN', 'load-token')
+        env.setdefault('TELEGRAM_CHAT_ID', '1')
+        env.update(
+            TELEGRAM_API_URL=stub.url,
+            OUTBOX_DIR=os.path.join(workdir, 'outbox'),
+            ARCHIVE_DIR=os.path.join(workdir, 'archive'),
+            PROFILE_DIR=os.path.join(workdir, 'profiles'),
+        )
+        with AppServer(env) as server:
+            load = Load(server.url, bodies, args.timeout)
+            import requests
+            with requests.Session() as session:
+                session.get(f"{server.url}/warmup", timeout=args.timeout)
+                for _ in range(args.warmup):
+                    load.submit(session)
+
+            levels = []
+            for concurrency in levels_to_run:
+                rss_before = server.rss_mb()
+                with RssSampler(server) as sampler:
+                    started = time.perf_counter()
+                    results = load.run(concurrency, args.duration)
+                    elapsed = time.perf_counter() - started
+                stats = level_stats(concurrency, results, elapsed, rss_before, server.rss_mb(), sampler.peak)
+                levels.append(stats)
+                print(f"  {concurrency} signers: {stats['ok_per_sec']:.1f} ok/s, p95 {stats['p95_ms']:.0f} ms",
+                      file=sys.stderr, flush=True)
+            # Delivery is asynchronous: with Telegram's flood limits it can fall behind accepted submissions
+            backlog = scrape_metric(server.url, 'outbox_backlog')
+
+        deliveries = {}
+        for method, _, status in stub.requests:
+            key = f"{method} {status}"
+            deliveries[key] = deliveries.get(key, 0) + 1
+
+    result = capacity(levels, args.slo_p95_ms, args.slo_error_rate)
+    print_report(levels, result, deliveries, backlog)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'args': vars(args), 'levels': levels,
+                       'capacity': result, 'telegram': deliveries, 'outbox_backlog': backlog}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Peak memory allocated per upload, buffered vs streamed.
+
+Each case uploads one rendered agreement to a stub Telegram server running in
+a separate process, and reports the peak traced allocation above the starting
+point (tracemalloc), i.e. the extra memory one request holds while its upload
+is in flight:
+
+    python benchmarks/memory.py
+    python benchmarks/memory.py --iterations 50 --json
+
+'buffered' cases reproduce the old path: getvalue() on the saved BytesIO and
+a requests multipart body built in memory. 'render' is shared by both paths;
+its peak is mostly zlib's deflate window, which is freed before the upload.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from fixtures import sample_form  # noqa: E402
+
+
+def render(main, agreement, path):
+    main.create_word_agreement_chunks(agreement)
+
+
+def buffered_upload(main, document_stream, path):
+    """ /submit before: the saved BytesIO copied out and encoded into an in-memory multipart body """
+    files = {'document': ('Agreement.docx', document_stream.getvalue(), 'application/octet-stream')}
+    data = {'chat_id': main.telegram_client.chat_id, 'caption': 'bench'}
+    response = main.telegram_client.session.post(main.telegram_client.method_url('sendDocument'), data=data, files=files)
+    response.raise_for_status()
+
+
+def streamed_upload(main, chunks, path):
+    if not main.telegram_client.send_document(chunks, 'Agreement.docx', 'bench').ok:
+        raise RuntimeError("upload failed")
+
+
+def buffered_outbox_upload(main, document, path):
+    """ Outbox worker before: the stored file read whole into a requests multipart body """
+    with open(path, 'rb') as f:
+        files = {'document': ('Agreement.docx', f, 'application/octet-stream')}
+        data = {'chat_id': main.telegram_client.chat_id, 'caption': 'bench'}
+        response = main.telegram_client.session.post(main.telegram_client.method_url('sendDocument'), data=data, files=files)
+    response.raise_for_status()
+
+
+def streamed_outbox_upload(main, document, path):
+    with open(path, 'rb') as f:
+        if not main.telegram_client.send_document(f, 'Agreement.docx', 'bench').ok:
+            raise RuntimeError("upload failed")
+
+
+# name -> (operation, document form it takes: 'data', 'stream' or 'chunks')
+CASES = {
+    'render': (render, 'data'),
+    'upload_buffered': (buffered_upload, 'stream'),
+    'upload_streamed': (streamed_upload, 'chunks'),
+    'outbox_upload_buffered': (buffered_outbox_upload, None),
+    'outbox_upload_streamed': (streamed_outbox_upload, None),
+}
+
+
+def peak_bytes(operation):
+    tracemalloc.reset_peak()
+    start, _ = tracemalloc.get_traced_memory()
+    operation()
+    _, peak = tracemalloc.get_traced_memory()
+    return peak - start
+
+
+def measure(iterations, workdir):
+    import main as app_main
+
+    records = []
+    for n in range(5):
+        agreement = app_main.parse_agreement(sample_form(n, 'png'))
+        agreement.signature = app_main.signature_from_data_url(agreement.signature_data_url)
+        records.append(agreement)
+    documents = {
+        'data': records,
+        'stream': [app_main.create_word_agreement(record) for record in records],
+        'chunks': [app_main.create_word_agreement_chunks(record) for record in records],
+        None: [None] * len(records),
+    }
+    document_path = os.path.join(workdir, 'stored.docx')
+    with open(document_path, 'wb') as f:
+        f.write(documents['stream'][0].getvalue())
+
+    # Warm every path (template compile, connection pool, imports) before measuring
+    for case, form in CASES.values():
+        case(app_main, documents[form][0], document_path)
+
+    tracemalloc.start()
+    results = {}
+    for name, (case, form) in CASES.items():
+        peaks = [peak_bytes(lambda: case(app_main, documents[form][i % len(records)], document_path))
+                 for i in range(iterations)]
+        results[name] = {'median_kib': statistics.median(peaks) / 1024, 'max_kib': max(peaks) / 1024}
+    tracemalloc.stop()
+    return results, os.path.getsize(document_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Peak per-request allocation of buffered vs streamed uploads.")
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    stub = subprocess.Popen([sys.executable, os.path.join(HERE, 'telegram_stub.py')], stdout=subprocess.PIPE, text=True)
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.environ.update(TELEGRAM_BOT_TOKEN='bench-token', TELEGRAM_CHAT_ID='1',
+                              TELEGRAM_API_URL=stub.stdout.readline().strip(), OUTBOX_DIR=os.path.join(workdir, 'outbox'),
+                              TELEGRAM_GLOBAL_RATE='0', TELEGRAM_CHAT_PER_MINUTE='0')
+            results, document_size = measure(args.iterations, workdir)
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    if args.json:
+        print(json.dumps({'document_kib': document_size / 1024, 'cases': results}))
+        return 0
+    print(f"document size: {document_size / 1024:.1f} KiB")
+    width = max(len(name) for name in results)
+    print(f"{'case':<{width}}  {'median KiB':>10}  {'max KiB':>9}")
+    for name, stats in results.items():
+        print(f"{name:<{width}}  {stats['median_kib']:>10.1f}  {stats['max_kib']:>9.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
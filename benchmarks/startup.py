@@ -0,0 +1,113 @@
+"""
+Cold-start import benchmark.
+
+Imports each module in a fresh interpreter with -X importtime and reports the
+median cumulative import cost. Also checks that `import main` does not pull in
+any of the heavy modules that are meant to load lazily, and that serving the
+form (GET /, which loads the property definitions) does not load num2words or
+python-docx either.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --repeat 9 --budget-ms 250 --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    'main',
+    'flask',
+    'dotenv',
+    'docx',
+    'lxml.etree',
+    'num2words',
+    'dateutil.relativedelta',
+    'requests',
+    'PIL.Image',
+    'agreement_template',
+    'ooxml_writer',
+]
+
+# Must not be imported by `import main`
+LAZY_MODULES = ['docx', 'lxml', 'num2words', 'dateutil', 'requests', 'PIL']
+# Must not be imported by serving GET /
+FORM_LAZY_MODULES = ['docx', 'lxml', 'num2words']
+
+
+def import_cost_us(module):
+    """ Cumulative import time of `module` in microseconds, measured in a fresh interpreter """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    for line in reversed(result.stderr.splitlines()):
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        if name == module:
+            return int(cumulative)
+    raise RuntimeError(f"No importtime entry for {module}")
+
+
+def eager_heavy_modules():
+    code = (
+        'import sys, json, main; '
+        f'print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))'
+    )
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def form_heavy_modules():
+    """ Heavy modules loaded once GET / has been served """
+    code = (
+        'import sys, json, main; '
+        'assert main.app.test_client().get("/").status_code == 200; '
+        f'print(json.dumps([m for m in {FORM_LAZY_MODULES!r} if m in sys.modules]))'
+    )
+    env = dict(os.environ, OUTBOX_AUTOSTART='0')
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report per-module import cost for cold starts.")
+    parser.add_argument('--repeat', type=int, default=5, help="Fresh interpreters per module (default: 5)")
+    parser.add_argument('--budget-ms', type=float, default=None, help="Fail if `import main` exceeds this")
+    parser.add_argument('--json', dest='json_path', help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for module in MODULES:
+        samples = [import_cost_us(module) / 1000 for _ in range(args.repeat)]
+        results[module] = {'median_ms': statistics.median(samples), 'min_ms': min(samples)}
+
+    width = max(len(m) for m in MODULES)
+    print(f"{'module':<{width}}  {'median ms':>10}  {'min ms':>8}")
+    for module, stats in results.items():
+        print(f"{module:<{width}}  {stats['median_ms']:>10.1f}  {stats['min_ms']:>8.1f}")
+
+    eager = eager_heavy_modules()
+    print()
+    print(f"Heavy modules loaded by `import main`: {', '.join(eager) or 'none'}")
+    form_eager = form_heavy_modules()
+    print(f"Heavy modules loaded by GET /: {', '.join(form_eager) or 'none'}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'modules': results, 'eager_heavy_modules': eager, 'form_heavy_modules': form_eager}, f, indent=2)
+
+    failed = bool(eager or form_eager)
+    if args.budget_ms is not None and results['main']['median_ms'] > args.budget_ms:
+        print(f"`import main` took {results['main']['median_ms']:.1f} ms, over the {args.budget_ms:.1f} ms budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
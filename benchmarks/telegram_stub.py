@@ -0,0 +1,163 @@
+"""
+Local stand-in for api.telegram.org.
+
+Accepts any /bot<token>/<method> POST, drains the request body and answers
+like the Bot API. Latency and failures can be injected, flood_limit answers
+429 past that many requests per second, like Telegram's flood control, and
+script lists the statuses (200, 400, 429 or 500) of the first responses in
+order, for tests:
+
+    with StubTelegramServer(latency=0.05, error_rate=0.02, rate_limit_rate=0.01) as stub:
+        os.environ['TELEGRAM_API_URL'] = stub.url
+
+or as a separate process, which prints its URL on the first line:
+
+    python benchmarks/telegram_stub.py --latency 0.05 --error-rate 0.02
+"""
+import argparse
+import json
+import random
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubTelegramServer:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0, retry_after=1, seed=0,
+                 flood_limit=0, script=()):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.flood_limit = flood_limit
+        self.script = list(script)
+        self._recent = []  # arrival times within the last second
+        self.requests = []  # (method, body_bytes, status)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _flooded(self):
+        now = time.monotonic()
+        self._recent = [t for t in self._recent if now - t < 1.0]
+        self._recent.append(now)
+        return self.flood_limit and len(self._recent) > self.flood_limit
+
+    def _outcome(self):
+        with self._lock:
+            roll = self._rng.random()
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            flooded = self._flooded()
+            scripted = self.script.pop(0) if self.script else None
+        if scripted == 400:
+            return delay, 400, {'ok': False, 'error_code': 400, 'description': 'Bad Request: chat not found'}
+        if scripted == 200:
+            return delay, 200, {'ok': True, 'result': {'message_id': 1}}
+        if flooded or scripted == 429 or (scripted is None and roll < self.rate_limit_rate):
+            return delay, 429, {'ok': False, 'error_code': 429,
+                                'description': f'Too Many Requests: retry after {self.retry_after}',
+                                'parameters': {'retry_after': self.retry_after}}
+        if scripted == 500 or (scripted is None and roll < self.rate_limit_rate + self.error_rate):
+            return delay, 500, {'ok': False, 'error_code': 500, 'description': 'Internal Server Error'}
+        return delay, 200, {'ok': True, 'result': {'message_id': 1}}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+            def setup(self):
+                super().setup()
+                # Headers and body go out as separate writes; without this, Nagle plus
+                # delayed ACKs add ~40 ms to every response
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_POST(self):
+                body = self._read_body()
+                delay, status, payload = stub._outcome()
+                if delay:
+                    time.sleep(delay)
+                method = self.path.rsplit('/', 1)[-1]
+                if method == 'sendMediaGroup' and payload['ok']:
+                    payload = dict(payload, result=[payload['result']])
+                with stub._lock:
+                    stub.requests.append((method, len(body), status))
+
+                data = json.dumps(payload).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client went away mid-request, e.g. an app server being stopped
+
+            def _read_body(self):
+                if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+                    chunks = []
+                    while True:
+                        size = int(self.rfile.readline().split(b';')[0], 16)
+                        if size == 0:
+                            self.rfile.readline()
+                            return b''.join(chunks)
+                        chunks.append(self.rfile.read(size))
+                        self.rfile.readline()
+                return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a stub Telegram Bot API until interrupted.")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Up to this many extra seconds, uniformly")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction answered 500")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Fraction answered 429")
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--flood-limit', type=int, default=0, help="Answer 429 past this many requests per second")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    stub = StubTelegramServer(args.latency, args.jitter, args.error_rate, args.rate_limit_rate,
+                              args.retry_after, args.seed, args.flood_limit).start()
+    print(stub.url, flush=True)
+    try:
+        stub._thread.join()
+    except KeyboardInterrupt:
+        stub.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
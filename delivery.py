@@ -0,0 +1,721 @@
+import heapq
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import namedtuple
+from contextlib import ExitStack, contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; claims are then only exclusive within one process
+    fcntl = None
+
+from metrics import TELEGRAM_BATCH_DOCUMENTS, TELEGRAM_THROTTLE_SECONDS, TELEGRAM_UPLOADS, span
+
+DOCX_MIME_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# ok: delivered; retryable: worth another attempt; retry_after: seconds Telegram asked us to wait;
+# error_class: short, low-cardinality label for metrics ('' on success)
+SendResult = namedtuple('SendResult', 'ok description retryable retry_after error_class')
+NOT_CONFIGURED = SendResult(False, "Credentials missing", False, None, 'credentials_missing')
+
+# Telegram allows a media group of 2-10 documents
+MAX_MEDIA_GROUP = 10
+
+
+def count_upload(result, documents=1):
+    TELEGRAM_UPLOADS.inc(documents, result='ok' if result.ok else 'error', error_class=result.error_class)
+    return result
+
+
+# --- Rate Limiting ---
+class TokenBucket:
+    """ rate tokens per second up to capacity; rate 0 means unlimited. block() stops it for a while """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if self.rate:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self):
+        """ Seconds until a token is free, without taking it """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = 0.0 if not self.rate or self._tokens >= 1 else (1 - self._tokens) / self.rate
+            return max(wait, self._blocked_until - now)
+
+    def reserve(self):
+        """ Takes a token, going into debt if none is left. Returns the seconds to wait before using it """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = 0.0
+            if self.rate:
+                self._tokens -= 1
+                if self._tokens < 0:
+                    wait = -self._tokens / self.rate
+            return max(wait, self._blocked_until - now)
+
+    def block(self, seconds):
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class RateLimiter:
+    """
+    Telegram's flood limits: one bucket for the whole bot and one per chat.
+    A 429's retry_after blocks the chat's bucket for that long.
+    """
+
+    def __init__(self, global_rate=30.0, chat_rate=20 / 60, chat_burst=3):
+        self.global_bucket = TokenBucket(global_rate, int(global_rate))
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._chats = {}
+        self._lock = threading.Lock()
+
+    def _chat(self, chat_id):
+        with self._lock:
+            bucket = self._chats.get(chat_id)
+            if bucket is None:
+                bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+            return bucket
+
+    def delay(self, chat_id):
+        return max(self.global_bucket.delay(), self._chat(chat_id).delay())
+
+    def reserve(self, chat_id):
+        """ Takes a slot from both buckets; returns the seconds to wait before sending """
+        waits = {'global': self.global_bucket.reserve(), 'chat': self._chat(chat_id).reserve()}
+        scope = max(waits, key=waits.get)
+        if waits[scope] > 0:
+            TELEGRAM_THROTTLE_SECONDS.inc(waits[scope], scope=scope)
+        return waits[scope]
+
+    def acquire(self, chat_id):
+        wait = self.reserve(chat_id)
+        if wait > 0:
+            time.sleep(wait)
+
+    def retry_after(self, chat_id, seconds):
+        self._chat(chat_id).block(seconds)
+
+
+# --- Streaming Multipart ---
+UPLOAD_BLOCK_SIZE = 16 * 1024  # one TLS record
+
+
+def document_chunks(document):
+    """ bytes, a BytesIO or a list of chunks as a list of bytes-like chunks, without copying """
+    if isinstance(document, (bytes, bytearray, memoryview)):
+        return [document]
+    if hasattr(document, 'getbuffer'):
+        return [document.getbuffer()]
+    return list(document)
+
+
+class MultipartBody:
+    """
+    A multipart/form-data body streamed from documents: each one's chunks (see
+    document_chunks) or an open file read in blocks. No document is ever
+    joined or copied into the body. len() is known up front, so requests sends
+    it with a Content-Length instead of chunked encoding.
+    files is a list of (field name, filename, content type, document).
+    """
+
+    def __init__(self, fields, files):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        lead = ''.join(f'--{boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n{value}\r\n'
+                       for key, value in fields.items())
+        self._parts = []  # (part header, open file or None, chunks)
+        self._length = 0
+        for name, filename, content_type, document in files:
+            header = (f'{lead}--{boundary}\r\n'
+                      f'Content-Disposition: form-data; name="{name}"; filename="{_quote(filename)}"\r\n'
+                      f'Content-Type: {content_type}\r\n\r\n').encode('utf-8')
+            if hasattr(document, 'read') and not hasattr(document, 'getbuffer'):  # an open file, not a BytesIO
+                self._parts.append((header, document, None))
+                document_size = os.fstat(document.fileno()).st_size - document.tell()
+            else:
+                chunks = document_chunks(document)
+                self._parts.append((header, None, chunks))
+                document_size = sum(memoryview(chunk).nbytes for chunk in chunks)
+            self._length += len(header) + document_size
+            lead = '\r\n'  # ends the previous document's data
+        self._tail = f'\r\n--{boundary}--\r\n'.encode('ascii')
+        self._length += len(self._tail)
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        for header, file, chunks in self._parts:
+            yield header
+            if file is not None:
+                yield from iter(lambda: file.read(UPLOAD_BLOCK_SIZE), b'')
+            else:
+                yield from chunks
+        yield self._tail
+
+
+def _quote(value):
+    """ Form-data parameter escaping as browsers (and urllib3) do it """
+    return value.replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
+
+
+# --- Telegram Client ---
+class TelegramClient:
+    """
+    Telegram Bot API client over one pooled keep-alive session. With a
+    limiter (RateLimiter), every send first waits for its slot.
+    """
+
+    def __init__(self, token, chat_id, api_url="https://api.telegram.org", timeout=(5, 60), pool_size=4, limiter=None):
+        self.token = token
+        self.chat_id = chat_id
+        self.api_url = api_url.rstrip('/')
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.limiter = limiter
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        # requests is imported on first use so it stays off the cold-start path
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
+
+    @property
+    def configured(self):
+        return bool(self.token and self.chat_id)
+
+    def method_url(self, method):
+        return f"{self.api_url}/bot{self.token}/{method}"
+
+    def send_delay(self):
+        """ Seconds until the rate limits would let a send through """
+        return self.limiter.delay(self.chat_id) if self.limiter else 0.0
+
+    def sent(self, result, documents=1):
+        """ Counts a send and passes Telegram's retry_after on to the limiter """
+        if result.retry_after and self.limiter:
+            self.limiter.retry_after(self.chat_id, result.retry_after)
+        TELEGRAM_BATCH_DOCUMENTS.observe(documents)
+        return count_upload(result, documents)
+
+    def send_document(self, document, filename, caption):
+        """ Streams a document (chunks, bytes, BytesIO or open file) to sendDocument and classifies the outcome """
+        if not self.configured:
+            return count_upload(NOT_CONFIGURED)
+        if self.limiter:
+            self.limiter.acquire(self.chat_id)
+        with span('telegram_upload'):
+            return self.sent(self._post_document(document, filename, caption))
+
+    def send_media_group(self, documents):
+        """
+        Sends up to MAX_MEDIA_GROUP (document, filename, caption) as one
+        sendMediaGroup album, each keeping its caption. The result covers all.
+        """
+        if len(documents) == 1:
+            return self.send_document(*documents[0])
+        if not self.configured:
+            return count_upload(NOT_CONFIGURED, len(documents))
+        if self.limiter:
+            self.limiter.acquire(self.chat_id)
+        with span('telegram_upload'):
+            return self.sent(self._post('sendMediaGroup', self.media_group_body(documents)), len(documents))
+
+    def _post_document(self, document, filename, caption):
+        return self._post('sendDocument', self.document_body(document, filename, caption))
+
+    def _post(self, method, body):
+        import requests
+
+        try:
+            response = self.session.post(self.method_url(method), data=body,
+                                         headers={'Content-Type': body.content_type}, timeout=self.timeout)
+        except requests.RequestException as e:
+            return SendResult(False, str(e), True, None, 'network')
+        return parse_response(response)
+
+    def document_body(self, document, filename, caption):
+        return MultipartBody({'chat_id': self.chat_id, 'caption': caption},
+                             [('document', filename, DOCX_MIME_TYPE, document)])
+
+    def media_group_body(self, documents):
+        if len(documents) > MAX_MEDIA_GROUP:
+            raise ValueError(f"A media group holds at most {MAX_MEDIA_GROUP} documents")
+        media = [{'type': 'document', 'media': f'attach://document{i}', 'caption': caption}
+                 for i, (_, _, caption) in enumerate(documents)]
+        return MultipartBody({'chat_id': self.chat_id, 'media': json.dumps(media)},
+                             [(f'document{i}', filename, DOCX_MIME_TYPE, document)
+                              for i, (document, filename, _) in enumerate(documents)])
+
+
+class AsyncTelegramClient:
+    """
+    sendDocument for asyncio callers over one shared httpx.AsyncClient pool.
+    httpx is optional: without it, uploads run through the sync client on a
+    thread pool of the same size.
+    """
+
+    def __init__(self, client, pool_size=8):
+        self.client = client
+        self.pool_size = pool_size
+        self._http = None
+        self._executor = None
+
+    def _http_client(self, httpx):
+        if self._http is None:
+            connect, read = self.client.timeout
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(read, connect=connect, pool=None),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            )
+        return self._http
+
+    async def send_document(self, document, filename, caption):
+        """ Uploads document bytes and classifies the outcome like TelegramClient.send_document """
+        if not self.client.configured:
+            return count_upload(NOT_CONFIGURED)
+        limiter = self.client.limiter
+        if limiter:
+            import asyncio
+
+            wait = limiter.reserve(self.client.chat_id)
+            if wait > 0:
+                await asyncio.sleep(wait)
+        with span('telegram_upload'):
+            return self.client.sent(await self._post_document(document, filename, caption))
+
+    async def _post_document(self, document, filename, caption):
+        try:
+            import httpx
+        except ImportError:
+            import asyncio
+            from concurrent.futures import ThreadPoolExecutor
+
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.pool_size, thread_name_prefix='telegram-upload')
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self.client._post_document, document, filename, caption)
+
+        body = self.client.document_body(document, filename, caption)
+
+        async def stream():
+            for chunk in body:
+                yield chunk if isinstance(chunk, bytes) else bytes(chunk)
+
+        headers = {'Content-Type': body.content_type, 'Content-Length': str(len(body))}
+        try:
+            response = await self._http_client(httpx).post(
+                self.client.method_url('sendDocument'), content=stream(), headers=headers)
+        except httpx.HTTPError as e:
+            return SendResult(False, str(e) or type(e).__name__, True, None, 'network')
+        return parse_response(response)
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+def error_class(description):
+    """ 'Bad Request: chat not found' -> 'bad_request'; Telegram prefixes descriptions with the HTTP reason """
+    prefix = description.split(':', 1)[0].strip().lower()
+    return re.sub(r'[^a-z0-9]+', '_', prefix).strip('_')[:40] or 'unknown'
+
+
+def parse_response(response):
+    try:
+        response_json = response.json()
+    except ValueError:
+        return SendResult(False, f"HTTP {response.status_code}", response.status_code >= 500, None,
+                          f"http_{response.status_code}")
+
+    if response_json.get("ok"):
+        return SendResult(True, "Sent successfully", False, None, '')
+
+    description = response_json.get("description", "Unknown error")
+    error_code = response_json.get("error_code", response.status_code)
+    retry_after = (response_json.get("parameters") or {}).get("retry_after")
+    if error_code == 429 or retry_after:
+        return SendResult(False, description, True, float(retry_after or 1), 'too_many_requests')
+    return SendResult(False, description, error_code >= 500, None, error_class(description))
+
+
+# --- Durable Outbox ---
+class Outbox:
+    """
+    On-disk outbox drained by background worker threads.
+
+    Each submission is stored as <id>.docx plus an <id>.json record holding its
+    delivery status. Records are written atomically, and anything still pending
+    when the process starts is picked up again, so a crash or a failed upload
+    never loses an agreement.
+
+    A worker that picks up a submission waits batch_window seconds (or for as
+    long as the client's rate limits would hold it anyway) for more to fall
+    due, and sends up to max_batch of them as one media group.
+
+    Sent and failed records move to done/, so recovery only rescans what is
+    still outstanding, and are deleted after retention seconds. A sent
+    document is deleted straight away; a failed one moves to done/ with its
+    record and expires with it, since both hold the tenant's Aadhar number
+    and signature. claim() is exclusive across threads and processes sharing
+    the directory; a 'sending' record is only claimed again once
+    claim_timeout has passed without an outcome (the sender died mid-upload).
+    """
+
+    def __init__(self, directory, client, workers=2, max_attempts=8, backoff_base=2.0, backoff_cap=300.0,
+                 batch_window=1.0, max_batch=MAX_MEDIA_GROUP, claim_timeout=300.0, retention=7 * 24 * 3600):
+        self.directory = directory
+        self.client = client
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.batch_window = batch_window
+        self.max_batch = min(max_batch, MAX_MEDIA_GROUP)
+        self.claim_timeout = claim_timeout
+        self.retention = retention
+
+        self._due = []  # heap of (due_at, submission_id)
+        self._cond = threading.Condition()
+        self._threads = []
+        self._started = False
+        self._stopping = False
+        self._paused_until = 0.0  # set from Telegram's retry_after; applies to the whole bot
+        self._claim_lock = threading.Lock()
+        self._pruned_at = 0.0
+
+    # --- Storage ---
+    def _path(self, submission_id, ext):
+        return os.path.join(self.directory, f"{submission_id}.{ext}")
+
+    def _done_path(self, submission_id, ext='json'):
+        return os.path.join(self.directory, 'done', f"{submission_id}.{ext}")
+
+    def _write_record(self, record):
+        path = self._path(record['id'], 'json')
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(record, f)
+        os.replace(tmp_path, path)
+
+    def _finish_record(self, record):
+        """
+        Writes a sent or failed record and moves it out of the recovery scan,
+        deleting the document if it was sent and moving it along if it failed.
+        Safe to repeat after a crash part way through.
+        """
+        self._write_record(record)
+        os.makedirs(os.path.join(self.directory, 'done'), exist_ok=True)
+        self._finish_document(record['id'], record['status'])
+        os.replace(self._path(record['id'], 'json'), self._done_path(record['id']))
+
+    def _finish_document(self, submission_id, status):
+        try:
+            if status == 'sent':
+                os.remove(self._path(submission_id, 'docx'))
+            else:
+                os.replace(self._path(submission_id, 'docx'), self._done_path(submission_id, 'docx'))
+        except FileNotFoundError:
+            pass
+
+    def _read_record(self, submission_id):
+        for path in (self._path(submission_id, 'json'), self._done_path(submission_id)):
+            try:
+                with open(path) as f:
+                    return json.load(f)
+            except (FileNotFoundError, ValueError):
+                continue
+        return None
+
+    @contextmanager
+    def _claiming(self):
+        """ Serializes claims between threads, and between processes where flock exists """
+        with self._claim_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.directory, '.claim.lock'), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def prune(self):
+        """ Deletes finished records, and the documents of failed ones, older than retention """
+        self._pruned_at = time.time()
+        done_dir = os.path.join(self.directory, 'done')
+        try:
+            names = os.listdir(done_dir)
+        except FileNotFoundError:
+            return
+        cutoff = time.time() - self.retention
+        for name in names:
+            path = os.path.join(done_dir, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    # --- Public API ---
+    def enqueue(self, document_stream, filename, caption, schedule=True):
+        """
+        Persists the document (a BytesIO or a list of chunks) and schedules
+        delivery. Returns the submission id.
+        With schedule=False the caller makes the first attempt itself (claim,
+        send, complete) or passes it to the workers with hand_over().
+        """
+        self.start()
+        submission_id = uuid.uuid4().hex
+        with open(self._path(submission_id, 'docx'), 'wb') as f:
+            f.writelines(document_chunks(document_stream))
+
+        now = time.time()
+        self._write_record({
+            'id': submission_id,
+            'filename': filename,
+            'caption': caption,
+            'status': 'pending',
+            'attempts': 0,
+            'last_error': None,
+            'created_at': now,
+            'next_attempt_at': now,
+            'sent_at': None,
+        })
+        if schedule:
+            self._schedule(submission_id, now)
+        return submission_id
+
+    def hand_over(self, submission_id):
+        """ Schedules a submission enqueued with schedule=False for the workers, releasing the caller's claim """
+        with self._claiming():
+            record = self._read_record(submission_id)
+            if record is not None and record['status'] == 'sending':
+                record['status'] = 'pending'
+                self._write_record(record)
+        self._schedule(submission_id, time.time())
+
+    def status(self, submission_id):
+        if not submission_id.isalnum():
+            return None
+        record = self._read_record(submission_id)
+        if record is None:
+            return None
+        record.pop('caption', None)  # may contain the Aadhar number
+        return record
+
+    def backlog(self):
+        """ Submissions waiting for a delivery attempt """
+        with self._cond:
+            return len(self._due)
+
+    def start(self):
+        with self._cond:
+            if self._started:
+                return
+            self._started = True
+            self._stopping = False
+            os.makedirs(self.directory, exist_ok=True)
+            self._recover()
+            self.prune()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"outbox-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        with self._cond:
+            self._threads = []
+            self._started = False
+
+    # --- Scheduling ---
+    def _recover(self):
+        names = os.listdir(self.directory)
+        for name in names:
+            if name.endswith('.docx') and f"{name[:-len('.docx')]}.json" not in names:
+                self._recover_document(name[:-len('.docx')])
+            if not name.endswith('.json'):
+                continue
+            record = self._read_record(name[:-len('.json')])
+            if record is None:
+                continue
+            if record['status'] == 'pending':
+                heapq.heappush(self._due, (record['next_attempt_at'], record['id']))
+            elif record['status'] == 'sending':
+                # Another process may still be uploading it; retried once the claim goes stale
+                heapq.heappush(self._due, (record.get('claimed_at', 0) + self.claim_timeout, record['id']))
+            else:
+                self._finish_record(record)  # finished before done/ existed
+
+    def _recover_document(self, submission_id):
+        """ A document without a pending record: finished already, or left by a crash before its record was written """
+        path = self._path(submission_id, 'docx')
+        try:
+            if os.stat(path).st_mtime > time.time() - self.claim_timeout:
+                return  # may be an enqueue in progress in another process
+        except FileNotFoundError:
+            return
+        record = self._read_record(submission_id)
+        self._finish_document(submission_id, record['status'] if record else 'sent')
+
+    def _schedule(self, submission_id, due_at):
+        with self._cond:
+            heapq.heappush(self._due, (due_at, submission_id))
+            self._cond.notify()
+
+    def _next_due(self):
+        with self._cond:
+            while True:
+                if self._stopping:
+                    return None
+                now = time.time()
+                if self._due:
+                    ready_at = max(self._due[0][0], self._paused_until)
+                    if ready_at <= now:
+                        return heapq.heappop(self._due)[1]
+                    self._cond.wait(ready_at - now)
+                else:
+                    self._cond.wait()
+
+    def _next_batch(self):
+        """ The next due submission plus any others due within the batching window """
+        submission_id = self._next_due()
+        if submission_id is None:
+            return None
+        if self.max_batch <= 1:
+            return [submission_id]
+
+        batch = [submission_id]
+        deadline = time.time() + max(self.batch_window, self.client.send_delay())
+        with self._cond:
+            while len(batch) < self.max_batch and not self._stopping:
+                now = time.time()
+                ready_at = max(self._due[0][0], self._paused_until) if self._due else deadline
+                if self._due and ready_at <= now:
+                    batch.append(heapq.heappop(self._due)[1])
+                elif now >= deadline:
+                    break
+                else:
+                    self._cond.wait(min(ready_at, deadline) - now)
+        return batch
+
+    def _backoff(self, attempts):
+        delay = min(self.backoff_cap, self.backoff_base * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    # --- Workers ---
+    def _worker(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._deliver(batch)
+            except Exception as e:
+                print(f"Error delivering {', '.join(batch)}: {e}")
+                for submission_id in batch:  # claimed ones are picked up again once the claim goes stale
+                    self._schedule(submission_id, time.time() + self.claim_timeout)
+            if time.time() - self._pruned_at > 3600:
+                self.prune()
+
+    def _deliver(self, batch):
+        records = [record for record in map(self.claim, batch) if record is not None]
+        if not records:
+            return
+        with ExitStack() as stack:
+            documents = [(stack.enter_context(self.open_document(record['id'])), record['filename'], record['caption'])
+                         for record in records]
+            result = self.client.send_media_group(documents)
+            if len(records) > 1 and not result.ok and not result.retryable:
+                # One bad document must not sink the others: send each on its own
+                results = []
+                for f, filename, caption in documents:
+                    f.seek(0)
+                    results.append(self.client.send_document(f, filename, caption))
+            else:
+                results = [result] * len(records)
+        for record, result in zip(records, results):
+            self.complete(record, result)
+
+    # --- Attempts ---
+    def claim(self, submission_id):
+        """ Marks a delivery attempt as started and returns its record, or None if there is nothing to send """
+        with self._claiming():
+            record = self._read_record(submission_id)
+            if record is None or record['status'] not in ('pending', 'sending'):
+                return None
+            now = time.time()
+            if record['status'] == 'sending' and now - record.get('claimed_at', 0) < self.claim_timeout:
+                return None  # another attempt is in flight
+
+            record.update(status='sending', attempts=record['attempts'] + 1, claimed_at=now)
+            self._write_record(record)
+            return record
+
+    def open_document(self, submission_id):
+        return open(self._path(submission_id, 'docx'), 'rb')
+
+    def complete(self, record, result):
+        """ Records the outcome of a claimed attempt: sent, failed, or rescheduled with backoff """
+        submission_id = record['id']
+        now = time.time()
+        if result.ok:
+            record.update(status='sent', last_error=None, sent_at=now)
+            self._finish_record(record)
+            return
+
+        record['last_error'] = result.description
+        if not result.retryable or record['attempts'] >= self.max_attempts:
+            record['status'] = 'failed'
+            self._finish_record(record)
+            return
+
+        if result.retry_after:
+            delay = result.retry_after
+            with self._cond:
+                self._paused_until = max(self._paused_until, now + delay)
+        else:
+            delay = self._backoff(record['attempts'])
+        record.update(status='pending', next_attempt_at=now + delay)
+        self._write_record(record)
+        self._schedule(submission_id, now + delay)
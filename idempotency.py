@@ -0,0 +1,91 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def canonical_key(fields, names):
+    """ sha256 over the named fields (whitespace-trimmed, in a fixed order); other form fields are ignored """
+    values = [[name, str(fields.get(name) or '').strip()] for name in names]
+    return hashlib.sha256(json.dumps(values, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+class _Entry:
+    __slots__ = ('done', 'result', 'failed', 'expires_at')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+        self.expires_at = float('inf')  # in flight entries never expire
+
+
+class IdempotencyCache:
+    """
+    Bounded LRU of recent results with TTL eviction.
+
+    The first caller for a key computes the result; callers arriving while it is
+    in flight block until it finishes and get the same result. Results that
+    cacheable() rejects (e.g. server errors) are handed to those waiters but not
+    kept, so a later retry computes afresh.
+    """
+
+    def __init__(self, max_entries=1024, ttl=600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self, now):
+        # Entries are in LRU order, not expiry order, so scan for expired ones
+        expired = [key for key, entry in self._entries.items() if entry.expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)  # waiters keep their own reference to an evicted entry
+
+    def _discard(self, key, entry):
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+
+    def get_or_compute(self, key, compute, cacheable=lambda result: True):
+        """ Returns (result, replayed): replayed is True when the result came from an earlier or concurrent call """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                del self._entries[key]
+                entry = None
+            owner = entry is None
+            if owner:
+                entry = self._entries[key] = _Entry()
+                self._evict(now)
+            else:
+                self._entries.move_to_end(key)
+
+        if not owner:
+            entry.done.wait()
+            if entry.failed:
+                return self.get_or_compute(key, compute, cacheable)
+            return entry.result, True
+
+        try:
+            result = compute()
+        except BaseException:
+            entry.failed = True
+            self._discard(key, entry)
+            entry.done.set()
+            raise
+
+        entry.result = result
+        if cacheable(result):
+            entry.expires_at = time.monotonic() + self.ttl
+        else:
+            self._discard(key, entry)
+        entry.done.set()
+        return result, False
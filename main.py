@@ -1,16 +1,25 @@
-from flask import Flask, render_template_string, request
-from docx import Document
-from docx.shared import Inches, Pt, Cm
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from num2words import num2words
-import base64
+from flask import Flask, Response, render_template_string, request, jsonify
+from markupsafe import escape
 import os
-import uuid
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
-import requests
-import io
+import time
+from contextlib import nullcontext
 from dotenv import load_dotenv
+from delivery import TelegramClient, Outbox, RateLimiter
+from archive import Archive
+from properties import PropertyRegistry, UnknownProperty
+from agreement_model import FIELDS as REQUIRED_FIELDS, Agreement, InvalidAgreement, field_label
+from admission import Admission, Overloaded, oversized_field
+from profiling import Profiler, parse_modes
+from idempotency import IdempotencyCache, canonical_key
+import rendering
+from rendering import amount_in_words
+from signature import SignatureError, signature_from_data_url
+from assets import PrecompressedBody, asset_url, find_asset
+import metrics
+from metrics import span
+
+# Heavy modules (docx/lxml, num2words, dateutil, requests, PIL) are imported on the
+# code paths that use them, so a cold start serving GET / only pays for Flask.
 
 # Load environment variables
 load_dotenv()
@@ -18,239 +27,146 @@ load_dotenv()
 # --- Configuration ---
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+OUTBOX_DIR = os.getenv("OUTBOX_DIR", "/tmp/agreement_outbox")
+DELIVERY_WORKERS = int(os.getenv("DELIVERY_WORKERS", "2"))
+# Start the outbox workers (and recover undelivered submissions) when the app loads; the batch and
+# re-render CLIs and their pool workers turn this off, since they import the app without serving it
+OUTBOX_AUTOSTART = os.getenv("OUTBOX_AUTOSTART", "1") == "1"
+# Opt-in for serverless hosts (e.g. Vercel), where background threads are frozen once the response is
+# sent: /submit then makes the first Telegram upload itself before answering. Off, it answers as soon
+# as the submission is in the outbox and the workers deliver it
+DELIVER_INLINE = os.getenv("DELIVER_INLINE", "0") == "1"
+# Telegram's flood limits (0 disables one); sends wait for a slot instead of collecting 429s
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))  # per second, whole bot
+TELEGRAM_CHAT_PER_MINUTE = float(os.getenv("TELEGRAM_CHAT_PER_MINUTE", "20"))
+TELEGRAM_CHAT_BURST = int(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+# Submissions falling due within this many seconds go out together as one media group
+TELEGRAM_BATCH_WINDOW = float(os.getenv("TELEGRAM_BATCH_WINDOW", "1.0"))
+# 'vector' posts the pen strokes (embedded as a DrawingML shape); 'png' posts the canvas bitmap
+SIGNATURE_FORMAT = os.getenv("SIGNATURE_FORMAT", "vector")
+# The page references content-hashed assets, so it only needs revalidating via its ETag
+FORM_CACHE_CONTROL = os.getenv("FORM_CACHE_CONTROL", "public, max-age=3600")
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "/tmp/agreement_archive")
+# A repeat of the same submission within this many seconds replays the first response
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "600"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "1024"))
+# Required in the X-Admin-Token header by the archive endpoints and /batch; unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Worker processes shared by every /batch upload (0: CPU count)
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "0"))
+
+# 'ooxml' writes the .docx parts directly; 'docx' renders through python-docx (kept for comparison)
+AGREEMENT_BACKEND = os.getenv("AGREEMENT_BACKEND", "ooxml")
+# Per-property caretaker, city and terms; re-read whenever the file changes
+PROPERTIES_FILE = os.getenv("PROPERTIES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "properties.json"))
+TEMPLATE_CACHE_SIZE = int(os.getenv("TEMPLATE_CACHE_SIZE", "16"))
+
+# Admission control for /submit: builds running at once (0 = unlimited), how many more may queue
+# for a slot and for how long; past that the submission is answered 429 with Retry-After
+SUBMIT_MAX_IN_FLIGHT = int(os.getenv("SUBMIT_MAX_IN_FLIGHT", "8"))
+SUBMIT_MAX_WAITING = int(os.getenv("SUBMIT_MAX_WAITING", "16"))
+SUBMIT_MAX_WAIT = float(os.getenv("SUBMIT_MAX_WAIT", "2.0"))
+SUBMIT_RETRY_AFTER = int(os.getenv("SUBMIT_RETRY_AFTER", "2"))
+# Request body caps: /submit is one form with one signature, everything else (e.g. /batch uploads) gets MAX_CONTENT_LENGTH
+SUBMIT_MAX_BYTES = int(os.getenv("SUBMIT_MAX_BYTES", str(2 * 1024 * 1024)))
+MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", str(32 * 1024 * 1024)))
+
+# On-demand profiling of /submit: an X-Profile header (cpu, memory or cpu,memory) with the
+# X-Admin-Token, or a random PROFILE_SAMPLE_RATE of submissions in PROFILE_SAMPLE_MODES
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/agreement_profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SAMPLE_MODES = parse_modes(os.getenv("PROFILE_SAMPLE_MODES", "cpu"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
 
 app = Flask(__name__)
-
-# --- Helper Function for Date Formatting ---
-def format_date_with_suffix(d):
-    """ Formats a date object into '03rd day of August 2025' style """
-    day = d.day
-    if 4 <= day <= 20 or 24 <= day <= 30:
-        suffix = "th"
-    else:
-        suffix = ["st", "nd", "rd"][day % 10 - 1]
-    return f"{day:02d}{suffix} day of {d.strftime('%B %Y')}"
+app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 
 # --- Telegram Bot Function ---
-def send_file_to_telegram(document_stream, filename, caption):
-    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
-        return False, "Credentials missing"
-
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendDocument"
-    document_stream.seek(0)
-    
-    try:
-        files = {
-            'document': (filename, document_stream, 'application/vnd.openxmlformats-officedocument.wordprocessingml.document')
-        }
-        data = {
-            'chat_id': TELEGRAM_CHAT_ID,
-            'caption': caption
-        }
-        
-        response = requests.post(url, data=data, files=files)
-        response_json = response.json()
-        
-        if response_json.get("ok"):
-            return True, "Sent successfully"
-        else:
-            return False, response_json.get("description", "Unknown error")
-            
-    except Exception as e:
-        return False, str(e)
+telegram_limiter = RateLimiter(TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_PER_MINUTE / 60, TELEGRAM_CHAT_BURST)
+telegram_client = TelegramClient(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, api_url=TELEGRAM_API_URL,
+                                 pool_size=DELIVERY_WORKERS, limiter=telegram_limiter)
+outbox = Outbox(OUTBOX_DIR, telegram_client, workers=DELIVERY_WORKERS, batch_window=TELEGRAM_BATCH_WINDOW)
+metrics.Gauge('outbox_backlog', 'Submissions waiting for a delivery attempt', outbox.backlog)
+
+# Undelivered submissions from an earlier process are retried now, not when the next one arrives.
+# __mp_main__ is this file run as a script, re-imported by a spawned or forkserver pool process
+if OUTBOX_AUTOSTART and __name__ != '__mp_main__':
+    outbox.start()
+archive = Archive(ARCHIVE_DIR)
+registry = PropertyRegistry(PROPERTIES_FILE, max_templates=TEMPLATE_CACHE_SIZE)
+profiler = Profiler(PROFILE_DIR, PROFILE_SAMPLE_RATE, PROFILE_SAMPLE_MODES, keep=PROFILE_KEEP)
+
+def cache_stats():
+    return dict(rendering.cache_stats(), templates=registry.stats())
+
+metrics.Gauge('rendering_cache_hits', 'Compiled template, amount-in-words and term date cache hits', lambda: {
+    (name,): stats['hits'] for name, stats in cache_stats().items()}, ['cache'])
+metrics.Gauge('rendering_cache_misses', 'Compiled template, amount-in-words and term date cache misses', lambda: {
+    (name,): stats['misses'] for name, stats in cache_stats().items()}, ['cache'])
+
+def send_file_to_telegram(document, filename, caption):
+    """ Synchronous streaming upload (a BytesIO, chunks or open file); /submit goes through the outbox instead """
+    if hasattr(document, 'seek'):
+        document.seek(0)
+    result = telegram_client.send_document(document, filename, caption)
+    return result.ok, result.description
 
 # --- Word Document Generation Logic ---
-def create_word_agreement(client_data):
-    doc = Document()
-
-    # --- PAGE 1 SETUP ---
-    section_page1 = doc.sections[0]
-    section_page1.page_height = Inches(14.0)
-    section_page1.page_width = Inches(8.5)
-    section_page1.left_margin = Cm(3.0)
-    section_page1.right_margin = Cm(1.5)
-    
-    def add_paragraph_with_runs(texts_and_formats, alignment=WD_ALIGN_PARAGRAPH.JUSTIFY, font_size=16):
-        p = doc.add_paragraph()
-        p.paragraph_format.space_before = Pt(6)
-        p.paragraph_format.space_after = Pt(0)
-        p.paragraph_format.alignment = alignment
-        for text, is_bold in texts_and_formats:
-            run = p.add_run(text)
-            run.font.name = 'Times New Roman'
-            run.font.size = Pt(font_size)
-            run.bold = is_bold
-        return p
-
-    def add_formatted_paragraph(text, size=16, bold=False, align=WD_ALIGN_PARAGRAPH.JUSTIFY):
-        p = doc.add_paragraph()
-        p.paragraph_format.space_after = Pt(0)
-        p.paragraph_format.alignment = align
-        run = p.add_run(text)
-        run.font.name = 'Times New Roman'
-        run.font.size = Pt(size)
-        run.bold = bold
-        return p
+def get_renderer(backend=None, property_id=None):
+    """ The compiled template for a property (the default one if None) """
+    return registry.renderer(property_id, backend or AGREEMENT_BACKEND)
+
+def template_version(property_id=None, backend=None):
+    """ Identifies the compiled template; None for python-docx, whose output is not byte-stable """
+    return getattr(get_renderer(backend, property_id), 'version', None)
+
+def warm_templates():
+    for property_id in registry.properties():
+        get_renderer(property_id=property_id).warm()
+    rendering.warm()
+
+def agreement_term(agreement):
+    """ Memoized rendering.Term (start/end dates and their formatted strings) for the client's stay """
+    return rendering.agreement_term(agreement.start_date, agreement.stay_months)
 
+def agreement_values(agreement):
     # --- Prepare Data ---
-    start_date = datetime.strptime(client_data['start_date'], '%Y-%m-%d').date()
-    stay_months = int(client_data.get('stay_months') or 0)
-    
-    next_month_date = start_date + relativedelta(months=+stay_months)
-    first_day_of_next_month = next_month_date.replace(day=1)
-    end_date = first_day_of_next_month - relativedelta(days=1)
-    
-    start_date_str = format_date_with_suffix(start_date)
-    end_date_str = format_date_with_suffix(end_date)
-    
-    full_name = f"{client_data['first_name']} {client_data['last_name']}"
-    
+    term = agreement_term(agreement)
+    values = {field: getattr(agreement, field) for field in REQUIRED_FIELDS[:-1]}
+
     # Format Addresses
-    full_address = f"{client_data['address']}, {client_data['permanent_district']}, {client_data['permanent_state']} - {client_data['permanent_pincode']}"
+    full_address = f"{agreement.address}, {agreement.permanent_district}, {agreement.permanent_state} - {agreement.permanent_pincode}"
     
     # Since all office fields are now mandatory:
-    full_office_address = f"{client_data['office_address']}, {client_data['office_district']}, {client_data['office_state']} - {client_data['office_pincode']}"
-    
-    rent_in_words = f"Rupees {num2words(int(client_data['rent_price']), lang='en_IN').title()} Only"
-    deposit_in_words = f"Rupees {num2words(int(client_data['security_deposit']), lang='en_IN').title()} Only"
-
-    # --- PAGE 1 CONTENT ---
-    for _ in range(17): doc.add_paragraph()
-
-    add_formatted_paragraph('PAYING GUEST AGREEMENT', size=20, bold=True, align=WD_ALIGN_PARAGRAPH.CENTER)
-    doc.add_paragraph()
-
-    add_paragraph_with_runs([
-        ("THIS AGREEMENT is made and entered in to at Mumbai this ", False),
-        (f"{start_date_str} BETWEEN: MR. JASMEET SINGH", True),
-        (", residing at ", False),
-        ("303/B wing, Palatial Heights, Chandivali Farm Rd, Chandivali, Powai, Mumbai, Maharashtra 400072", True),
-        (", Hereinafter referred to as ", False),
-        ("“CARETAKER”", True),
-        (" (which expression shall mean and include his heirs, executors, administrators and assigns) of the ", False),
-        ("ONE PART", True)
-    ], font_size=16, alignment=WD_ALIGN_PARAGRAPH.JUSTIFY)
+    full_office_address = f"{agreement.office_address}, {agreement.office_district}, {agreement.office_state} - {agreement.office_pincode}"
     
-    doc.add_page_break()
-
-    # --- PAGE 2 & 3 ---
-    legal_section = doc.sections[-1]
-    legal_section.page_height = Inches(14.0)
-    legal_section.page_width = Inches(8.5)
-    legal_section.left_margin = Cm(3.0)
-    legal_section.right_margin = Cm(1.5)
-
-    add_formatted_paragraph('AND', size=14, bold=True, align=WD_ALIGN_PARAGRAPH.CENTER)
-    
-    font_size_main = Pt(14)
-    p_details = doc.add_paragraph()
-    p_details.alignment = WD_ALIGN_PARAGRAPH.LEFT
-    p_details.paragraph_format.space_before = Pt(12)
-    p_details.paragraph_format.space_after = Pt(0)
-
-    def add_run_to_details(text, bold=False):
-        run = p_details.add_run(text)
-        run.font.name = 'Times New Roman'
-        run.font.size = font_size_main
-        run.bold = bold
-
-    add_run_to_details(f"{client_data['salutation']}. ", bold=True)
-    add_run_to_details(full_name, bold=True)
-    add_run_to_details(f", aged {client_data['age']} years, an adult, ")
-    add_run_to_details("Indian Inhabitant permanently residing at: ")
-    add_run_to_details(full_address, bold=True)
-    add_run_to_details(" Having Aadhar card No. ")
-    add_run_to_details(client_data['aadhar_no'], bold=True)
-    add_run_to_details("\n")
-
-    add_run_to_details("Emergency Contact:\n")
-    add_run_to_details("(1) ")
-    add_run_to_details(client_data['ref1_name'], bold=True)
-    add_run_to_details(" Ph- ")
-    add_run_to_details(client_data['ref1_number'], bold=True)
-    add_run_to_details("\n")
-    add_run_to_details("(2) ")
-    add_run_to_details(client_data['ref2_name'], bold=True)
-    add_run_to_details(" Ph- ")
-    add_run_to_details(client_data['ref2_number'], bold=True)
-    add_run_to_details("\n")
-    
-    add_run_to_details("Office Address: ")
-    add_run_to_details(full_office_address, bold=True)
-    add_run_to_details("\n")
-        
-    add_run_to_details("Email ID: ")
-    add_run_to_details(client_data['email_id'], bold=True)
-    add_run_to_details("\n")
-    
-    p_last = doc.add_paragraph()
-    p_last.paragraph_format.space_before = Pt(0)
-    p_last.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-    p_last.add_run("Hereinafter referred to as the ").font.size = font_size_main
-    run = p_last.add_run("“PAYING GUEST” "); run.bold = True; run.font.size = font_size_main
-    p_last.add_run("(which expression shall mean and include his heirs, executors, administrators and assigns) of the ").font.size = font_size_main
-    run = p_last.add_run("SECOND PART."); run.bold = True; run.font.size = font_size_main
-    for run in p_last.runs: run.font.name = 'Times New Roman'
-
-    add_paragraph_with_runs([("WHEREAS", True), (" the party of the one Part is the Host in respect of premises situate at ", False), (client_data['rented_address'], True), (", hereinafter for the sake of brevity referred to as the “Said Room Premises”.", False)], font_size=14)
-    add_paragraph_with_runs([("AND WHEREAS", True), (" the Paying Guests are in need of temporary furnished accommodation and has approached and requested to the owner to permit the said Paying Guest the use of the “Said Room Premises” together with the fixtures, fittings, furniture’s and amenities for residential purposes for a temporary period. AND WHEREAS, the Host has agreed on certain terms and conditions which the parties have mutually agreed themselves as under.", False)], font_size=14)
-    doc.add_paragraph()
-
-    clauses = [
-        [("The Host has permitted the Paying Guest the Use of part bathrooms in the “Said room Premises” situated at ", False), (client_data["rented_address"], True), (" together with fixtures, fittings, furniture and amenities for the purpose of providing temporary residential accommodation on paying guest basis.", False)],
-        [("This Agreement shall be on monthly basis commencing from ", False), (start_date_str, True), (" to ", False), (end_date_str, True)],
-        [('The Paying Guest shall pay the monthly rent between the 1st and 5th day of every month. Any delay beyond the 5th day shall attract a late payment charge of ₹200 (Rupees Two Hundred) per day until the rent is cleared. Upon vacating the “Said Room Premises,” a sum of ₹500 (Rupees Five Hundred) shall be deducted from the Security Deposit towards room cleaning charges, and the remaining balance of the deposit, if any, shall be refunded after adjustment of all dues or damages, if applicable.', True)],
-        [(f"That the Paying Guest shall pay ", False), (f"Rs. {int(client_data['security_deposit']):}/- ({deposit_in_words})", True), (" as a refundable security deposit amount to the Caretaker. which will be returned to the Paying Guest on vacating the “ Said Room Premises” for which ", False), ("ONE MONTH", True), (" notice is required.", False)],
-        [(f"That the Paying Guest shall pay to the caretaker of ", False), (f"Rs. {int(client_data['rent_price']):}/- ({rent_in_words})", True), (" towards the compensation charges for the use of the “Said Room Premises” together with the use of the fixtures, fittings, furniture and amenities and which is not including Electricity Charges (actual) to be shared by all PG’s as also maid charges.", False)],
-        [("The Paying Guest shall keep the “Said Room Premises” in good condition and comply with all the rules and regulations required in this regard.", False)],
-        [("The paying Guest shall not carry out any addition or alterations in the “Said Room Premises”.", False)],
-        [("The “Said Room Premises” shall be used by the Paying Guest Only for lawful purpose of residential stay. The said premises shall not be used for any other purpose/s by the Paying Guest. The Caretaker shall restrain the access to the “Said Room Premises” if the paying guest misuses the premises or commits any illegal act or criminal act or disturbs the neighbors or the society.", False)],
-        [("The Paying Guest hereby covenants and agrees that they shall not use the address of the “Said Room Premises” for obtaining, applying for, or registering any government-issued identification, documentation, or services, including but not limited to: Ration Card, Gas Connection, Aadhaar Card, PAN Card, Voter ID Card, Driving License, Bank Loan or Online Loan documentation, Any other government-recognized proof of residence.", False)],
-        [("The paying guest shall not bring any visitors to the premises except with the permission of the Caretaker.", False)],
-        [("The Caretaker of his representatives shall have the lock and key of the “Said Room Premises” and have the right to enter the said room for the purpose of inspection or any other purpose/s at all reasonable hours.", False)],
-        [("The Notice period for termination of this paying guest by either party is ONE MONTH. (The paying Guest have no right to vacate the said premises before 3 months from the commencing of this agreement) .(i.e. 3 months locking period)", False)],
-        [("This agreement does not bestow any right, title, possession or interest of whatsoever nature in the Room / Flat to the Paying Guest.", False)]
-    ]
-
-    for i, clause_parts in enumerate(clauses):
-        p = doc.add_paragraph(style='List Number')
-        p.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-        p.paragraph_format.space_after = Pt(0)
-        if i == 3: p.paragraph_format.page_break_before = True
-        for text, is_bold in clause_parts:
-            run = p.add_run(text)
-            run.font.name = 'Times New Roman'
-            run.font.size = Pt(14)
-            run.bold = is_bold
-        if i != 12: doc.add_paragraph()
-
-    signature_page_section = doc.sections[-1]
-    signature_page_section.left_margin = Cm(3.0)
-    signature_page_section.right_margin = Cm(1.5)
-
-    add_formatted_paragraph("IN WITNESS WHEREOF the parties have hereto hereinto set their respective hands on the day and year first hereinabove mentioned.", size=14)
-    for _ in range(3): doc.add_paragraph()
-
-    add_paragraph_with_runs([('SIGNED AND DELIVERED for\nThe Caretaker by withinnamed\n', False), ('Mr. Jasmeet Singh', True)], alignment=WD_ALIGN_PARAGRAPH.LEFT, font_size=14)
-    doc.add_paragraph()
-    add_formatted_paragraph('In the presence of ………………….', size=14, align=WD_ALIGN_PARAGRAPH.LEFT)
-    for _ in range(5): doc.add_paragraph()
-    
-    add_paragraph_with_runs([(f'SIGNED AND DELIVERED for\nThe paying Guest by withinnamed\n', False), (f'{client_data["salutation"]}. ', True), (full_name, True)], alignment=WD_ALIGN_PARAGRAPH.LEFT, font_size=14)
-    
-    sig_paragraph = doc.add_paragraph()
-    sig_run = sig_paragraph.add_run()
-    if os.path.exists(client_data['signature_path']):
-        sig_run.add_picture(client_data['signature_path'], width=Inches(2.0))
-    sig_paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-    add_formatted_paragraph('In the presence of ………………….', size=14, align=WD_ALIGN_PARAGRAPH.LEFT)
-
-    document_stream = io.BytesIO()
-    doc.save(document_stream)
-    return document_stream
+    values.update(
+        start_date_str=term.start_str,
+        end_date_str=term.end_str,
+        full_name=agreement.full_name,
+        full_address=full_address,
+        full_office_address=full_office_address,
+        rent_in_words=amount_in_words(agreement.rent_price),
+        deposit_in_words=amount_in_words(agreement.security_deposit),
+    )
+
+    return values
+
+def create_word_agreement(agreement, backend=None):
+    # The static layout is compiled once per process; only the slots are filled here
+    renderer = get_renderer(backend, agreement.property_id)
+    return renderer.render(agreement_values(agreement), signature=agreement.signature)
+
+def create_word_agreement_chunks(agreement, backend=None):
+    """ The agreement as a list of byte chunks, for writing or uploading without one contiguous copy """
+    renderer = get_renderer(backend, agreement.property_id)
+    return renderer.render_chunks(agreement_values(agreement), signature=agreement.signature)
 
 # --- HTML Template ---
 # Updated: strict 'required' attributes on ALL fields including Office and Email
+# Rendered once by form_page(); assets are served from static/ under content-hashed URLs
 HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html lang="en">
@@ -258,19 +174,14 @@ HTML_TEMPLATE = """
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Paying Guest Agreement Form</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <style>
-        body { font-family: 'Inter', sans-serif; }
-        .signature-pad { border: 2px dashed #ccc; border-radius: 8px; cursor: crosshair; }
-        .section-title { font-size: 1.125rem; font-weight: 600; color: #1f2937; border-bottom: 1px solid #e5e7eb; padding-bottom: 0.5rem; margin-bottom: 1rem; }
-    </style>
+    <link rel="stylesheet" href="{{ css_url }}">
 </head>
 <body class="bg-gray-100 flex items-center justify-center min-h-screen py-8">
     <div id="form-container" class="w-full max-w-2xl p-8 space-y-6 bg-white rounded-lg shadow-md m-4">
         <h1 class="text-3xl font-bold text-center text-gray-800">Paying Guest Details Form</h1>
         <p class="text-center text-gray-600">Please fill in <strong>ALL</strong> details below. No field can be left blank.</p>
         
-        <form action="/submit" method="post" id="agreementForm" class="space-y-8">
+        <form action="/submit" method="post" id="agreementForm" data-signature-format="{{ signature_format }}" class="space-y-8">
             
             <div>
                 <h2 class="section-title">Personal Details</h2>
@@ -386,6 +297,16 @@ HTML_TEMPLATE = """
             <div>
                 <h2 class="section-title">Agreement Terms</h2>
                 <div class="space-y-6 mt-4">
+                    {% if properties|length > 1 %}
+                    <div>
+                        <label for="property_id" class="block text-sm font-medium text-gray-700">Property *</label>
+                        <select id="property_id" name="property_id" required class="mt-1 block w-full px-3 py-2 bg-white border border-gray-300 rounded-md shadow-sm">
+                            {% for property_id, prop in properties.items() %}
+                            <option value="{{ property_id }}">{{ prop.name }} ({{ prop.city }})</option>
+                            {% endfor %}
+                        </select>
+                    </div>
+                    {% endif %}
                     <div>
                         <label for="rented_address" class="block text-sm font-medium text-gray-700">Rented Property Address *</label>
                         <input type="text" id="rented_address" name="rented_address" required class="mt-1 block w-full px-3 py-2 bg-white border border-gray-300 rounded-md shadow-sm">
@@ -422,7 +343,7 @@ HTML_TEMPLATE = """
         </form>
     </div>
     
-    <script src="https://cdn.jsdelivr.net/npm/signature_pad@4.0.0/dist/signature_pad.umd.min.js"></script>
+    <script src="{{ signature_pad_url }}"></script>
     <script>
         const indianStates = [
             "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh", "Goa", "Gujarat", 
@@ -446,6 +367,19 @@ HTML_TEMPLATE = """
         const canvas = document.getElementById('signature-pad');
         const signaturePad = new SignaturePad(canvas, { backgroundColor: 'rgb(249, 250, 251)' });
 
+        // The canvas is sized by CSS: match its backing store (at devicePixelRatio) so strokes land under the pen
+        function resizeCanvas() {
+            const ratio = Math.max(window.devicePixelRatio || 1, 1);
+            const data = signaturePad.toData();
+            canvas.width = canvas.offsetWidth * ratio;
+            canvas.height = canvas.offsetHeight * ratio;
+            canvas.getContext('2d').scale(ratio, ratio);
+            signaturePad.clear();
+            signaturePad.fromData(data);
+        }
+        window.addEventListener('resize', resizeCanvas);
+        resizeCanvas();
+
         document.getElementById('clear-signature').addEventListener('click', function () {
             signaturePad.clear();
         });
@@ -456,9 +390,20 @@ HTML_TEMPLATE = """
                 event.preventDefault();
                 return;
             }
-            document.getElementById('signature-data').value = signaturePad.toDataURL('image/png');
+            document.getElementById('signature-data').value = signatureValue(this.dataset.signatureFormat);
         });
 
+        // Vector mode sends one flat [x0, y0, x1, y1, ...] list per pen stroke instead of a bitmap
+        function signatureValue(format) {
+            if (format !== 'vector') {
+                return signaturePad.toDataURL('image/png');
+            }
+            const strokes = signaturePad.toData().map(group =>
+                group.points.flatMap(point => [Math.round(point.x * 10) / 10, Math.round(point.y * 10) / 10])
+            );
+            return 'data:application/vnd.signature-strokes+json,' + JSON.stringify(strokes);
+        }
+
         const today = new Date();
         const yyyy = today.getFullYear();
         const mm = String(today.getMonth() + 1).padStart(2, '0');
@@ -469,107 +414,381 @@ HTML_TEMPLATE = """
 </html>
 """
 
+# The form has no per-request content, so it is rendered and compressed once per process
+_form_page = None
+
+_form_page_version = None
+
+def form_page():
+    """ Re-rendered only when the property definitions change """
+    global _form_page, _form_page_version
+    version = registry.version
+    if _form_page is None or version != _form_page_version:
+        html = render_template_string(
+            HTML_TEMPLATE,
+            properties=registry.properties(),
+            signature_format=SIGNATURE_FORMAT,
+            css_url=asset_url('form.css'),
+            signature_pad_url=asset_url('signature_pad.umd.min.js'),
+        )
+        _form_page = PrecompressedBody(html.encode('utf-8'), 'text/html', FORM_CACHE_CONTROL)
+        _form_page_version = version
+    return _form_page
+
 @app.route('/')
 def index():
-    return render_template_string(HTML_TEMPLATE)
+    return form_page().respond(request)
+
+@app.route('/assets/<name>')
+def static_asset(name):
+    asset = find_asset(name)
+    if asset is None:
+        return "Not Found", 404
+    return asset.respond(request)
+
+# --- Submission Handling (shared by the form, /batch and the batch CLI) ---
+def parse_agreement(fields, require_signature=True):
+    """ Agreement.parse plus the property's terms; raises InvalidAgreement with every field error """
+    errors = {}
+    try:
+        agreement = Agreement.parse(fields, require_signature)
+    except InvalidAgreement as e:
+        agreement, errors = None, dict(e.errors)
+    try:
+        prop = registry.get(fields.get('property_id'))
+    except UnknownProperty as e:
+        errors['property_id'] = f"{e}."
+    if errors:
+        raise InvalidAgreement(errors)
+    agreement.property_id = prop['id']
+    agreement.stay_months = prop['stay_months']
+    return agreement
+
+def agreement_filename(agreement):
+    return f"Agreement_{agreement.full_name.replace(' ', '_')}.docx"
+
+def render_agreement(agreement):
+    """ Decodes the signature and builds the agreement. Returns (filename, document chunks) """
+    # --- Process Signature (in memory: a bilevel PNG or vector strokes) ---
+    with span('signature_decode'):
+        agreement.signature = signature_from_data_url(agreement.signature_data_url)
+
+    with span('create_word_agreement'):
+        chunks = create_word_agreement_chunks(agreement)
+    metrics.DOCUMENT_BYTES.observe(sum(memoryview(chunk).nbytes for chunk in chunks), backend=AGREEMENT_BACKEND)
+    return agreement_filename(agreement), chunks
+
+def render_agreement_bytes(agreement):
+    """ Batch worker entry point: a parsed Agreement in, (filename, .docx bytes) out """
+    filename, chunks = render_agreement(agreement)
+    return filename, b''.join(chunks)
+
+IDEMPOTENCY_FIELDS = REQUIRED_FIELDS + ('property_id',)
+
+# Double-taps and resubmits of identical fields get the first response instead of a second agreement
+recent_submissions = IdempotencyCache(IDEMPOTENCY_MAX_ENTRIES, IDEMPOTENCY_TTL)
+
+submit_admission = Admission(SUBMIT_MAX_IN_FLIGHT, SUBMIT_MAX_WAITING, SUBMIT_MAX_WAIT, SUBMIT_RETRY_AFTER)
+metrics.Gauge('agreement_submissions_in_flight', 'Submissions holding an admission slot', lambda: submit_admission.in_flight)
+metrics.Gauge('agreement_submissions_waiting', 'Submissions queued for an admission slot', lambda: submit_admission.waiting)
+
+def submission_busy(reason, retry_after):
+    """ The 429 for a submission turned away by admission control """
+    metrics.SUBMISSIONS_SHED.inc(reason=reason)
+    metrics.SUBMISSIONS.inc(outcome='shed')
+    return "The server is busy. Please submit again in a moment.", 429, {'Retry-After': str(retry_after)}
+
+def submission_too_large(reason, message):
+    metrics.SUBMISSIONS_SHED.inc(reason=reason)
+    metrics.SUBMISSIONS.inc(outcome='too_large')
+    return f"""
+            <div style="font-family: Arial, sans-serif; text-align: center; padding: 50px;">
+                <h1 style="color: #dc3545;">Submission Failed</h1>
+                <p>{message}</p>
+                <a href="/">Go Back</a>
+            </div>
+            """, 413, {}
 
 @app.route('/submit', methods=['POST'])
 def submit():
-    signature_path = None
+    from werkzeug.exceptions import RequestEntityTooLarge
+
+    with span('submit'):
+        # Oversized bodies are refused from the Content-Length, before anything is read or parsed
+        request.max_content_length = request.max_form_memory_size = SUBMIT_MAX_BYTES
+        if (request.content_length or 0) > SUBMIT_MAX_BYTES:
+            return submission_too_large('body_too_large', "The submission is too large.")
+        try:
+            run = profiler.start(requested_profile(request.headers))
+            if run is not None:
+                return profiled_submission(request.form, run)
+            return submit_and_deliver(request.form)
+        except Overloaded as e:
+            return submission_busy(e.reason, e.retry_after)
+        except RequestEntityTooLarge:  # a chunked body without a Content-Length
+            return submission_too_large('body_too_large', "The submission is too large.")
+
+def requested_profile(headers):
+    """ The modes asked for in X-Profile, honoured only alongside the admin token """
+    import hmac
+
+    value = headers.get('X-Profile')
+    if not value or not ADMIN_TOKEN or not hmac.compare_digest(headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return None
+    return parse_modes(value)
+
+def submit_and_deliver(fields):
+    """ /submit on the WSGI path; with DELIVER_INLINE the first upload is attempted before answering """
+    body, status, headers = process_submission(fields, schedule=not DELIVER_INLINE, admission=submit_admission)
+    if DELIVER_INLINE and status == 202 and 'Idempotent-Replayed' not in headers:
+        deliver_now(headers['Location'].rsplit('/', 1)[-1])
+    return body, status, headers
+
+def profiled_submission(fields, run, submit=submit_and_deliver):
+    """ The whole submission (and with DELIVER_INLINE the first Telegram upload) under the profiler """
+    with run:
+        body, status, headers = submit(fields)
+    return body, status, dict(headers, **{'X-Profile-Id': run.id})
+
+def deliver_now(submission_id):
+    """ First delivery attempt on this thread (as asgi.deliver does on the event loop); failures go to the outbox workers """
+    handed_over = False
+    try:
+        if telegram_client.send_delay() > 0:
+            return  # rate limited: waiting here would hold up the response, the workers wait instead
+        record = outbox.claim(submission_id)
+        if record is None:
+            handed_over = True
+            return
+        with outbox.open_document(submission_id) as document:
+            result = telegram_client.send_document(document, record['filename'], record['caption'])
+        outbox.complete(record, result)
+        handed_over = True
+    except Exception as e:
+        print(f"Error delivering {submission_id}: {e}")
+    finally:
+        if not handed_over:
+            outbox.hand_over(submission_id)
+
+def process_submission(fields, schedule=True, admission=None):
+    """
+    Idempotent /submit shared with the ASGI app. Returns (body, status, headers).
+    An admission (see admission.py) is held only while the submission is
+    parsed, rendered and enqueued, not while a duplicate waits for the first
+    response or anything is delivered; it raises Overloaded.
+    """
+    # Checked before the fields are hashed, parsed or the signature decoded
+    field = oversized_field(fields)
+    if field:
+        return submission_too_large('field_too_large', f"The field <strong>{field_label(field)}</strong> is too long.")
+
+    key = canonical_key(fields, IDEMPOTENCY_FIELDS)
+    # Server errors are not remembered, so retrying after one really retries
+    def compute():
+        with admission or nullcontext():
+            return handle_submit(fields, schedule)
+
+    response, replayed = recent_submissions.get_or_compute(key, compute, cacheable=lambda r: r[1] < 500)
+    body, status, headers = response
+    if replayed:
+        metrics.SUBMISSIONS.inc(outcome='duplicate')
+        return body, status, dict(headers, **{'Idempotent-Replayed': 'true'})
+    metrics.SUBMISSIONS.inc(outcome={202: 'accepted', 400: 'invalid'}.get(status, 'error'))
+    return response
+
+def handle_submit(fields, schedule=True):
+    """ schedule=False leaves the first delivery attempt to the caller (see Outbox.enqueue) """
     try:
-        # STRICT SERVER-SIDE VALIDATION: Check if any expected field is missing or empty
-        required_fields = [
-            'salutation', 'first_name', 'last_name', 'age', 
-            'address', 'permanent_district', 'permanent_state', 'permanent_pincode',
-            'aadhar_no', 
-            'office_address', 'office_district', 'office_state', 'office_pincode', 
-            'email_id',
-            'ref1_name', 'ref1_number', 'ref2_name', 'ref2_number',
-            'rented_address', 'rent_price', 'security_deposit', 'start_date', 
-            'signature'
-        ]
-
-        # Check every field exists and is not just whitespace
-        for field in required_fields:
-            if not request.form.get(field) or not request.form.get(field).strip():
+        # STRICT SERVER-SIDE VALIDATION: every field is parsed once and all problems are reported together
+        with span('validate'):
+            try:
+                agreement = parse_agreement(fields)
+            except InvalidAgreement as e:
+                problems = "".join(f"<li>{escape(message)}</li>" for message in e.errors.values())
                 return f"""
-                <div style="font-family: Arial, sans-serif; text-align: center; padding: 50px;">
-                    <h1 style="color: #dc3545;">Submission Failed</h1>
-                    <p>The field <strong>{field.replace('_', ' ').title()}</strong> cannot be empty.</p>
-                    <a href="/">Go Back</a>
-                </div>
-                """, 400
-
-        # If validation passes, collect data
-        client_data = {
-            'salutation': request.form['salutation'],
-            'first_name': request.form['first_name'],
-            'last_name': request.form['last_name'],
-            'age': request.form['age'],
-            'address': request.form['address'],
-            'permanent_district': request.form['permanent_district'],
-            'permanent_state': request.form['permanent_state'],
-            'permanent_pincode': request.form['permanent_pincode'],
-            'aadhar_no': request.form['aadhar_no'],
-            'office_address': request.form['office_address'],
-            'office_district': request.form['office_district'],
-            'office_state': request.form['office_state'],
-            'office_pincode': request.form['office_pincode'],
-            'email_id': request.form['email_id'],
-            'ref1_name': request.form['ref1_name'],
-            'ref1_number': request.form['ref1_number'],
-            'ref2_name': request.form['ref2_name'],
-            'ref2_number': request.form['ref2_number'],
-            'rented_address': request.form['rented_address'],
-            'rent_price': request.form['rent_price'],
-            'security_deposit': request.form['security_deposit'],
-            'start_date': request.form['start_date'],
-            'stay_months': '11',
-            'signature_data_url': request.form['signature']
-        }
+            <div style="font-family: Arial, sans-serif; text-align: center; padding: 50px;">
+                <h1 style="color: #dc3545;">Submission Failed</h1>
+                <p>Please correct the following:</p>
+                <ul style="display: inline-block; text-align: left;">{problems}</ul>
+                <br><a href="/">Go Back</a>
+            </div>
+            """, 400, {}
 
-        # --- Process Signature ---
-        header, encoded = client_data['signature_data_url'].split(",", 1)
-        signature_data = base64.b64decode(encoded)
-        signature_filename = f"signature_{uuid.uuid4().hex}.png"
-        signature_path = os.path.join('/tmp', signature_filename)
-        with open(signature_path, "wb") as f:
-            f.write(signature_data)
-        client_data['signature_path'] = signature_path
-        
         # --- Generate and Send ---
-        document_stream = create_word_agreement(client_data)
-        full_name = f"{client_data['first_name']} {client_data['last_name']}"
-        filename = f"Agreement_{full_name.replace(' ', '_')}.docx"
-        caption = f"New agreement submitted by: {client_data['salutation']}. {full_name}\nAadhar: {client_data['aadhar_no']}"
+        filename, document = render_agreement(agreement)
+        property_name = registry.get(agreement.property_id)['name']
+        caption = f"New agreement submitted by: {agreement.salutation}. {agreement.full_name}\nAadhar: {agreement.aadhar_no}\nProperty: {property_name}"
         
-        success, message = send_file_to_telegram(document_stream, filename, caption)
-
-        if success:
+        if not telegram_client.configured:
             return """
-                <div style="font-family: Arial, sans-serif; text-align: center; padding: 50px;">
-                    <h1 style="color: #28a745;">Agreement Sent!</h1>
-                    <p style="font-size: 1.2em;">The agreement has been generated and sent to the administrator via Telegram.</p>
-                    <a href="/">Go Back</a>
-                </div>
-            """
-        else:
-            return f"""
                 <div style="font-family: Arial, sans-serif; text-align: center; padding: 50px;">
                     <h1 style="color: #dc3545;">Submission Failed</h1>
                     <p>We could not send the document to Telegram.</p>
-                    <p style="background: #eee; padding: 10px; display: inline-block;">Error: {message}</p>
+                    <p style="background: #eee; padding: 10px; display: inline-block;">Error: Credentials missing</p>
                     <br><br>
                     <a href="/">Try Again</a>
                 </div>
-            """, 500
-
+            """, 500, {}
+
+        # Delivery happens in the background; the outbox retries until Telegram accepts it
+        with span('enqueue'):
+            submission_id = outbox.enqueue(document, filename, caption, schedule=schedule)
+
+        # The archive is a searchable copy; delivery must not depend on it
+        try:
+            with span('archive'):
+                term = agreement_term(agreement)
+                archive.store(document, filename, agreement.client_data(), term.start_date, term.end_date,
+                              submission_id=submission_id, template_version=template_version(agreement.property_id))
+        except Exception as e:
+            print(f"Error archiving {submission_id}: {e}")
+
+        return f"""
+            <div style="font-family: Arial, sans-serif; text-align: center; padding: 50px;">
+                <h1 style="color: #28a745;">Agreement Submitted!</h1>
+                <p style="font-size: 1.2em;">The agreement has been generated and queued for delivery to the administrator via Telegram.</p>
+                <p>Reference: <a href="/status/{submission_id}">{submission_id}</a></p>
+                <a href="/">Go Back</a>
+            </div>
+        """, 202, {'Location': f"/status/{submission_id}"}
+
+    except (SignatureError, UnknownProperty) as e:
+        return f"""
+            <div style="font-family: Arial, sans-serif; text-align: center; padding: 50px;">
+                <h1 style="color: #dc3545;">Submission Failed</h1>
+                <p>{e}.</p>
+                <a href="/">Go Back</a>
+            </div>
+        """, 400, {}
     except Exception as e:
         print(f"Error in submit route: {e}")
-        return f"An error occurred: {e}", 500
-    finally:
-        if signature_path and os.path.exists(signature_path):
-            os.remove(signature_path)
+        return f"An error occurred: {e}", 500, {}
+
+@app.route('/batch', methods=['POST'])
+def batch():
+    """ Admin only: renders a CSV or JSONL upload into a ZIP on the shared worker pool """
+    from batch import detect_format, read_rows, iter_batch_zip, shared_pool
+
+    denied = admin_denied()
+    if denied:
+        return denied
+    upload = request.files.get('file')
+    if upload is not None:
+        data, name = upload.read(), upload.filename or ''
+    else:
+        data, name = request.get_data(), ''
+    if not data:
+        return "Upload a CSV or JSONL file in the 'file' field.", 400
+
+    fmt = detect_format(name, request.mimetype)
+    # Each worker compiles the templates once when it starts, then serves every later upload
+    pool = shared_pool(BATCH_WORKERS)
+    stream = iter_batch_zip(read_rows(data, fmt), parse_agreement, render_agreement_bytes, pool)
+    return Response(stream, mimetype='application/zip',
+                    headers={'Content-Disposition': 'attachment; filename="agreements.zip"'})
+
+@app.route('/warmup')
+def warmup():
+    """ Preloads every property's compiled agreement template and the common amounts in words; point a cron or health check here """
+    timings = {}
+
+    started = time.perf_counter()
+    for property_id in registry.properties():
+        get_renderer(property_id=property_id).warm()
+    timings['template'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    rendering.warm()
+    timings['amount_words'] = time.perf_counter() - started
+
+    return jsonify({'backend': AGREEMENT_BACKEND, 'seconds': timings})
+
+def admin_denied():
+    """ None when the request carries ADMIN_TOKEN, otherwise the error response to return """
+    import hmac
+
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Admin endpoints are disabled; set ADMIN_TOKEN'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({'error': 'Invalid admin token'}), 403
+    return None
+
+@app.route('/archive')
+def archive_search():
+    """ ?aadhar_no=&name=&rented_address=&date=YYYY-MM-DD&limit= ; name and address match as prefixes """
+    denied = admin_denied()
+    if denied:
+        return denied
+    args = request.args
+    records = archive.search(
+        aadhar_no=args.get('aadhar_no'),
+        name=args.get('name'),
+        rented_address=args.get('rented_address'),
+        date=args.get('date'),
+        limit=min(args.get('limit', 50, type=int), 500),
+    )
+    for record in records:
+        record['download_url'] = f"/archive/{record['id']}/download"
+    return jsonify(records)
+
+@app.route('/archive/<int:record_id>')
+def archive_record(record_id):
+    denied = admin_denied()
+    if denied:
+        return denied
+    record = archive.get(record_id)
+    if record is None:
+        return jsonify({'error': 'Unknown agreement'}), 404
+    return jsonify(record)
+
+@app.route('/archive/<int:record_id>/download')
+def archive_download(record_id):
+    from flask import send_file
+    from delivery import DOCX_MIME_TYPE
+
+    denied = admin_denied()
+    if denied:
+        return denied
+    record = archive.get(record_id)
+    if record is None:
+        return jsonify({'error': 'Unknown agreement'}), 404
+    return send_file(archive.blob_path(record['sha256']), mimetype=DOCX_MIME_TYPE,
+                     as_attachment=True, download_name=record['filename'], etag=record['sha256'])
+
+@app.route('/profiles')
+def profile_list():
+    """ Saved profiles, newest first """
+    denied = admin_denied()
+    if denied:
+        return denied
+    files = profiler.files()
+    for entry in files:
+        entry['download_url'] = f"/profiles/{entry['name']}"
+    return jsonify(files)
+
+@app.route('/profiles/<name>')
+def profile_download(name):
+    from flask import send_file
+
+    denied = admin_denied()
+    if denied:
+        return denied
+    path = profiler.path(name)
+    if path is None:
+        return jsonify({'error': 'Unknown profile'}), 404
+    return send_file(path, as_attachment=True, download_name=name)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """ Stage latencies, outcomes, document sizes and Telegram errors in the Prometheus text format """
+    return Response(metrics.render_metrics(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/status/<submission_id>')
+def delivery_status(submission_id):
+    record = outbox.status(submission_id)
+    if record is None:
+        return jsonify({'error': 'Unknown submission'}), 404
+    return jsonify(record)
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,168 @@
+import threading
+import time
+from bisect import bisect_left
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# --- Metric Types ---
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple([str(labels.get(name, '')) for name in self.labelnames])
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def collect(self):
+        lines = self._header()
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(zip(self.labelnames, key))} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """
+    Read at scrape time from a callback, e.g. a queue length. With labelnames,
+    the callback returns a mapping of label-value tuples to values.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, function, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = function
+
+    def collect(self):
+        if not self.labelnames:
+            return self._header() + [f"{self.name} {_format_value(self._function())}"]
+        lines = self._header()
+        for key, value in sorted(self._function().items()):
+            lines.append(f"{self.name}{_format_labels(zip(self.labelnames, key))} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values = {}  # key -> [per-bucket counts, sum, count]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def collect(self):
+        lines = self._header()
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        for key, (counts, total, count) in items:
+            pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(pairs + [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(pairs)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(pairs)} {count}")
+        return lines
+
+
+def render_metrics():
+    """ All registered metrics in the Prometheus text exposition format """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.collect())
+    return '\n'.join(lines) + '\n'
+
+
+# --- Agreement Metrics ---
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (8_000, 16_000, 32_000, 48_000, 64_000, 96_000, 128_000, 256_000, 512_000, 1_000_000)
+
+STAGE_SECONDS = Histogram(
+    'agreement_stage_seconds', 'Time spent in each stage of generating and delivering an agreement',
+    ['stage'], LATENCY_BUCKETS)
+SUBMISSIONS = Counter(
+    'agreement_submissions_total', 'Form submissions by outcome (accepted, duplicate, invalid, error, shed, too_large)', ['outcome'])
+SUBMISSIONS_SHED = Counter(
+    'agreement_submissions_shed_total',
+    'Submissions turned away before processing, by reason (queue_full, wait_timeout, body_too_large, field_too_large)',
+    ['reason'])
+ADMISSION_WAIT_SECONDS = Histogram(
+    'agreement_admission_wait_seconds', 'Time queued submissions waited for a processing slot', (), LATENCY_BUCKETS)
+DOCUMENT_BYTES = Histogram(
+    'agreement_document_bytes', 'Size of generated .docx files', ['backend'], SIZE_BUCKETS)
+TELEGRAM_UPLOADS = Counter(
+    'telegram_uploads_total', 'Telegram uploads by result and error class', ['result', 'error_class'])
+TELEGRAM_BATCH_DOCUMENTS = Histogram(
+    'telegram_batch_documents', 'Documents per Telegram send (sendDocument or sendMediaGroup)', (), (1, 2, 3, 5, 10))
+TELEGRAM_THROTTLE_SECONDS = Counter(
+    'telegram_throttle_seconds_total', 'Time spent waiting for the Telegram rate limits', ['scope'])
+
+
+class span:
+    """ Times the block into agreement_stage_seconds{stage=...}, whether or not it raises """
+    __slots__ = ('stage', 'started')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        STAGE_SECONDS.observe(time.perf_counter() - self.started, stage=self.stage)
@@ -0,0 +1,233 @@
+import hashlib
+import io
+import re
+import struct
+import threading
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+from metrics import span
+
+
+# --- Constants ---
+IMAGE_RELATIONSHIP = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image"
+SIGNATURE_PART = "word/media/image1.png"
+SIGNATURE_WIDTH_EMU = 1828800  # 2 inches
+
+_DOS_DATE = (1 << 5) | 1  # 1980-01-01 00:00, so output never depends on the clock
+_MARKER = re.compile("<w:t>\ue000(\\w+)\ue001</w:t>")
+_RUN_BREAKS = re.compile(r"(\t|\r|\n)")
+_XML_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+_DRAWING_XML = (
+    '<w:drawing><wp:inline xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+    'xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+    '<wp:extent cx="{cx}" cy="{cy}"/><wp:docPr id="1" name="Picture 1"/>'
+    '<wp:cNvGraphicFramePr><a:graphicFrameLocks noChangeAspect="1"/></wp:cNvGraphicFramePr>'
+    '<a:graphic><a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+    '<pic:pic><pic:nvPicPr><pic:cNvPr id="0" name="signature.png"/><pic:cNvPicPr/></pic:nvPicPr>'
+    '<pic:blipFill><a:blip r:embed="{rid}"/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+    '<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+    '<a:prstGeom prst="rect"/></pic:spPr></pic:pic></a:graphicData></a:graphic></wp:inline></w:drawing>'
+)
+
+
+# --- Helpers ---
+def run_content_xml(text):
+    """ Serializes run text the way python-docx does: w:t segments, w:tab for tabs and w:br for newlines """
+    out = []
+    for piece in _RUN_BREAKS.split(_XML_INVALID.sub("", text)):
+        if piece == "\t":
+            out.append("<w:tab/>")
+        elif piece in ("\r", "\n"):
+            out.append("<w:br/>")
+        elif piece:
+            space = ' xml:space="preserve"' if len(piece.strip()) < len(piece) else ""
+            out.append(f"<w:t{space}>{escape(piece)}</w:t>")
+    return "".join(out)
+
+
+def png_size(data):
+    """ Returns (width, height) in pixels from a PNG header """
+    if data[:8] != b"\x89PNG\r\n\x1a\n" or data[12:16] != b"IHDR":
+        raise ValueError("Signature must be a PNG image")
+    return struct.unpack(">II", data[16:24])
+
+
+def _deflate(chunks):
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    crc, size, payload = 0, 0, []
+    for chunk in chunks:
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+        payload.append(compressor.compress(chunk))
+    payload.append(compressor.flush())
+    return crc, b"".join(payload), size
+
+
+def _member(name, chunks, compress=True):
+    """ A ready-to-write zip entry: (name, method, crc, payload, uncompressed size) """
+    if compress:
+        crc, payload, size = _deflate(chunks)
+        return name.encode(), zipfile.ZIP_DEFLATED, crc, payload, size
+    data = b"".join(chunks)
+    return name.encode(), zipfile.ZIP_STORED, zlib.crc32(data), data, len(data)
+
+
+def _zip_chunks(members):
+    """ The zip file as a list of chunks; member payloads are referenced, not copied """
+    chunks = []
+    central = []
+    offset = 0
+    for name, method, crc, payload, size in members:
+        header = struct.pack("<4sHHHHHIIIHH", b"PK\x03\x04", 20, 0, method, 0, _DOS_DATE,
+                             crc, len(payload), size, len(name), 0)
+        chunks.append(header + name)
+        chunks.append(payload)
+        central.append(struct.pack("<4sHHHHHHIIIHHHHHII", b"PK\x01\x02", 20, 20, 0, method, 0, _DOS_DATE,
+                                   crc, len(payload), size, len(name), 0, 0, 0, 0, 0, offset) + name)
+        offset += len(header) + len(name) + len(payload)
+
+    directory = b"".join(central)
+    chunks.append(directory + struct.pack("<4sHHHHIIH", b"PK\x05\x06", 0, 0, len(members), len(members),
+                                          len(directory), offset, 0))
+    return chunks
+
+
+# --- Writer ---
+class OOXMLAgreementWriter:
+    """
+    Writes the agreement .docx straight from pre-serialized parts.
+
+    The compiled skeleton is saved once through python-docx, and every static
+    part (styles.xml, numbering.xml, settings, theme, ...) is kept already
+    deflated. document.xml is split at the slot runs; per request the static
+    chunks are streamed through the compressor with the escaped client fields
+    in between. A PNG signature goes in as a raw stored part; a vector one is
+    inlined in document.xml as a DrawingML shape. Zip timestamps are fixed, so
+    identical input gives byte-identical output.
+    """
+
+    def __init__(self, template):
+        self._template = template
+        self._compiled = None
+        self._lock = threading.Lock()
+
+    def _ensure_compiled(self):
+        if self._compiled is None:
+            with self._lock:
+                if self._compiled is None:
+                    self._compiled = self._compile()
+        return self._compiled
+
+    def _compile(self):
+        doc, slots = self._template.marked_copy(lambda key: f"\ue000{key}\ue001")
+        skeleton_stream = io.BytesIO()
+        doc.save(skeleton_stream)
+        package = zipfile.ZipFile(skeleton_stream)
+
+        # document.xml -> [static, key, static, key, ..., static]
+        pieces = _MARKER.split(package.read("word/document.xml").decode("utf-8"))
+        document_parts = [piece.encode("utf-8") if i % 2 == 0 else piece for i, piece in enumerate(pieces)]
+
+        rels = package.read("word/_rels/document.xml.rels").decode("utf-8")
+        signature_rid = "rId%d" % (max(int(n) for n in re.findall(r'Id="rId(\d+)"', rels)) + 1)
+        signed_rels = rels.replace(
+            "</Relationships>",
+            f'<Relationship Id="{signature_rid}" Type="{IMAGE_RELATIONSHIP}" Target="media/image1.png"/></Relationships>',
+        )
+
+        content_types = package.read("[Content_Types].xml").decode("utf-8")
+        if 'Extension="png"' not in content_types:
+            content_types = content_types.replace(
+                "<Default ", '<Default Extension="png" ContentType="image/png"/><Default ', 1)
+
+        # Identifies the template: its static text and parts, and the slot formats
+        version = hashlib.sha256()
+        for piece in document_parts:
+            if isinstance(piece, bytes):
+                version.update(piece)
+            elif piece == "signature":
+                version.update(b"\0signature")
+            else:
+                version.update(b"\0" + slots[int(piece)].fmt.encode("utf-8"))
+
+        static_members = []
+        for name in package.namelist():
+            if name == "word/document.xml":
+                static_members.append(None)  # streamed per request
+            elif name == "word/_rels/document.xml.rels":
+                static_members.append("rels")
+            elif name == "[Content_Types].xml":
+                static_members.append(_member(name, [content_types.encode("utf-8")]))
+            else:
+                static_members.append(_member(name, [package.read(name)]))
+            if name != "word/document.xml":
+                version.update(name.encode("utf-8") + package.read(name))
+
+        return {
+            "slots": slots,
+            "document_parts": document_parts,
+            "members": static_members,
+            "rels": _member("word/_rels/document.xml.rels", [rels.encode("utf-8")]),
+            "signed_rels": _member("word/_rels/document.xml.rels", [signed_rels.encode("utf-8")]),
+            "signature_rid": signature_rid,
+            "version": version.hexdigest()[:16],
+        }
+
+    def warm(self):
+        """ Compiles the parts now instead of on the first render """
+        self._ensure_compiled()
+
+    @property
+    def version(self):
+        """ Changes whenever the rendered output for the same inputs would """
+        return self._ensure_compiled()["version"]
+
+    def iter_document_xml(self, values, signature=None):
+        """ Yields document.xml as UTF-8 chunks with slots filled in """
+        compiled = self._ensure_compiled()
+        slots = compiled["slots"]
+        for piece in compiled["document_parts"]:
+            if isinstance(piece, bytes):
+                yield piece
+            elif piece == "signature":
+                if isinstance(signature, bytes):
+                    width, height = png_size(signature)
+                    yield _DRAWING_XML.format(
+                        cx=SIGNATURE_WIDTH_EMU,
+                        cy=int(round(SIGNATURE_WIDTH_EMU * height / width)),
+                        rid=compiled["signature_rid"],
+                    ).encode("utf-8")
+                elif signature is not None:
+                    yield signature.drawing_xml().encode("utf-8")
+            else:
+                yield run_content_xml(slots[int(piece)].render(values)).encode("utf-8")
+
+    def render_chunks(self, values, signature=None):
+        """
+        The .docx as a list of byte chunks. The static parts are shared with every
+        other render, so nothing is copied into one contiguous buffer; write or
+        upload the chunks as they are.
+        """
+        compiled = self._ensure_compiled()
+        # Filling the slots is fused with deflating document.xml, so the whole write counts as 'save'
+        with span('save'):
+            members = []
+            for member in compiled["members"]:
+                if member is None:
+                    members.append(_member("word/document.xml", self.iter_document_xml(values, signature)))
+                elif member == "rels":
+                    members.append(compiled["signed_rels"] if isinstance(signature, bytes) else compiled["rels"])
+                else:
+                    members.append(member)
+            if isinstance(signature, bytes):
+                # Stored as-is: the signature bytes themselves become a chunk
+                members.append(_member(SIGNATURE_PART, [signature], compress=False))
+            return _zip_chunks(members)
+
+    def render(self, values, signature=None):
+        document_stream = io.BytesIO()
+        document_stream.writelines(self.render_chunks(values, signature))
+        return document_stream
@@ -0,0 +1,164 @@
+"""
+On-demand profiling of single requests.
+
+A run profiles everything inside its with block on the calling thread and
+saves the results to the profile directory under one id:
+
+    <id>.prof           cProfile stats (pstats.Stats / snakeviz)
+    <id>.txt            the top functions by cumulative and by internal time
+    <id>.tracemalloc    tracemalloc snapshot (tracemalloc.Snapshot.load)
+    <id>-alloc.txt      peak traced memory and the top allocation sites
+
+'cpu' runs cProfile and 'memory' runs tracemalloc; tracemalloc is
+process-wide, so allocations by requests running alongside are traced too.
+Only one run is active at a time: start() returns None while another is in
+progress, and the request just goes unprofiled. The newest `keep` runs are
+kept.
+"""
+import io
+import os
+import random
+import re
+import threading
+import time
+import uuid
+
+MODES = ('cpu', 'memory')
+_FILE_NAME = re.compile(r'[0-9A-Za-z-]+(-alloc)?\.(prof|txt|tracemalloc)')
+
+
+def parse_modes(value, default=MODES):
+    """ 'cpu', 'memory' or 'cpu,memory'; anything else (e.g. '1') means default """
+    modes = tuple(mode for mode in MODES if mode in (value or '').lower().replace(' ', '').split(','))
+    return modes or tuple(default)
+
+
+class ProfileRun:
+    """ Context manager for one profiled request; id names its files """
+    __slots__ = ('profiler', 'modes', 'id', 'started', '_cprofile', '_stop_tracemalloc')
+
+    def __init__(self, profiler, modes):
+        self.profiler = profiler
+        self.modes = modes
+        self.id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self._cprofile = None
+        self._stop_tracemalloc = False
+
+    def __enter__(self):
+        if 'memory' in self.modes:
+            import tracemalloc
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.profiler.traceback_frames)
+                self._stop_tracemalloc = True
+            tracemalloc.reset_peak()
+        if 'cpu' in self.modes:
+            import cProfile
+
+            self._cprofile = cProfile.Profile()
+        self.started = time.perf_counter()
+        if self._cprofile is not None:
+            self._cprofile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        elapsed = time.perf_counter() - self.started
+        try:
+            self.profiler.save(self, elapsed)
+        finally:
+            if self._stop_tracemalloc:
+                import tracemalloc
+                tracemalloc.stop()
+            self.profiler.finish()
+
+
+class Profiler:
+    """
+    Decides which requests are profiled (an explicit request, or sample_rate of
+    the rest in sample_modes) and keeps their results in directory.
+    """
+
+    def __init__(self, directory, sample_rate=0.0, sample_modes=('cpu',), keep=50, top=40, traceback_frames=10):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.sample_modes = tuple(sample_modes)
+        self.keep = keep
+        self.top = top
+        self.traceback_frames = traceback_frames
+        self._lock = threading.Lock()
+
+    def start(self, requested=None):
+        """ A ProfileRun for the requested modes (or a sampled one), or None to run unprofiled """
+        if requested:
+            modes = requested
+        elif self.sample_rate and random.random() < self.sample_rate:
+            modes = self.sample_modes
+        else:
+            return None
+        if not self._lock.acquire(blocking=False):
+            return None
+        return ProfileRun(self, modes)
+
+    def finish(self):
+        self._lock.release()
+
+    def save(self, run, elapsed):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, run.id)
+        # The snapshot comes first, before writing the CPU report allocates anything
+        if 'memory' in run.modes:
+            import tracemalloc
+
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            ))
+            snapshot.dump(f"{base}.tracemalloc")
+            lines = [f"Wall time: {elapsed:.4f}s", f"Traced memory: {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB", ""]
+            lines += [str(stat) for stat in snapshot.statistics('lineno')[:self.top]]
+            with open(f"{base}-alloc.txt", 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+        if run._cprofile is not None:
+            import pstats
+
+            run._cprofile.dump_stats(f"{base}.prof")
+            report = io.StringIO()
+            report.write(f"Wall time: {elapsed:.4f}s\n\n")
+            stats = pstats.Stats(run._cprofile, stream=report).strip_dirs()
+            stats.sort_stats('cumulative').print_stats(self.top)
+            stats.sort_stats('tottime').print_stats(self.top)
+            with open(f"{base}.txt", 'w') as f:
+                f.write(report.getvalue())
+        self._prune()
+
+    def _prune(self):
+        runs = sorted({name.split('.')[0].removesuffix('-alloc') for name in self._file_names()})
+        for run_id in runs[:-self.keep] if self.keep else []:
+            for name in self._file_names():
+                if name.split('.')[0].removesuffix('-alloc') == run_id:
+                    os.remove(os.path.join(self.directory, name))
+
+    def _file_names(self):
+        try:
+            return [name for name in os.listdir(self.directory) if _FILE_NAME.fullmatch(name)]
+        except FileNotFoundError:
+            return []
+
+    def files(self):
+        """ Saved profile files, newest first: [{'name', 'size', 'modified'}] """
+        entries = []
+        for name in self._file_names():
+            stat = os.stat(os.path.join(self.directory, name))
+            entries.append({'name': name, 'size': stat.st_size, 'modified': stat.st_mtime})
+        return sorted(entries, key=lambda entry: (-entry['modified'], entry['name']))
+
+    def path(self, name):
+        """ The path of a saved file, or None for anything else """
+        if not _FILE_NAME.fullmatch(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
@@ -0,0 +1,227 @@
+"""
+Per-property agreement definitions and their compiled templates.
+
+Each property in the definitions file (JSON, PROPERTIES_FILE) names its
+caretaker, city and terms, and may replace the standard clauses (each a list
+of [text, bold] runs; page_break_before_clause is 1-based):
+
+    {
+      "default": "powai",
+      "properties": {
+        "powai": {
+          "name": "Palatial Heights, Powai",
+          "city": "Mumbai",
+          "caretaker_name": "MR. JASMEET SINGH",
+          "caretaker_signature_name": "Mr. Jasmeet Singh",
+          "caretaker_address": "303/B wing, Palatial Heights, ...",
+          "stay_months": 11,
+          "late_fee": 200,
+          "cleaning_charge": 500,
+          "notice_period": "ONE MONTH",
+          "lock_in_months": 3,
+          "clauses": [[["Clause text with {rented_address}, ", false], ["bold part", true]], ...]
+        }
+      }
+    }
+
+Clause text may use any of these values as {placeholders}, plus the fees
+spelled out ({late_fee_words}, {cleaning_charge_words}); they are filled in
+when the template is compiled, and the client's fields ({full_name},
+{rent_price}, ...) are left as slots for each render. Compiled templates are
+kept in an LRU cache that is dropped whenever the file changes. A clause
+naming any other placeholder is rejected when the file loads; a file that
+does not load is reported and the last good definitions stay in use.
+"""
+import json
+import os
+import string
+import threading
+import time
+from collections import OrderedDict
+
+from agreement_model import FIELDS
+
+# Used when no definitions file exists, and the source of the standard terms
+DEFAULT_PROPERTY = {
+    'id': 'default',
+    'name': 'Palatial Heights, Powai',
+    'city': 'Mumbai',
+    'caretaker_name': 'MR. JASMEET SINGH',
+    'caretaker_signature_name': 'Mr. Jasmeet Singh',
+    'caretaker_address': '303/B wing, Palatial Heights, Chandivali Farm Rd, Chandivali, Powai, Mumbai, Maharashtra 400072',
+    'stay_months': 11,
+    'late_fee': 200,
+    'cleaning_charge': 500,
+    'notice_period': 'ONE MONTH',
+    'lock_in_months': 3,
+    'page_break_before_clause': 4,
+}
+
+REQUIRED_KEYS = ('name', 'city', 'caretaker_name', 'caretaker_address')
+
+# The client's values main.agreement_values() fills into the slots
+CLIENT_PLACEHOLDERS = frozenset(FIELDS[:-1]) | {
+    'full_name', 'start_date_str', 'end_date_str', 'full_address', 'full_office_address', 'rent_in_words', 'deposit_in_words',
+}
+# Spelled out from the terms by template_terms() when a template is compiled, so loading the file needs no num2words
+DERIVED_PLACEHOLDERS = frozenset({'late_fee_words', 'cleaning_charge_words'})
+
+_FORMATTER = string.Formatter()
+
+
+class UnknownProperty(ValueError):
+    pass
+
+
+def normalize_definition(property_id, definition):
+    """ Fills the standard terms into one property and checks its clauses """
+    missing = [key for key in REQUIRED_KEYS if not definition.get(key)]
+    if missing:
+        raise ValueError(f"Property {property_id!r} is missing {', '.join(missing)}")
+
+    prop = dict(DEFAULT_PROPERTY, caretaker_signature_name=definition['caretaker_name'].title())
+    prop.update(definition, id=property_id)
+    for key in ('stay_months', 'late_fee', 'cleaning_charge'):
+        prop[key] = int(prop[key])
+    for text, _ in (run for clause in prop.get('clauses') or () for run in clause):
+        check_placeholders(property_id, text, prop)
+    return prop
+
+
+def check_placeholders(property_id, text, prop):
+    """ Raises ValueError for a clause placeholder that neither the property nor the client's values provide """
+    try:
+        fields = [field for _, field, _, _ in _FORMATTER.parse(text) if field is not None]
+    except ValueError as e:
+        raise ValueError(f"Property {property_id!r} has a malformed clause ({e}): {text!r}")
+    for field in fields:
+        name = field.split('.')[0].split('[')[0]
+        if name not in prop and name not in DERIVED_PLACEHOLDERS and name not in CLIENT_PLACEHOLDERS:
+            raise ValueError(f"Property {property_id!r} has an unknown placeholder {{{field}}} in a clause")
+
+
+def template_terms(prop):
+    """ The property plus the derived text ({late_fee_words}, ...) its compiled template fills in """
+    from rendering import rupees_in_words
+
+    return dict(prop, late_fee_words=rupees_in_words(prop['late_fee']),
+                cleaning_charge_words=rupees_in_words(prop['cleaning_charge']))
+
+
+# --- Registry ---
+class PropertyRegistry:
+    """
+    Loads the definitions file on first use and again whenever its mtime or
+    size changes (checked at most every check_interval seconds). renderer()
+    compiles a property's template once and keeps up to max_templates of them.
+    """
+
+    def __init__(self, path, max_templates=16, check_interval=1.0):
+        self.path = path
+        self.max_templates = max_templates
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self._properties = {}
+        self._default_id = None
+        self._templates = OrderedDict()  # (property_id, backend) -> renderer
+        self.hits = 0
+        self.misses = 0
+
+    def _file_version(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        """ Call with the lock held """
+        now = time.monotonic()
+        if self._checked_at and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        version = self._file_version()
+        if version == self._version and self._properties:
+            return
+
+        try:
+            properties, default_id = self._read(version)
+        except Exception as e:
+            # Half-written or invalid: keep serving what was loaded, and retry once the file changes again
+            print(f"Error loading {self.path}: {e}")
+            self._version = version
+            if self._properties:
+                return
+            properties, default_id = self._read(None)
+
+        self._properties, self._default_id, self._version = properties, default_id, version
+        self._templates.clear()
+
+    def _read(self, version):
+        """ ({property_id: definition}, default_id) from the file, or the standard property without one """
+        if version is None:
+            return {'default': normalize_definition('default', DEFAULT_PROPERTY)}, 'default'
+        with open(self.path, encoding='utf-8') as f:
+            data = json.load(f)
+        properties = {property_id: normalize_definition(property_id, definition)
+                      for property_id, definition in data['properties'].items()}
+        default_id = data.get('default') or next(iter(properties))
+        if default_id not in properties:
+            raise ValueError(f"Default property {default_id!r} is not defined in {self.path}")
+        return properties, default_id
+
+    @property
+    def version(self):
+        with self._lock:
+            self._load()
+            return self._version
+
+    def properties(self):
+        """ {property_id: definition}, default first """
+        with self._lock:
+            self._load()
+            ordered = {self._default_id: self._properties[self._default_id]}
+            ordered.update(self._properties)
+            return ordered
+
+    def get(self, property_id=None):
+        with self._lock:
+            self._load()
+            prop = self._properties.get(property_id or self._default_id)
+        if prop is None:
+            raise UnknownProperty(f"Unknown property: {property_id}")
+        return prop
+
+    def renderer(self, property_id=None, backend='ooxml'):
+        """ The compiled template for a property ('ooxml' writer or 'docx' python-docx template) """
+        prop = self.get(property_id)
+        key = (prop['id'], backend)
+        with self._lock:
+            renderer = self._templates.get(key)
+            if renderer is not None:
+                self._templates.move_to_end(key)
+                self.hits += 1
+                return renderer
+            self.misses += 1
+            # Cheap: the layout itself is built on first render/warm(), under the template's own lock
+            renderer = self._templates[key] = _compile(prop, backend)
+            while len(self._templates) > self.max_templates:
+                self._templates.popitem(last=False)
+        return renderer
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._templates),
+                'maxsize': self.max_templates, 'properties': len(self._properties)}
+
+
+def _compile(prop, backend):
+    from agreement_template import CompiledAgreement
+
+    if backend == 'docx':
+        return CompiledAgreement(prop)
+    if backend == 'ooxml':
+        from ooxml_writer import OOXMLAgreementWriter
+        return OOXMLAgreementWriter(CompiledAgreement(prop))
+    raise ValueError(f"Unknown agreement backend: {backend}")
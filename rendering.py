@@ -0,0 +1,74 @@
+"""
+Text that goes into every agreement besides the client's own fields: amounts
+in words (Indian numbering) and the formatted term dates.
+
+Rents and deposits repeat across properties and start dates cluster on the
+1st, so both are memoized in bounded LRU caches. There is no separate table
+of common amounts: warm() only pre-fills the amount LRU with the common rent
+bands, and they are evicted like any other entry once they go unused.
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+# What warm() pre-fills: every ₹500 step up to ₹2,00,000 covers the rents and (up to 2x) deposits we see
+COMMON_AMOUNTS = range(500, 200_001, 500)
+
+Term = namedtuple('Term', 'start_date end_date start_str end_str')
+
+
+def format_date_with_suffix(d):
+    """ Formats a date object into '03rd day of August 2025' style """
+    day = d.day
+    if 4 <= day <= 20 or 24 <= day <= 30:
+        suffix = "th"
+    else:
+        suffix = ["st", "nd", "rd"][day % 10 - 1]
+    return f"{day:02d}{suffix} day of {d.strftime('%B %Y')}"
+
+
+# --- Amounts ---
+def rupees_in_words(amount):
+    """ 200 -> 'Rupees Two Hundred' (uncached; for text compiled into a template) """
+    from num2words import num2words
+    return f"Rupees {num2words(int(amount), lang='en_IN').title()}"
+
+
+def _spell_amount(amount):
+    return f"{rupees_in_words(amount)} Only"
+
+
+@lru_cache(maxsize=4096)
+def _cached_amount(amount):
+    return _spell_amount(amount)
+
+
+def amount_in_words(amount):
+    """ 12000 -> 'Rupees Twelve Thousand Only' """
+    return _cached_amount(int(amount))
+
+
+# --- Dates ---
+@lru_cache(maxsize=2048)
+def agreement_term(start, stay_months):
+    """ Term for a start date: it ends on the last day of the month before start + stay_months """
+    from dateutil.relativedelta import relativedelta
+
+    next_month_date = start + relativedelta(months=+stay_months)
+    first_day_of_next_month = next_month_date.replace(day=1)
+    end = first_day_of_next_month - relativedelta(days=1)
+    return Term(start, end, format_date_with_suffix(start), format_date_with_suffix(end))
+
+
+# --- Cache Management ---
+def warm():
+    """ Pre-fills the amount LRU with COMMON_AMOUNTS (a cold start would otherwise spell each one on first use) """
+    for amount in COMMON_AMOUNTS:
+        _cached_amount(amount)
+
+
+def cache_stats():
+    amounts, terms = _cached_amount.cache_info(), agreement_term.cache_info()
+    return {
+        'amount_words': {'hits': amounts.hits, 'misses': amounts.misses, 'size': amounts.currsize, 'maxsize': amounts.maxsize},
+        'agreement_term': {'hits': terms.hits, 'misses': terms.misses, 'size': terms.currsize, 'maxsize': terms.maxsize},
+    }
@@ -0,0 +1,253 @@
+"""
+Re-renders archived agreements with the current templates, e.g. after a
+clause or a property's terms change, and streams them into a ZIP:
+
+    python rerender.py -o reissued.zip                      # agreements active today
+    python rerender.py -o reissued.zip --active-on 2025-12-01 --workers 4
+    python rerender.py -o reissued.zip --all
+
+A record is skipped when its inputs (client data and signature) already have
+a rendering with its property's current template version. Everything else is
+rendered across a process pool and stored back in the archive as the
+replacement of the original record (superseded_by), so the next run selects
+only the new one and skips it too. Progress is checkpointed to <output>.checkpoint after each
+document; running the same command again after an interruption resumes where
+it stopped, copying the documents already done into the new ZIP from the
+archive instead of rendering them again.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import shutil
+import sys
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date
+
+from archive import inputs_digest
+from batch import pool_context, pool_worker, render_only
+
+SIGNATURE_PART = 'word/media/image1.png'
+_VECTOR_SIGNATURE = re.compile(r'<mc:AlternateContent xmlns:mc=.*?</mc:AlternateContent>', re.S)
+
+
+class _StoredDrawing:
+    """ A vector signature recovered from a document, in the VectorSignature interface the writers use """
+    __slots__ = ('xml',)
+
+    def __init__(self, xml):
+        self.xml = xml
+
+    def drawing_xml(self):
+        return self.xml
+
+
+def stored_signature(blob_path):
+    """ The signature inside an archived .docx, for records archived before signatures were kept """
+    with zipfile.ZipFile(blob_path) as package:
+        if SIGNATURE_PART in package.namelist():
+            return package.read(SIGNATURE_PART)
+        match = _VECTOR_SIGNATURE.search(package.read('word/document.xml').decode('utf-8'))
+    if match is None:
+        raise ValueError("No signature stored for this agreement")
+    return _StoredDrawing(match.group(0))
+
+
+def record_agreement(record):
+    """ The archived client data as an Agreement, keeping the stay it was agreed with """
+    import main
+
+    client_data = record['client_data']
+    agreement = main.parse_agreement(dict(client_data, signature=record['signature_data_url']), require_signature=False)
+    if client_data.get('stay_months'):
+        agreement.stay_months = int(client_data['stay_months'])
+    return agreement
+
+
+# --- Worker ---
+def render_record(record):
+    """ Process pool entry point: an archived record in, the .docx bytes out """
+    import main
+    from signature import signature_from_data_url
+
+    agreement = record_agreement(record)
+    if record['signature_data_url']:
+        agreement.signature = signature_from_data_url(record['signature_data_url'])
+    else:
+        agreement.signature = stored_signature(main.archive.blob_path(record['sha256']))
+    # Always the ooxml writer: its output is byte-stable, which the skip check relies on
+    chunks = main.create_word_agreement_chunks(agreement, backend='ooxml')
+    return b''.join(chunks)
+
+
+# --- Checkpoint ---
+class Checkpoint:
+    """
+    Append-only JSON lines: a header naming the run (selection and template
+    versions), then one line per finished record. A checkpoint from a run with
+    different arguments or templates is discarded.
+    """
+
+    def __init__(self, path, header):
+        self.path = path
+        self.done = {}  # record id -> {'status', 'archive_id', 'filename', 'error'}
+        if os.path.exists(path):
+            with open(path) as f:
+                lines = [json.loads(line) for line in f if line.strip().endswith('}')]
+            if lines and lines[0] == header:
+                self.done = {entry['record']: entry for entry in lines[1:]}
+        # Rewritten without any torn last line, then appended to
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.writelines(json.dumps(entry) + '\n' for entry in [header, *self.done.values()])
+        os.replace(tmp_path, path)
+        self._file = open(path, 'a')
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def record(self, entry):
+        self.done[entry['record']] = entry
+        self._write(entry)
+
+    def finish(self):
+        self._file.close()
+        os.remove(self.path)
+
+
+# --- Job ---
+def plan(archive, versions, active_on, done):
+    """ Yields (record, reason) for every selected record; reason is None if it needs rendering """
+    seen = set()
+    # A resumed run replaced some records already: the originals are still reported and copied into its ZIP,
+    # their replacements are not selected a second time
+    replacements = {entry['archive_id'] for entry in done.values() if entry['status'] == 'ok'}
+    for record in archive.iter_records(active_on, include_superseded=bool(done)):
+        record_id = record['id']
+        if record_id in done and done[record_id]['status'] == 'ok':
+            yield record, 'done'
+            continue
+        if record['superseded_by'] or record_id in replacements:
+            continue
+        property_id = record['client_data'].get('property_id')
+        version = versions.get(property_id or None)
+        if version is None:
+            yield record, f"Unknown property: {property_id}"
+            continue
+        digest = inputs_digest(record['client_data'], record['signature_data_url'])
+        if (digest, version) in seen:
+            yield record, 'duplicate'  # same inputs as an earlier record in this run
+            continue
+        if archive.has_rendering(digest, version):
+            yield record, 'unchanged'
+            continue
+        seen.add((digest, version))
+        yield record, None
+
+
+def rerender(output, active_on=None, max_workers=None, max_pending=None):
+    """ Runs the job into the ZIP at output; returns the report rows (record, status, filename, error) """
+    import main
+
+    properties = main.registry.properties()
+    versions = {property_id: main.template_version(property_id, 'ooxml') for property_id in properties}
+    versions[None] = versions[next(iter(properties))]  # records archived before properties existed
+    checkpoint = Checkpoint(f"{output}.checkpoint", {
+        'active_on': active_on,
+        'versions': {str(key): value for key, value in versions.items() if key is not None},
+    })
+    max_workers = max_workers or os.cpu_count()
+    max_pending = max_pending or max_workers * 4
+    report = []
+
+    def add_document(out, record_id, filename, data=None, archive_id=None):
+        name = f"{record_id:06d}_{filename}"
+        if data is not None:
+            out.writestr(name, data)
+        else:
+            blob_path = main.archive.blob_path(main.archive.get(archive_id)['sha256'])
+            with out.open(name, 'w') as dst, open(blob_path, 'rb') as src:
+                shutil.copyfileobj(src, dst)
+        return name
+
+    # .docx files are already deflated, so store them as-is
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_STORED) as out, \
+            ProcessPoolExecutor(max_workers=max_workers, mp_context=pool_context(),
+                                initializer=pool_worker) as pool:
+        pending = {}
+
+        def collect(futures):
+            for future in futures:
+                record = pending.pop(future)
+                try:
+                    data = future.result()
+                except Exception as e:
+                    report.append((record['id'], 'error', '', str(e)))
+                    checkpoint.record({'record': record['id'], 'status': 'error', 'error': str(e)})
+                    continue
+                term = main.agreement_term(record_agreement(record))
+                archive_id = main.archive.store(
+                    data, record['filename'], dict(record['client_data'], signature_data_url=record['signature_data_url']),
+                    term.start_date, term.end_date,
+                    template_version=versions[record['client_data'].get('property_id') or None],
+                    supersedes=record['id'])
+                name = add_document(out, record['id'], record['filename'], data)
+                report.append((record['id'], 'ok', name, ''))
+                checkpoint.record({'record': record['id'], 'status': 'ok', 'archive_id': archive_id,
+                                   'filename': record['filename']})
+
+        for record, reason in plan(main.archive, versions, active_on, checkpoint.done):
+            if reason == 'done':
+                entry = checkpoint.done[record['id']]
+                name = add_document(out, record['id'], entry['filename'], archive_id=entry['archive_id'])
+                report.append((record['id'], 'ok', name, ''))
+            elif reason in ('unchanged', 'duplicate'):
+                report.append((record['id'], reason, '', ''))
+            elif reason:
+                report.append((record['id'], 'error', '', reason))
+            else:
+                pending[pool.submit(render_record, record)] = record
+                if len(pending) >= max_pending:
+                    collect(wait(pending, return_when=FIRST_COMPLETED).done)
+        collect(wait(pending).done)
+
+        report_stream = io.StringIO()
+        writer = csv.writer(report_stream)
+        writer.writerow(['record', 'status', 'filename', 'error'])
+        writer.writerows(sorted(report))
+        out.writestr('report.csv', report_stream.getvalue())
+
+    checkpoint.finish()
+    return report
+
+
+# --- CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-render archived agreements with the current templates.")
+    parser.add_argument('-o', '--output', default='reissued.zip', help="ZIP file to write (default: reissued.zip)")
+    parser.add_argument('--active-on', default=date.today().isoformat(),
+                        help="Only agreements whose term covers this YYYY-MM-DD (default: today)")
+    parser.add_argument('--all', action='store_true', help="Every archived agreement, active or not")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+    render_only()
+
+    report = rerender(args.output, None if args.all else args.active_on, args.workers)
+    counts = {}
+    for _, status, _, _ in report:
+        counts[status] = counts.get(status, 0) + 1
+    print(f"Re-rendered {counts.get('ok', 0)} agreements into {args.output}; "
+          f"{counts.get('unchanged', 0) + counts.get('duplicate', 0)} unchanged, {counts.get('error', 0)} failed")
+    for record_id, status, _, error in sorted(report):
+        if status == 'error':
+            print(f"Record {record_id}: {error}", file=sys.stderr)
+    return 1 if counts.get('error') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+import base64
+import binascii
+import io
+import json
+import math
+
+# --- Limits ---
+MAX_SIGNATURE_BYTES = 1024 * 1024  # decoded PNG size
+MAX_SIGNATURE_PIXELS = 4000 * 2000
+SIGNATURE_DPI = 300
+SIGNATURE_MAX_WIDTH = 2 * SIGNATURE_DPI  # printed 2 inches wide
+
+MAX_STROKE_POINTS = 20000
+# Canvas pixels either way; strokes dragged past the canvas edge go slightly negative
+MAX_STROKE_COORDINATE = 4000
+
+# Raster signatures
+INK_THRESHOLD = 200  # grey levels below this count as ink (canvas background is rgb(249, 250, 251))
+CROP_PADDING = 8
+
+# Vector signatures
+STROKES_MEDIA_TYPE = "data:application/vnd.signature-strokes+json"
+PATH_SCALE = 10  # path units per canvas pixel, keeps sub-pixel detail as integers
+SIMPLIFY_EPSILON = 0.5  # canvas pixels
+SIGNATURE_WIDTH_EMU = 1828800  # 2 inches
+SIGNATURE_MAX_HEIGHT_EMU = 914400  # 1 inch
+STROKE_WIDTH_EMU = 12700  # 1 pt
+
+
+class SignatureError(ValueError):
+    pass
+
+
+def decode_signature(data_url, max_bytes=MAX_SIGNATURE_BYTES):
+    """ Returns the PNG bytes from a canvas data URL, rejecting oversized payloads before decoding """
+    header, sep, encoded = data_url.partition(",")
+    if not sep or not header.startswith("data:image/png;base64"):
+        raise SignatureError("Signature must be a PNG data URL")
+    if len(encoded) > (max_bytes + 2) // 3 * 4:
+        raise SignatureError("Signature image is too large")
+    try:
+        return base64.b64decode(encoded, validate=True)
+    except binascii.Error:
+        raise SignatureError("Signature data is not valid base64")
+
+
+def normalize_signature(png_bytes):
+    """
+    Crops the empty canvas margin and re-encodes the strokes as a bilevel PNG
+    no wider than the printed 2-inch width at 300 dpi.
+    """
+    from PIL import Image
+
+    try:
+        image = Image.open(io.BytesIO(png_bytes))
+    except Exception:
+        raise SignatureError("Signature is not a readable image")
+    width, height = image.size  # header only; nothing decoded yet
+    if width * height > MAX_SIGNATURE_PIXELS:
+        raise SignatureError("Signature image is too large")
+
+    # Flatten transparency onto white, then work in greyscale
+    image = image.convert("RGBA")
+    canvas = Image.new("RGBA", image.size, (255, 255, 255, 255))
+    gray = Image.alpha_composite(canvas, image).convert("L")
+
+    ink = gray.point(lambda v: 255 if v < INK_THRESHOLD else 0)
+    bbox = ink.getbbox()
+    if bbox is None:
+        raise SignatureError("Signature is empty")
+    left, top, right, bottom = bbox
+    gray = gray.crop((
+        max(0, left - CROP_PADDING), max(0, top - CROP_PADDING),
+        min(width, right + CROP_PADDING), min(height, bottom + CROP_PADDING),
+    ))
+
+    if gray.width > SIGNATURE_MAX_WIDTH:
+        new_height = max(1, round(gray.height * SIGNATURE_MAX_WIDTH / gray.width))
+        gray = gray.resize((SIGNATURE_MAX_WIDTH, new_height), Image.LANCZOS)
+
+    bilevel = gray.point(lambda v: 0 if v < INK_THRESHOLD else 255, "1")
+    out = io.BytesIO()
+    bilevel.save(out, format="PNG", optimize=True, dpi=(SIGNATURE_DPI, SIGNATURE_DPI))
+    return out.getvalue()
+
+
+# --- Vector Signatures ---
+def _simplify(points, epsilon=SIMPLIFY_EPSILON):
+    """ Ramer-Douglas-Peucker: drops points closer than epsilon to the line through their neighbours """
+    if len(points) < 3:
+        return points
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        (x1, y1), (x2, y2) = points[start], points[end]
+        dx, dy = x2 - x1, y2 - y1
+        norm = math.hypot(dx, dy)
+        farthest, index = 0.0, None
+        for i in range(start + 1, end):
+            x, y = points[i]
+            if norm:
+                distance = abs(dy * (x - x1) - dx * (y - y1)) / norm
+            else:
+                distance = math.hypot(x - x1, y - y1)
+            if distance > farthest:
+                farthest, index = distance, i
+        if index is not None and farthest > epsilon:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+class VectorSignature:
+    """ Pen strokes cropped to their bounding box, in integer path units """
+    __slots__ = ('strokes', 'width', 'height')
+
+    def __init__(self, strokes, width, height):
+        self.strokes = strokes
+        self.width = width
+        self.height = height
+
+    def extent(self):
+        """ (cx, cy) in EMU: 2 inches wide, at most 1 inch tall, aspect ratio kept """
+        cx = SIGNATURE_WIDTH_EMU
+        cy = round(cx * self.height / self.width)
+        if cy > SIGNATURE_MAX_HEIGHT_EMU:
+            cx = round(SIGNATURE_MAX_HEIGHT_EMU * self.width / self.height)
+            cy = SIGNATURE_MAX_HEIGHT_EMU
+        return cx, cy
+
+    def drawing_xml(self):
+        """
+        The strokes as an inline DrawingML custom-geometry shape, ready to go
+        inside a w:r, with the same strokes as a VML shape in mc:Fallback for
+        consumers that do not support wps (older Word, many converters).
+        """
+        cx, cy = self.extent()
+        paths, vml_path = [], []
+        for stroke in self.strokes:
+            (x, y), rest = stroke[0], stroke[1:] or stroke[:1]  # a lone dot is drawn as a zero-length line
+            segments = "".join(f'<a:lnTo><a:pt x="{px}" y="{py}"/></a:lnTo>' for px, py in rest)
+            paths.append(f'<a:path w="{self.width}" h="{self.height}" fill="none">'
+                         f'<a:moveTo><a:pt x="{x}" y="{y}"/></a:moveTo>{segments}</a:path>')
+            vml_path.append(f"m{x},{y}l{','.join(f'{px},{py}' for px, py in rest)}")
+        return (
+            '<mc:AlternateContent xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006" '
+            'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+            'xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing" '
+            'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+            'xmlns:wps="http://schemas.microsoft.com/office/word/2010/wordprocessingShape" '
+            'xmlns:v="urn:schemas-microsoft-com:vml">'
+            '<mc:Choice Requires="wps"><w:drawing><wp:inline distT="0" distB="0" distL="0" distR="0">'
+            f'<wp:extent cx="{cx}" cy="{cy}"/><wp:docPr id="1" name="Signature"/>'
+            '<a:graphic><a:graphicData uri="http://schemas.microsoft.com/office/word/2010/wordprocessingShape">'
+            '<wps:wsp><wps:cNvSpPr/><wps:spPr>'
+            f'<a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+            '<a:custGeom><a:avLst/><a:gdLst/><a:ahLst/><a:cxnLst/><a:rect l="0" t="0" r="r" b="b"/>'
+            f'<a:pathLst>{"".join(paths)}</a:pathLst></a:custGeom><a:noFill/>'
+            f'<a:ln w="{STROKE_WIDTH_EMU}" cap="rnd"><a:solidFill><a:srgbClr val="000000"/></a:solidFill><a:round/></a:ln>'
+            '</wps:spPr><wps:bodyPr/></wps:wsp></a:graphicData></a:graphic></wp:inline></w:drawing>'
+            '</mc:Choice><mc:Fallback><w:pict>'
+            f'<v:shape style="width:{cx / 12700:g}pt;height:{cy / 12700:g}pt" '
+            f'coordsize="{self.width},{self.height}" path="{"".join(vml_path)}e" filled="f" stroked="t" '
+            f'strokecolor="black" strokeweight="{STROKE_WIDTH_EMU / 12700:g}pt">'
+            '<v:stroke endcap="round" joinstyle="round"/></v:shape>'
+            '</w:pict></mc:Fallback></mc:AlternateContent>'
+        )
+
+
+def _is_coordinate(value):
+    # json.loads accepts NaN, Infinity and 1e999, which would fail later in round()
+    return isinstance(value, (int, float)) and math.isfinite(value) and abs(value) <= MAX_STROKE_COORDINATE
+
+
+def parse_strokes(data_url, max_bytes=MAX_SIGNATURE_BYTES):
+    """
+    Parses stroke data posted by the form: one flat [x0, y0, x1, y1, ...] list of
+    canvas coordinates per pen stroke, as built from signature_pad's toData().
+    """
+    header, sep, payload = data_url.partition(",")
+    if not sep or header != STROKES_MEDIA_TYPE:
+        raise SignatureError("Signature must be stroke data")
+    if len(payload) > max_bytes:
+        raise SignatureError("Signature is too large")
+    try:
+        raw_strokes = json.loads(payload)
+    except ValueError:
+        raise SignatureError("Signature stroke data is not valid JSON")
+
+    if not isinstance(raw_strokes, list) or sum(len(s) for s in raw_strokes if isinstance(s, list)) > 2 * MAX_STROKE_POINTS:
+        raise SignatureError("Signature stroke data is malformed or too large")
+    strokes = []
+    for raw in raw_strokes:
+        if not isinstance(raw, list) or len(raw) % 2 or not all(_is_coordinate(v) for v in raw):
+            raise SignatureError("Signature stroke data is malformed or too large")
+        if raw:
+            strokes.append(_simplify(list(zip(raw[0::2], raw[1::2]))))
+    if not strokes:
+        raise SignatureError("Signature is empty")
+
+    xs = [x for stroke in strokes for x, _ in stroke]
+    ys = [y for stroke in strokes for _, y in stroke]
+    left, top = min(xs) - 2, min(ys) - 2
+    width = max(1, round((max(xs) + 2 - left) * PATH_SCALE))
+    height = max(1, round((max(ys) + 2 - top) * PATH_SCALE))
+    strokes = [[(round((x - left) * PATH_SCALE), round((y - top) * PATH_SCALE)) for x, y in stroke] for stroke in strokes]
+    return VectorSignature(strokes, width, height)
+
+
+def signature_from_data_url(data_url):
+    """
+    Data URL in, signature out: normalized PNG bytes for canvas images, or a
+    VectorSignature for stroke data. Nothing touches the filesystem.
+    """
+    if data_url.startswith(STROKES_MEDIA_TYPE):
+        return parse_strokes(data_url)
+    return normalize_signature(decode_signature(data_url))
@@ -0,0 +1,130 @@
+"""
+Admission control: slots up to max_in_flight, a bounded wait queue, the
+timeout that turns a submission away with 429, and releasing on errors.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import pytest  # noqa: E402
+
+from admission import Admission, Overloaded, oversized_field  # noqa: E402
+
+
+def acquire_in_thread(admission):
+    """ Starts a thread waiting for a slot; returns it and a list that gets 'admitted' or the Overloaded """
+    outcome = []
+
+    def acquire():
+        try:
+            admission.acquire()
+            outcome.append('admitted')
+        except Overloaded as e:
+            outcome.append(e)
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    return thread, outcome
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.005)
+
+
+def test_admits_up_to_the_limit_then_queues():
+    admission = Admission(2, max_waiting=1, max_wait=5)
+    admission.acquire()
+    admission.acquire()
+    assert admission.in_flight == 2
+    thread, outcome = acquire_in_thread(admission)
+    wait_until(lambda: admission.waiting == 1)
+    assert outcome == []
+    admission.release()
+    thread.join(5)
+    assert outcome == ['admitted']
+    assert (admission.in_flight, admission.waiting) == (2, 0)
+
+
+def test_turns_away_past_the_wait_queue():
+    admission = Admission(1, max_waiting=1, max_wait=5, retry_after=3)
+    admission.acquire()
+    thread, outcome = acquire_in_thread(admission)
+    wait_until(lambda: admission.waiting == 1)
+    started = time.perf_counter()
+    with pytest.raises(Overloaded) as caught:
+        admission.acquire()
+    assert time.perf_counter() - started < 0.5  # straight away, not after max_wait
+    assert (caught.value.reason, caught.value.retry_after) == ('queue_full', 3)
+    admission.release()
+    thread.join(5)
+    assert outcome == ['admitted']
+
+
+def test_no_wait_queue_turns_away_at_the_limit():
+    admission = Admission(1)
+    admission.acquire()
+    with pytest.raises(Overloaded) as caught:
+        admission.acquire()
+    assert caught.value.reason == 'queue_full'
+
+
+def test_times_out_waiting_for_a_slot():
+    admission = Admission(1, max_waiting=2, max_wait=0.2, retry_after=5)
+    admission.acquire()
+    started = time.perf_counter()
+    with pytest.raises(Overloaded) as caught:
+        admission.acquire()
+    assert 0.2 <= time.perf_counter() - started < 1.0
+    assert (caught.value.reason, caught.value.retry_after) == ('wait_timeout', 5)
+    # The timed-out waiter left the queue and took no slot
+    assert (admission.in_flight, admission.waiting) == (1, 0)
+
+
+def test_releases_the_slot_when_the_work_raises():
+    admission = Admission(1)
+    with pytest.raises(RuntimeError):
+        with admission:
+            assert admission.in_flight == 1
+            raise RuntimeError("render failed")
+    assert admission.in_flight == 0
+    with admission:
+        pass
+
+
+def test_zero_admits_everything():
+    admission = Admission(0)
+    for _ in range(100):
+        admission.acquire()
+    assert admission.in_flight == 100
+
+
+def test_oversized_field():
+    assert oversized_field({'first_name': 'a' * 500, 'notes': 'b' * 10_000}) is None
+    assert oversized_field({'first_name': 'a' * 501}) == 'first_name'
+    assert oversized_field({'property_id': 'p' * 101}) == 'property_id'
+
+
+def test_submit_answers_429_with_retry_after_when_no_slot_frees(monkeypatch):
+    from batch import render_only
+    from fixtures import sample_form
+
+    render_only()
+    import main
+
+    admission = Admission(1, max_waiting=1, max_wait=0.1, retry_after=7)
+    monkeypatch.setattr(main, 'submit_admission', admission)
+    admission.acquire()
+    response = main.app.test_client().post('/submit', data=sample_form(5))
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '7'
+    assert (admission.in_flight, admission.waiting) == (1, 0)
@@ -0,0 +1,108 @@
+"""
+Agreement.parse(): required fields, formats and type coercion, checked
+against what the original form handler rejected.
+
+    python -m pytest tests
+"""
+import os
+import sys
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import pytest  # noqa: E402
+
+from agreement_model import FIELDS, Agreement, InvalidAgreement  # noqa: E402
+from fixtures import sample_form  # noqa: E402
+
+# The fields the original /submit handler refused to go on without, in its order
+BASELINE_REQUIRED = [
+    'salutation', 'first_name', 'last_name', 'age',
+    'address', 'permanent_district', 'permanent_state', 'permanent_pincode',
+    'aadhar_no',
+    'office_address', 'office_district', 'office_state', 'office_pincode',
+    'email_id',
+    'ref1_name', 'ref1_number', 'ref2_name', 'ref2_number',
+    'rented_address', 'rent_price', 'security_deposit', 'start_date',
+    'signature',
+]
+
+
+def form(**overrides):
+    fields = sample_form(1)
+    fields.update(overrides)
+    return fields
+
+
+def errors(fields, **options):
+    with pytest.raises(InvalidAgreement) as caught:
+        Agreement.parse(fields, **options)
+    return caught.value.errors
+
+
+def test_parses_a_valid_submission():
+    agreement = Agreement.parse(form())
+    assert agreement.full_name == f"{agreement.first_name} {agreement.last_name}"
+    assert agreement.signature_data_url.startswith('data:image/png;base64,')
+    assert agreement.property_id is None and agreement.stay_months is None
+
+
+def test_requires_every_field_the_baseline_required():
+    assert list(FIELDS) == BASELINE_REQUIRED
+
+
+@pytest.mark.parametrize('field', BASELINE_REQUIRED)
+@pytest.mark.parametrize('blank', [None, '', '   '])
+def test_rejects_a_missing_or_blank_field_with_the_baseline_message(field, blank):
+    fields = form()
+    if blank is None:
+        del fields[field]
+    else:
+        fields[field] = blank
+    label = field.replace('_', ' ').title()
+    assert errors(fields) == {field: f"{label} cannot be empty."}
+
+
+def test_reports_every_problem_at_once_in_form_order():
+    found = errors(form(first_name='', aadhar_no='1234', age='twenty', start_date='', signature=''))
+    assert list(found) == ['first_name', 'age', 'aadhar_no', 'start_date', 'signature']
+    assert found['aadhar_no'] == "Aadhar No must be a 12-digit Aadhar number."
+    assert found['age'] == "Age must be a whole number."
+
+
+def test_signature_is_optional_when_not_required():
+    agreement = Agreement.parse(form(signature=''), require_signature=False)
+    assert agreement.signature_data_url is None
+
+
+def test_coerces_numbers_dates_and_digit_fields():
+    agreement = Agreement.parse(form(age=' 27 ', rent_price='12,500', security_deposit='25000',
+                                     start_date='2026-03-01', aadhar_no='1234 5678-9012',
+                                     ref1_number='98765 43210', first_name='  Asha '))
+    assert (agreement.age, agreement.rent_price, agreement.security_deposit) == (27, 12500, 25000)
+    assert agreement.start_date == date(2026, 3, 1)
+    assert agreement.aadhar_no == '123456789012'
+    assert agreement.ref1_number == '9876543210'
+    assert agreement.first_name == 'Asha'
+    assert agreement.salutation in ('Mr', 'Ms')
+
+
+@pytest.mark.parametrize('field, value', [
+    ('age', '27.5'), ('rent_price', 'ten'), ('start_date', '01/03/2026'), ('start_date', '2026-02-30'),
+    ('permanent_pincode', '12345'), ('office_pincode', '1234567'), ('ref2_number', '98765'),
+    ('aadhar_no', '12345678901a'), ('salutation', 'Dr'),
+])
+def test_rejects_malformed_values(field, value):
+    assert list(errors(form(**{field: value}))) == [field]
+
+
+def test_salutation_may_end_with_a_full_stop():
+    assert Agreement.parse(form(salutation='Ms.')).salutation == 'Ms'
+
+
+def test_invalid_agreement_is_a_value_error_with_every_message():
+    with pytest.raises(ValueError) as caught:
+        Agreement.parse(form(first_name='', last_name=''))
+    assert str(caught.value) == "First Name cannot be empty.; Last Name cannot be empty."
@@ -0,0 +1,35 @@
+"""
+Archive records replaced by a re-render.
+
+    python -m pytest tests
+"""
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archive import Archive  # noqa: E402
+
+CLIENT = {'first_name': 'Priya', 'last_name': 'Iyer', 'aadhar_no': '123412341234', 'rented_address': 'Room 4'}
+
+
+def store(archive, data, **options):
+    return archive.store([data], 'Agreement.docx', CLIENT, date(2025, 6, 1), date(2026, 4, 30), **options)
+
+
+def test_superseded_records_are_left_out_of_iteration(tmp_path):
+    archive = Archive(str(tmp_path))
+    first, other = store(archive, b'v1'), store(archive, b'other')
+    second = store(archive, b'v2', template_version='b', supersedes=first)
+
+    assert [record['id'] for record in archive.iter_records()] == [other, second]
+    assert [record['id'] for record in archive.iter_records(include_superseded=True)] == [first, other, second]
+    assert archive.get(first)['superseded_by'] == second
+
+
+def test_identical_rerender_does_not_supersede_itself(tmp_path):
+    archive = Archive(str(tmp_path))
+    first = store(archive, b'v1')
+    assert store(archive, b'v1', template_version='a', supersedes=first) == first
+    assert [record['id'] for record in archive.iter_records()] == [first]
@@ -0,0 +1,56 @@
+"""
+Batch ZIP generation on a process pool started from a forkserver.
+
+    python -m pytest tests
+"""
+import csv
+import io
+import json
+import os
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch import iter_batch_zip, pool_context, pool_worker, read_rows  # noqa: E402
+
+
+def parse(fields):
+    if not fields.get('name'):
+        raise ValueError("Name cannot be empty.")
+    return fields['name']
+
+
+def render(name):
+    if name == 'boom':
+        raise RuntimeError("render failed")
+    return f"{name}.docx", name.encode()
+
+
+def outbox_started():
+    import main
+
+    return main.outbox._started
+
+
+def test_streams_rows_through_a_bounded_window():
+    names = ['a', '', 'boom'] + [f"n{i}" for i in range(20)]
+    rows = read_rows('\n'.join(json.dumps({'name': name}) for name in names), 'jsonl')
+    with ProcessPoolExecutor(max_workers=2, mp_context=pool_context()) as pool:
+        chunks = list(iter_batch_zip(rows, parse, render, pool, max_pending=3))
+    assert len(chunks) > 2  # written as rows finish, not all at the end
+
+    archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+    report = {int(row['row']): row for row in csv.DictReader(io.StringIO(archive.read('report.csv').decode()))}
+    assert archive.read('0001_a.docx') == b'a'
+    assert report[2]['error'] == "Name cannot be empty."
+    assert report[3]['error'] == "render failed"
+    assert sum(row['status'] == 'ok' for row in report.values()) == 21
+
+
+def test_pool_workers_do_not_start_the_outbox(tmp_path, monkeypatch):
+    monkeypatch.setenv('OUTBOX_DIR', str(tmp_path))
+    monkeypatch.delenv('OUTBOX_AUTOSTART', raising=False)
+    with ProcessPoolExecutor(max_workers=1, mp_context=pool_context(), initializer=pool_worker) as pool:
+        assert pool.submit(outbox_started).result() is False
@@ -0,0 +1,147 @@
+"""
+Idempotency cache: concurrent duplicates wait on the in-flight result, TTL
+expiry, and a failed first attempt releasing the key.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+import idempotency  # noqa: E402
+from idempotency import IdempotencyCache, canonical_key  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(idempotency.time, 'monotonic', clock)
+    return clock
+
+
+def call_in_threads(cache, key, compute, count, **options):
+    """ Starts count callers; each appends its (result, replayed) or the exception it raised """
+    results = []
+
+    def call():
+        try:
+            results.append(cache.get_or_compute(key, compute, **options))
+        except Exception as e:
+            results.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def blocking(result, started, release, calls):
+    def compute():
+        calls.append(threading.current_thread().name)
+        started.set()
+        assert release.wait(5)
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return compute
+
+
+def test_concurrent_duplicates_wait_for_the_first_result():
+    cache = IdempotencyCache()
+    started, release, calls = threading.Event(), threading.Event(), []
+    first, first_results = call_in_threads(cache, 'k', blocking('ok', started, release, calls), 1)
+    assert started.wait(5)
+    waiters, results = call_in_threads(cache, 'k', blocking('again', started, release, calls), 5)
+    time.sleep(0.1)
+    assert all(thread.is_alive() for thread in waiters)  # blocked on the in-flight call
+    release.set()
+    for thread in first + waiters:
+        thread.join(5)
+    assert len(calls) == 1
+    assert first_results == [('ok', False)]
+    assert results == [('ok', True)] * 5
+    # Replayed from the cache afterwards too
+    assert cache.get_or_compute('k', lambda: 'new') == ('ok', True)
+
+
+def test_failed_first_attempt_releases_the_key():
+    cache = IdempotencyCache()
+    started, release, calls = threading.Event(), threading.Event(), []
+    failing = blocking(RuntimeError('render failed'), started, release, calls)
+    first, first_results = call_in_threads(cache, 'k', failing, 1)
+    assert started.wait(5)
+    waiters, results = call_in_threads(cache, 'k', lambda: 'retried', 1)
+    time.sleep(0.1)
+    release.set()
+    for thread in first + waiters:
+        thread.join(5)
+    assert [str(e) for e in first_results] == ['render failed']
+    # The waiter computes afresh rather than replaying the failure
+    assert results == [('retried', False)]
+    assert cache.get_or_compute('k', lambda: 'new') == ('retried', True)
+
+
+def test_exception_propagates_and_leaves_nothing_cached():
+    cache = IdempotencyCache()
+    with pytest.raises(ValueError):
+        cache.get_or_compute('k', lambda: int('x'))
+    assert len(cache) == 0
+    assert cache.get_or_compute('k', lambda: 1) == (1, False)
+
+
+def test_uncacheable_results_go_to_waiters_but_are_not_kept():
+    cache = IdempotencyCache()
+    started, release, calls = threading.Event(), threading.Event(), []
+    first, first_results = call_in_threads(cache, 'k', blocking(503, started, release, calls), 1,
+                                           cacheable=lambda status: status < 500)
+    assert started.wait(5)
+    waiters, results = call_in_threads(cache, 'k', lambda: 202, 1, cacheable=lambda status: status < 500)
+    time.sleep(0.1)
+    release.set()
+    for thread in first + waiters:
+        thread.join(5)
+    assert first_results == [(503, False)] and results == [(503, True)]
+    assert len(cache) == 0
+    assert cache.get_or_compute('k', lambda: 202) == (202, False)
+
+
+def test_results_expire_after_ttl(clock):
+    cache = IdempotencyCache(ttl=60)
+    assert cache.get_or_compute('k', lambda: 'first') == ('first', False)
+    clock.now += 59
+    assert cache.get_or_compute('k', lambda: 'second') == ('first', True)
+    clock.now += 1
+    assert cache.get_or_compute('k', lambda: 'second') == ('second', False)
+
+
+def test_expired_and_least_recently_used_entries_are_evicted(clock):
+    cache = IdempotencyCache(max_entries=2, ttl=60)
+    cache.get_or_compute('a', lambda: 1)
+    clock.now += 61
+    cache.get_or_compute('b', lambda: 2)
+    assert len(cache) == 1  # 'a' expired
+    cache.get_or_compute('c', lambda: 3)
+    cache.get_or_compute('b', lambda: None)  # touch 'b'
+    cache.get_or_compute('d', lambda: 4)
+    assert cache.get_or_compute('b', lambda: None) == (2, True)
+    assert cache.get_or_compute('c', lambda: 'recomputed') == ('recomputed', False)
+
+
+def test_canonical_key_ignores_other_fields_and_whitespace():
+    names = ['email_id', 'aadhar_no']
+    key = canonical_key({'email_id': ' a@example.com', 'aadhar_no': '1234'}, names)
+    assert key == canonical_key({'aadhar_no': '1234 ', 'email_id': 'a@example.com', 'age': '30'}, names)
+    assert key != canonical_key({'email_id': 'a@example.com', 'aadhar_no': '1235'}, names)
@@ -0,0 +1,63 @@
+"""
+The direct OOXML writer against the python-docx backend it replaces: same
+document text and page setup, and byte-stable output.
+
+    python -m pytest tests
+"""
+import io
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import pytest  # noqa: E402
+from docx import Document  # noqa: E402
+
+from batch import render_only  # noqa: E402
+from fixtures import sample_form  # noqa: E402
+
+render_only()
+import main  # noqa: E402
+
+SECTION_PROPERTIES = ('orientation', 'page_width', 'page_height', 'left_margin', 'right_margin',
+                      'top_margin', 'bottom_margin', 'header_distance', 'footer_distance')
+
+
+def agreement(index, signature_format):
+    agreement = main.parse_agreement(sample_form(index, signature_format))
+    agreement.signature = main.signature_from_data_url(agreement.signature_data_url)
+    return agreement
+
+
+def render(agreement, backend):
+    return main.create_word_agreement(agreement, backend=backend).getvalue()
+
+
+def summary(data):
+    document = Document(io.BytesIO(data))
+    return {
+        'paragraphs': [(p.text, p.alignment) for p in document.paragraphs],
+        'tables': [[cell.text for row in table.rows for cell in row.cells] for table in document.tables],
+        'sections': [{name: getattr(section, name) for name in SECTION_PROPERTIES} for section in document.sections],
+    }
+
+
+@pytest.mark.parametrize('signature_format', ['png', 'vector'])
+@pytest.mark.parametrize('index', [0, 7])
+def test_matches_the_python_docx_backend(index, signature_format):
+    submission = agreement(index, signature_format)
+    ooxml, docx = summary(render(submission, 'ooxml')), summary(render(submission, 'docx'))
+    assert ooxml['paragraphs'] == docx['paragraphs']
+    assert ooxml['tables'] == docx['tables']
+    assert ooxml['sections'] == docx['sections']
+    assert any(submission.full_name in text for text, _ in ooxml['paragraphs'])
+
+
+@pytest.mark.parametrize('signature_format', ['png', 'vector'])
+def test_output_is_byte_identical_across_renders(signature_format):
+    first = render(agreement(3, signature_format), 'ooxml')
+    second = render(agreement(3, signature_format), 'ooxml')
+    assert first == second
+    assert b''.join(main.create_word_agreement_chunks(agreement(3, signature_format), backend='ooxml')) == first
@@ -0,0 +1,266 @@
+"""
+Outbox delivery against the stub Telegram server: retries, backoff, 429
+handling, recovery after a restart and exclusive claims.
+
+    python -m pytest tests
+"""
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import pytest  # noqa: E402
+
+from delivery import Outbox, TelegramClient  # noqa: E402
+from telegram_stub import StubTelegramServer  # noqa: E402
+
+
+@pytest.fixture
+def stub():
+    with StubTelegramServer() as server:
+        yield server
+
+
+def make_outbox(directory, stub, **options):
+    client = TelegramClient('test-token', '1', api_url=stub.url)
+    options = dict(dict(workers=1, backoff_base=0.05, batch_window=0.0), **options)
+    return Outbox(str(directory), client, **options)
+
+
+def wait_for(outbox, submission_id, statuses=('sent', 'failed'), timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        record = outbox.status(submission_id)
+        if record and record['status'] in statuses:
+            return record
+        time.sleep(0.02)
+    raise AssertionError(f"{submission_id} is still {outbox.status(submission_id)}")
+
+
+def write_record(directory, submission_id, **fields):
+    record = dict(id=submission_id, filename='Agreement.docx', caption='test', status='pending', attempts=0,
+                  last_error=None, created_at=time.time(), next_attempt_at=time.time(), sent_at=None)
+    record.update(fields)
+    with open(os.path.join(directory, f"{submission_id}.docx"), 'wb') as f:
+        f.write(b'PK document')
+    with open(os.path.join(directory, f"{submission_id}.json"), 'w') as f:
+        json.dump(record, f)
+
+
+def test_sends_and_moves_the_record_out_of_the_recovery_scan(tmp_path, stub):
+    outbox = make_outbox(tmp_path, stub)
+    try:
+        submission_id = outbox.enqueue([b'PK document'], 'Agreement.docx', 'caption')
+        record = wait_for(outbox, submission_id)
+    finally:
+        outbox.stop(5)
+    assert record['status'] == 'sent' and record['attempts'] == 1
+    assert not os.path.exists(tmp_path / f"{submission_id}.json")
+    assert not os.path.exists(tmp_path / f"{submission_id}.docx")
+    assert os.path.exists(tmp_path / 'done' / f"{submission_id}.json")
+
+
+def test_retries_server_errors_with_backoff(tmp_path, stub):
+    stub.script = [500, 500]
+    outbox = make_outbox(tmp_path, stub, backoff_base=0.2)
+    try:
+        started = time.time()
+        submission_id = outbox.enqueue([b'PK document'], 'Agreement.docx', 'caption')
+        record = wait_for(outbox, submission_id)
+    finally:
+        outbox.stop(5)
+    assert record['status'] == 'sent' and record['attempts'] == 3
+    # Two backoffs of at least half of 0.2 s and 0.4 s
+    assert record['sent_at'] - started >= 0.3
+    assert [status for _, _, status in stub.requests] == [500, 500, 200]
+
+
+def test_backoff_grows_and_is_capped(tmp_path, stub):
+    outbox = make_outbox(tmp_path, stub, backoff_base=1.0, backoff_cap=5.0)
+    assert 0.5 <= outbox._backoff(1) <= 1.0
+    assert 2.0 <= outbox._backoff(3) <= 4.0
+    assert outbox._backoff(10) <= 5.0
+
+
+def test_honours_retry_after_on_429(tmp_path, stub):
+    stub.script = [429]
+    stub.retry_after = 1
+    outbox = make_outbox(tmp_path, stub)
+    try:
+        started = time.time()
+        submission_id = outbox.enqueue([b'PK document'], 'Agreement.docx', 'caption')
+        record = wait_for(outbox, submission_id)
+    finally:
+        outbox.stop(5)
+    assert record['status'] == 'sent' and record['attempts'] == 2
+    assert record['sent_at'] - started >= 1.0
+
+
+def test_gives_up_on_permanent_errors(tmp_path, stub):
+    stub.script = [400]
+    outbox = make_outbox(tmp_path, stub)
+    try:
+        submission_id = outbox.enqueue([b'PK document'], 'Agreement.docx', 'caption')
+        record = wait_for(outbox, submission_id)
+    finally:
+        outbox.stop(5)
+    assert record['status'] == 'failed' and record['attempts'] == 1
+    assert record['last_error'] == 'Bad Request: chat not found'
+    # The document goes with the failed record and expires with it
+    assert not os.path.exists(tmp_path / f"{submission_id}.docx")
+    assert os.path.exists(tmp_path / 'done' / f"{submission_id}.docx")
+    aged = time.time() - 600
+    for ext in ('json', 'docx'):
+        os.utime(tmp_path / 'done' / f"{submission_id}.{ext}", (aged, aged))
+    outbox.retention = 60
+    outbox.prune()
+    assert os.listdir(tmp_path / 'done') == []
+
+
+def test_gives_up_after_max_attempts(tmp_path, stub):
+    stub.script = [500] * 3
+    outbox = make_outbox(tmp_path, stub, max_attempts=3, backoff_base=0.01)
+    try:
+        submission_id = outbox.enqueue([b'PK document'], 'Agreement.docx', 'caption')
+        record = wait_for(outbox, submission_id)
+    finally:
+        outbox.stop(5)
+    assert record['status'] == 'failed' and record['attempts'] == 3
+
+
+def test_recovers_pending_and_stale_records_on_start(tmp_path, stub):
+    write_record(tmp_path, 'pending1')
+    write_record(tmp_path, 'stale1', status='sending', attempts=1, claimed_at=time.time() - 600)
+    outbox = make_outbox(tmp_path, stub, claim_timeout=300)
+    try:
+        outbox.start()  # no new submission needed
+        assert wait_for(outbox, 'pending1')['status'] == 'sent'
+        assert wait_for(outbox, 'stale1')['attempts'] == 2
+    finally:
+        outbox.stop(5)
+
+
+def test_does_not_reclaim_a_send_in_progress(tmp_path, stub):
+    write_record(tmp_path, 'busy1', status='sending', attempts=1, claimed_at=time.time())
+    outbox = make_outbox(tmp_path, stub, claim_timeout=300)
+    try:
+        outbox.start()
+        time.sleep(0.3)
+        assert outbox.status('busy1')['status'] == 'sending'
+        assert stub.requests == []
+    finally:
+        outbox.stop(5)
+
+
+def test_claim_is_exclusive(tmp_path, stub):
+    outbox = make_outbox(tmp_path, stub)
+    write_record(tmp_path, 'claim1')
+    first, second = outbox.claim('claim1'), outbox.claim('claim1')
+    assert first is not None and first['attempts'] == 1
+    assert second is None
+    # Handing over releases the claim for the workers
+    outbox.hand_over('claim1')
+    assert outbox.claim('claim1')['attempts'] == 2
+
+
+def test_prunes_finished_records_after_retention(tmp_path, stub):
+    outbox = make_outbox(tmp_path, stub, retention=60)
+    os.makedirs(tmp_path / 'done')
+    old, new = tmp_path / 'done' / 'old1.json', tmp_path / 'done' / 'new1.json'
+    for path in (old, new):
+        path.write_text('{}')
+    os.utime(old, (time.time() - 120, time.time() - 120))
+    outbox.prune()
+    assert not old.exists() and new.exists()
+
+
+def test_recovery_drops_documents_without_a_record(tmp_path, stub):
+    for name in ('orphan1', 'fresh1'):
+        with open(tmp_path / f"{name}.docx", 'wb') as f:
+            f.write(b'PK document')
+    # Finished while a crash left its document behind
+    write_record(tmp_path, 'failed1', status='failed')
+    os.makedirs(tmp_path / 'done')
+    os.replace(tmp_path / 'failed1.json', tmp_path / 'done' / 'failed1.json')
+    aged = time.time() - 600
+    for name in ('orphan1', 'failed1'):
+        os.utime(tmp_path / f"{name}.docx", (aged, aged))
+    outbox = make_outbox(tmp_path, stub, claim_timeout=300)
+    try:
+        outbox.start()
+    finally:
+        outbox.stop(5)
+    assert not (tmp_path / 'orphan1.docx').exists()
+    assert (tmp_path / 'done' / 'failed1.docx').exists()
+    # Too new to tell from an enqueue that has not written its record yet
+    assert (tmp_path / 'fresh1.docx').exists()
+
+
+def record_batches(outbox):
+    """ Wraps the client so each send_media_group call logs (time, batch size) """
+    batches, send = [], outbox.client.send_media_group
+
+    def send_media_group(documents):
+        batches.append((time.time(), len(documents)))
+        return send(documents)
+
+    outbox.client.send_media_group = send_media_group
+    return batches
+
+
+def test_batches_are_capped_at_the_media_group_limit(tmp_path, stub):
+    for i in range(12):
+        write_record(tmp_path, f"due{i:02d}")
+    outbox = make_outbox(tmp_path, stub, batch_window=0.2)
+    batches = record_batches(outbox)
+    try:
+        outbox.start()
+        records = [wait_for(outbox, f"due{i:02d}") for i in range(12)]
+    finally:
+        outbox.stop(5)
+    assert all(record['status'] == 'sent' for record in records)
+    assert [size for _, size in batches] == [10, 2]
+    assert [method for method, _, _ in stub.requests] == ['sendMediaGroup'] * 2
+
+
+def test_batch_window_collects_submissions_arriving_after_the_first(tmp_path, stub):
+    outbox = make_outbox(tmp_path, stub, batch_window=0.5)
+    batches = record_batches(outbox)
+    try:
+        first = outbox.enqueue([b'PK document'], 'Agreement.docx', 'first')
+        time.sleep(0.1)
+        second = outbox.enqueue([b'PK document'], 'Agreement.docx', 'second')
+        wait_for(outbox, first), wait_for(outbox, second)
+        time.sleep(0.6)  # past the window: a new batch
+        third = outbox.enqueue([b'PK document'], 'Agreement.docx', 'third')
+        wait_for(outbox, third)
+    finally:
+        outbox.stop(5)
+    assert [size for _, size in batches] == [2, 1]
+
+
+def test_retry_after_pauses_the_whole_outbox(tmp_path, stub):
+    stub.script = [429]
+    stub.retry_after = 1
+    outbox = make_outbox(tmp_path, stub, workers=2)
+    batches = record_batches(outbox)
+    try:
+        started = time.time()
+        first = outbox.enqueue([b'PK document'], 'Agreement.docx', 'first')
+        deadline = time.time() + 5
+        while (outbox.status(first)['status'], outbox.status(first)['attempts']) != ('pending', 1):
+            assert time.time() < deadline
+            time.sleep(0.01)
+        assert outbox._paused_until >= started + 1.0
+        # A different submission, and an idle worker, still wait out the 429
+        second = outbox.enqueue([b'PK document'], 'Agreement.docx', 'second')
+        records = wait_for(outbox, first), wait_for(outbox, second)
+    finally:
+        outbox.stop(5)
+    assert all(record['status'] == 'sent' for record in records)
+    assert all(sent_at - started >= 1.0 for sent_at, _ in batches[1:])
+    assert records[1]['attempts'] == 1
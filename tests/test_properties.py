@@ -0,0 +1,55 @@
+"""
+Loading and reloading the property definitions file.
+
+    python -m pytest tests
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+from properties import PropertyRegistry, normalize_definition  # noqa: E402
+
+DEFINITION = {'name': 'Test House', 'city': 'Pune', 'caretaker_name': 'MR. TEST', 'caretaker_address': '1 Test Road'}
+
+
+def write(path, text):
+    path.write_text(text)
+    # Another size or mtime, so the registry sees a new version
+    os.utime(path, ns=(os.stat(path).st_mtime_ns + 1_000_000_000,) * 2)
+
+
+def test_keeps_the_last_good_definitions_when_the_file_breaks(tmp_path):
+    path = tmp_path / 'properties.json'
+    write(path, json.dumps({'properties': {'pune': DEFINITION}}))
+    registry = PropertyRegistry(str(path), check_interval=0)
+    assert registry.get()['name'] == 'Test House'
+
+    write(path, '{"properties": {"pune": ')  # half-written
+    assert registry.get()['name'] == 'Test House'
+    assert list(registry.properties()) == ['pune']
+
+    write(path, json.dumps({'properties': {'pune': dict(DEFINITION, name='Renamed')}}))
+    assert registry.get()['name'] == 'Renamed'
+
+
+def test_falls_back_to_the_standard_property_when_the_first_load_fails(tmp_path):
+    path = tmp_path / 'properties.json'
+    write(path, 'not json')
+    registry = PropertyRegistry(str(path), check_interval=0)
+    assert registry.get()['id'] == 'default'
+
+
+def test_rejects_unknown_clause_placeholders():
+    clauses = [[["Rent of {rent} due monthly", False]]]
+    with pytest.raises(ValueError, match='rent'):
+        normalize_definition('pune', dict(DEFINITION, clauses=clauses))
+
+
+def test_accepts_property_and_client_placeholders():
+    clauses = [[["{full_name} pays Rs. {rent_price}/- to {caretaker_name} in {city}, late fee {late_fee_words}", True]]]
+    prop = normalize_definition('pune', dict(DEFINITION, clauses=clauses))
+    assert prop['clauses'] == clauses
@@ -0,0 +1,88 @@
+"""
+Telegram flood limits on a fake clock: token bucket refill and burst, and a
+429's retry_after blocking one chat.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+import delivery  # noqa: E402
+from delivery import RateLimiter, TokenBucket  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(delivery.time, 'monotonic', clock)
+    return clock
+
+
+def test_burst_is_free_then_sends_queue_at_the_rate(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0] * 3
+    # Past the burst each send waits one more interval (the bucket goes into debt)
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+    assert bucket.delay() == pytest.approx(1.5)
+
+
+def test_refills_at_the_rate_up_to_capacity(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    for _ in range(3):
+        bucket.reserve()
+    assert bucket.delay() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.delay() == 0.0
+    clock.now += 100  # idle for long: still only a burst of capacity
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.0, pytest.approx(0.5)]
+
+
+def test_delay_does_not_take_a_token(clock):
+    bucket = TokenBucket(rate=1, capacity=1)
+    assert bucket.delay() == bucket.delay() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.delay() == pytest.approx(1.0)
+
+
+def test_rate_zero_is_unlimited(clock):
+    bucket = TokenBucket(rate=0)
+    assert [bucket.reserve() for _ in range(100)] == [0.0] * 100
+
+
+def test_block_holds_sends_even_with_tokens_left(clock):
+    bucket = TokenBucket(rate=1, capacity=5)
+    bucket.block(3)
+    assert bucket.delay() == pytest.approx(3.0)
+    assert bucket.reserve() == pytest.approx(3.0)
+    clock.now += 3
+    assert bucket.reserve() == 0.0
+
+
+def test_limiter_waits_for_the_tighter_bucket(clock):
+    limiter = RateLimiter(global_rate=30, chat_rate=1, chat_burst=2)
+    assert [limiter.reserve('a') for _ in range(2)] == [0.0, 0.0]
+    assert limiter.reserve('a') == pytest.approx(1.0)  # the chat's bucket, not the global one
+    assert limiter.reserve('b') == 0.0
+    assert limiter.delay('a') == pytest.approx(2.0)
+
+
+def test_retry_after_blocks_only_that_chat(clock):
+    limiter = RateLimiter(global_rate=30, chat_rate=1, chat_burst=2)
+    limiter.retry_after('a', 5)
+    assert limiter.delay('a') == pytest.approx(5.0)
+    assert limiter.delay('b') == 0.0
+    clock.now += 5
+    assert limiter.reserve('a') == 0.0
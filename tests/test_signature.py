@@ -0,0 +1,46 @@
+"""
+Stroke signatures posted by the form.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+from signature import STROKES_MEDIA_TYPE, SignatureError, parse_strokes  # noqa: E402
+
+
+def strokes(payload):
+    return parse_strokes(f"{STROKES_MEDIA_TYPE},{payload}")
+
+
+def test_parses_strokes():
+    signature = strokes('[[10, 10, 60.5, 30], [-2, 5, 20, 5]]')
+    assert len(signature.strokes) == 2
+    assert signature.width > 0 and signature.height > 0
+
+
+@pytest.mark.parametrize('payload', ['[[NaN, 1]]', '[[Infinity, 1]]', '[[1, -Infinity]]', '[[1e308, 1]]', '[[1e999, 1]]', '[[1, 5000]]'])
+def test_rejects_non_finite_and_out_of_range_coordinates(payload):
+    with pytest.raises(SignatureError):
+        strokes(payload)
+
+
+@pytest.mark.parametrize('payload', ['{}', '[[1, 2, 3]]', '[["1", 2]]', '[]', 'not json'])
+def test_rejects_malformed_strokes(payload):
+    with pytest.raises(SignatureError):
+        strokes(payload)
+
+
+def test_vector_drawing_has_a_vml_fallback():
+    from lxml import etree
+
+    ns = {'mc': 'http://schemas.openxmlformats.org/markup-compatibility/2006', 'v': 'urn:schemas-microsoft-com:vml'}
+    content = etree.fromstring(strokes('[[1, 1, 20, 5, 40, 30], [50, 50]]').drawing_xml())
+    assert content.find('mc:Choice', ns).get('Requires') == 'wps'
+    shape = content.find('mc:Fallback//v:shape', ns)
+    assert shape.get('path') == 'm20,20l210,60,410,310m510,510l510,510e'
+    assert shape.get('coordsize') == '530,530'